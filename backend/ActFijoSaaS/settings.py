@@ -1,4 +1,5 @@
 # ActFijoSaaS/settings.py
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -28,10 +29,13 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'api.middleware.MetricsMiddleware', # Métricas de Prometheus (API_METRICS_ENABLED)
     'corsheaders.middleware.CorsMiddleware', # Middleware de CORS
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.middleware.TenantMiddleware', # Expone request.tenant (empresa del usuario)
+    'api.middleware.RequestInstrumentationMiddleware', # Sólo activo con API_REQUEST_METRICS
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -88,11 +92,105 @@ USE_TZ = True
 STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# --- CONFIGURACIÓN DE CACHÉ ---
+# Backend compartido entre workers (en producción usar Redis/Memcached).
+# FileBasedCache sirve en local porque todos los procesos ven el mismo directorio.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.django_cache',
+    }
+}
+API_CACHE_ALIAS = 'default'
+PERMISSIONS_CACHE_TIMEOUT = 60 * 60 # Segundos que vive un set de permisos en la caché compartida
+PERMISSIONS_LRU_SIZE = 2048 # Usuarios en el LRU local de cada proceso
+CATALOG_CACHE_TIMEOUT = 60 * 60 # Segundos que vive un catálogo (categorías, estados...) en la caché compartida
+CATALOG_LRU_SIZE = 512 # Catálogos (empresa, modelo, versión) en el LRU local de cada proceso
+USER_CACHE_TIMEOUT = 60 * 60 # Segundos que vive el User autenticado por JWT en la caché compartida
+USER_LRU_SIZE = 2048 # Usuarios autenticados en el LRU local de cada proceso
+
 # --- CONFIGURACIÓN DE DJANGO REST FRAMEWORK (JWT) ---
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+        # JWTAuthentication + request.tenant desde el claim 'empresa_id'
+        'api.authentication.TenantJWTAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        # JSONRenderer que mide la fase 'render' cuando API_REQUEST_METRICS está activo
+        'api.instrumentation.InstrumentedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    # Keyset pagination, opt-in por request (?page_size= / ?cursor=)
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.KeysetPagination',
+}
+BULK_MAX_ITEMS = 1000 # Registros por petición a /<recurso>/bulk/
+API_FAST_LIST = True # list desde .values() en los ViewSets con fast_list (api/fastpath.py); False = serializers siempre
+
+# --- REPORTES ---
+EXPORT_CHUNK_SIZE = 2000 # Filas por bloque del cursor del servidor en las exportaciones
+# Exportaciones en segundo plano (manage.py run_export_worker)
+EXPORT_RESULTS_DIR = BASE_DIR / 'export_results' # Ficheros generados, por empresa
+EXPORT_RESULTS_TTL_DAYS = 7 # Días que se conservan los ficheros generados
+EXPORT_JOB_HEARTBEAT = 30 # Segundos entre latidos de un trabajo en curso
+EXPORT_JOB_TIMEOUT = 5 * 60 # Segundos sin latido tras los que un trabajo 'procesando' se re-encola (su worker murió)
+# Importación masiva de activos (POST /api/activos-fijos/importar/, manage.py import_activos)
+IMPORT_CHUNK_SIZE = 2000 # Filas por bulk_create (una transacción cada una)
+IMPORT_MAX_ROWS = 100000 # Máximo de filas por importación desde la API
+IMPORT_MAX_ERRORS = 1000 # Errores por fila que se devuelven (se cuentan todos)
+# Métodos con histórico mensual materializado (manage.py refresh_depreciacion)
+DEPRECIACION_METODOS_MENSUALES = ['lineal']
+
+# --- INSTRUMENTACIÓN / LOGGING ---
+# Contadores por request (X-Query-Count, Server-Timing). Opt-in: API_REQUEST_METRICS=1
+API_REQUEST_METRICS = os.environ.get('API_REQUEST_METRICS') == '1'
+
+# Métricas de Prometheus en /api/metrics/. Opt-in: API_METRICS_ENABLED=1
+API_METRICS_ENABLED = os.environ.get('API_METRICS_ENABLED') == '1'
+METRICS_AUTH_TOKEN = os.environ.get('METRICS_AUTH_TOKEN') # Bearer token del scraper; sin él /api/metrics/ responde 403
+# Con varios workers (gunicorn) apuntar a un directorio compartido: cada proceso vuelca ahí sus valores
+METRICS_MULTIPROC_DIR = os.environ.get('METRICS_MULTIPROC_DIR')
+METRICS_FLUSH_INTERVAL = 5 # Segundos entre volcados de cada proceso
+
+# Bitácora con escritura diferida (api/log_buffer.py)
+LOG_BUFFER_ENABLED = os.environ.get('LOG_BUFFER_ENABLED', '1') == '1' # '0': INSERT síncrono por log
+LOG_BUFFER_MAX_SIZE = 10000 # Logs pendientes por proceso; los siguientes se descartan
+LOG_BUFFER_BATCH_SIZE = 500 # Filas por bulk_create
+LOG_BUFFER_FLUSH_INTERVAL = 2.0 # Segundos máximos que un log espera en la cola
+LOG_BUFFER_SHUTDOWN_TIMEOUT = 5.0 # Segundos para vaciar la cola al apagar el proceso
+LOG_BULK_MAX_ENTRIES = 500 # Máximo de entradas por POST /api/logs/bulk/
+# IPs o redes (CIDR) de los proxies inversos cuyo X-Forwarded-For se cree; sin ellos la IP auditada es REMOTE_ADDR
+AUDIT_TRUSTED_PROXIES = [red.strip() for red in os.environ.get('AUDIT_TRUSTED_PROXIES', '').split(',') if red.strip()]
+# Compactación del payload al encolar (claves sensibles ocultas siempre)
+LOG_PAYLOAD_MAX_BYTES = 4096 # Por encima sólo se guardan los ids de la entidad
+LOG_PAYLOAD_MAX_STRING = 256
+LOG_PAYLOAD_MAX_ITEMS = 20
+LOG_PAYLOAD_MAX_DEPTH = 4 # payload.cambios.<campo> = [antes, después] de un ManyToMany
+# Particiones mensuales y retención de la bitácora (manage.py manage_log_partitions)
+LOG_PARTITIONS_AHEAD = 3 # Meses futuros con partición ya creada
+LOG_RETENTION_DAYS = 365 # Retención de las empresas sin RetencionLogs propia
+LOG_ARCHIVE_DIR = Path(os.environ.get('LOG_ARCHIVE_DIR', BASE_DIR / 'log_archive')) # Logs archivados (archive_logs)
+LOG_ARCHIVE_MAX_RESULTS = 1000 # Máximo de registros por consulta a /api/logs/archivo/
+
+# Presupuestos de consultas, tiempo, memoria y tamaño por endpoint (manage.py benchmark_endpoints)
+BENCHMARK_BUDGETS = BASE_DIR / 'benchmark_budgets.json'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'structured': {'()': 'api.instrumentation.StructuredFormatter'},
+    },
+    'handlers': {
+        'api_console': {'class': 'logging.StreamHandler', 'formatter': 'structured'},
+    },
+    'loggers': {
+        # Eventos de la API; DEBUG/INFO apagados salvo que se pida con API_LOG_LEVEL
+        'api': {
+            'handlers': ['api_console'],
+            'level': os.environ.get('API_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
 }
 
 # --- CONFIGURACIÓN DE CORS (PERMISOS PARA EL FRONTEND) ---
@@ -117,7 +215,10 @@ CORS_ALLOW_HEADERS = [
     "user-agent",
     "x-csrftoken",
     "x-requested-with",
+    "if-match", # Ediciones condicionales (412 si el recurso cambió)
+    "if-none-match",
 ]
+CORS_EXPOSE_HEADERS = ["etag"]
 
 SIMPLE_JWT = {
     # Duración del token de acceso (ej: 1 hora en desarrollo)
@@ -38,6 +38,10 @@ class LogAdmin(admin.ModelAdmin):
     def has_delete_permission(self, request, obj=None):
         return False # No se pueden borrar logs
 
+@admin.register(RetencionLogs)
+class RetencionLogsAdmin(admin.ModelAdmin):
+    list_display = ('empresa', 'dias')
+
 # --- Admin para Modelos Dependientes de Empresa ---
 # Este formato nos permite ver a qué empresa pertenece cada registro en la lista
 
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # Conecta los receptores que invalidan las cachés (api/signals.py)
+        from . import signals  # noqa: F401
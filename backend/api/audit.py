@@ -0,0 +1,115 @@
+# api/audit.py
+"""
+Auditoría automática de las escrituras de la API.
+
+Los ViewSets (BaseTenantViewSet, PermisosViewSet) llaman a auditar() tras
+crear, editar o borrar. El Log se arma en memoria con la empresa, el usuario,
+la IP y los campos que cambiaron, y se entrega a log_buffer al confirmarse la
+transacción: el request no espera a la BD de logs y una escritura revertida no
+deja rastro.
+
+Formato de 'accion' y 'payload' (el mismo que usaba el frontend):
+    accion  = 'CREATE: ActivoFijo' | 'UPDATE: ...' | 'DELETE: ...'
+    payload = {'id': ..., 'cambios': {campo: [antes, después]}}
+"""
+import ipaddress
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .log_buffer import log_buffer
+from .models import Log
+
+CREATE, UPDATE, DELETE, IMPORT = 'CREATE', 'UPDATE', 'DELETE', 'IMPORT'
+# Campos que no aportan al diff: la empresa la dice tenant_id (y el pk va en payload.id)
+EXCLUDED_FIELDS = {'empresa', 'empresa_id'}
+
+
+# Sin IP válida (no debería pasar detrás de WSGI): Log.ip_address no admite NULL
+IP_DESCONOCIDA = '0.0.0.0'
+
+
+def _ip(valor):
+    try:
+        return ipaddress.ip_address((valor or '').strip())
+    except ValueError:
+        return None
+
+
+def _confiable(ip):
+    redes = getattr(settings, 'AUDIT_TRUSTED_PROXIES', ())
+    return any(ip in ipaddress.ip_network(red, strict=False) for red in redes)
+
+
+def get_client_ip(request):
+    """
+    IP del cliente. X-Forwarded-For lo puede escribir cualquiera: sólo se usa
+    si la conexión viene de un proxy de AUDIT_TRUSTED_PROXIES, y se recorre de
+    derecha a izquierda saltando proxies confiables hasta el primero que no lo
+    es. Lo que no sea una IP válida se ignora y queda REMOTE_ADDR.
+    """
+    cliente = _ip(request.META.get('REMOTE_ADDR'))
+    if cliente is not None and _confiable(cliente):
+        for valor in reversed(request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')):
+            ip = _ip(valor)
+            if ip is None:
+                break
+            cliente = ip
+            if not _confiable(ip):
+                break
+    return str(cliente) if cliente is not None else IP_DESCONOCIDA
+
+
+def snapshot(instance, m2m=()):
+    """
+    {campo: valor} de los campos concretos de la instancia (FKs como *_id).
+    Los ManyToMany cuestan una consulta cada uno: sólo se incluyen los de 'm2m'.
+    """
+    valores = {
+        field.attname: field.value_from_object(instance)
+        for field in instance._meta.concrete_fields
+        if not field.primary_key and field.attname not in EXCLUDED_FIELDS
+    }
+    for name in m2m:
+        valores[name] = sorted(str(pk) for pk in getattr(instance, name).values_list('pk', flat=True))
+    return valores
+
+
+def m2m_fields(instance, data):
+    """ Nombres de los ManyToMany del modelo que vienen en los datos validados. """
+    return [field.name for field in instance._meta.many_to_many if field.name in data]
+
+
+def diff(antes, despues):
+    """ {campo: [antes, después]} de los que cambiaron; None en el lado que no existe. """
+    campos = dict.fromkeys([*(antes or {}), *(despues or {})])
+    cambios = {}
+    for campo in campos:
+        previo = (antes or {}).get(campo)
+        nuevo = (despues or {}).get(campo)
+        if previo != nuevo:
+            cambios[campo] = [previo, nuevo]
+    return cambios
+
+
+def registrar(request, accion, payload):
+    """ Encola un Log para cuando se confirme la transacción en curso. """
+    log = Log(
+        timestamp=timezone.now(),
+        usuario_id=request.user.pk,
+        ip_address=get_client_ip(request),
+        tenant_id=request.tenant.empresa_id,
+        accion=accion,
+        payload=payload,
+    )
+    transaction.on_commit(lambda: log_buffer.enqueue(log))
+
+
+def auditar(request, operacion, instance, antes=None, despues=None, nombre=None, pk=None):
+    """ Log de una creación, edición o borrado con el diff de campos. """
+    registrar(
+        request,
+        f'{operacion}: {nombre or type(instance).__name__}',
+        {'id': str(instance.pk if pk is None else pk), 'cambios': diff(antes, despues)},
+    )
@@ -0,0 +1,112 @@
+# api/authentication.py
+import uuid
+
+from django.conf import settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .cache import LocalLRU, get_version, shared_cache
+from .models import Empleado
+
+# Ámbito de versión del User autenticado, cambiado por las señales de User
+# (api/signals.py): ('usuario', user_id)
+USER_SCOPE = 'usuario'
+
+# Lo único del User que se guarda en caché (nunca el hash de la contraseña): la
+# caché compartida puede estar en disco (FileBasedCache)
+USER_FIELDS = ('id', 'username', 'is_active', 'is_staff')
+
+_local_users = LocalLRU(getattr(settings, 'USER_LRU_SIZE', 2048))
+
+
+class TenantContext:
+    """
+    Empresa (tenant) del request, resuelta una sola vez y expuesta como
+    request.tenant para vistas, permisos y serializers
+    (vía self.context['request'].tenant).
+
+    empresa_id es None si el usuario no es empleado de ninguna empresa.
+    """
+    def __init__(self, user, empresa_id):
+        self.user = user
+        self.empresa_id = empresa_id
+
+    def __bool__(self):
+        return self.empresa_id is not None
+
+    def __repr__(self):
+        return f'<TenantContext empresa_id={self.empresa_id}>'
+
+
+def resolve_tenant(user, validated_token=None):
+    """
+    Construye el TenantContext del usuario. Con JWT manda el claim 'empresa_id'
+    (ver MyTokenObtainPairSerializer), sin tocar la BD: un token sin el claim no
+    tiene empresa. Sin token (sesión de Django) se consulta una sola vez.
+    """
+    if not user or not user.is_authenticated:
+        return TenantContext(user, None)
+
+    if validated_token is not None:
+        claim = validated_token.get('empresa_id')
+        try:
+            empresa_id = uuid.UUID(claim) if claim else None
+        except (TypeError, ValueError):
+            empresa_id = None
+    else:
+        empresa_id = Empleado.objects.filter(usuario_id=user.pk).values_list('empresa_id', flat=True).first()
+    return TenantContext(user, empresa_id)
+
+
+class TenantJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication que además fija request.tenant a partir del token y
+    guarda los campos del User que usa el request (USER_FIELDS) en caché
+    (versionada por usuario) para no consultarlo en cada request.
+    """
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+        cache_key = f'user-campos:{user_id}:{get_version(USER_SCOPE, user_id)}'
+        datos = _local_users.get(cache_key) or shared_cache().get(cache_key)
+        if datos is None or not self._vigente(datos, validated_token):
+            # La consulta normal (y sus errores: no existe, inactivo, token revocado)
+            user = super().get_user(validated_token)
+            datos = self._datos(user)
+            shared_cache().set(cache_key, datos, getattr(settings, 'USER_CACHE_TIMEOUT', 3600))
+            _local_users.set(cache_key, datos)
+            return user
+        _local_users.set(cache_key, datos)
+        return self._usuario(datos)
+
+    def _datos(self, user):
+        datos = {campo: getattr(user, campo) for campo in USER_FIELDS}
+        # Marca de revocación: el mismo hash que lleva el token, no el de la contraseña
+        if getattr(api_settings, 'CHECK_REVOKE_TOKEN', False):
+            datos['revocacion'] = get_md5_hash_password(user.password)
+        return datos
+
+    def _usuario(self, datos):
+        """ User armado con los campos en caché, sin consultar la BD; el resto queda vacío. """
+        user = self.user_model(**{campo: datos[campo] for campo in USER_FIELDS})
+        user._state.adding = False
+        return user
+
+    def _vigente(self, datos, validated_token):
+        """ Las mismas comprobaciones que JWTAuthentication.get_user tras la consulta. """
+        if api_settings.CHECK_USER_IS_ACTIVE and not datos['is_active']:
+            return False
+        if getattr(api_settings, 'CHECK_REVOKE_TOKEN', False):
+            return 'revocacion' in datos and validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) == datos['revocacion']
+        return True
+
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is not None:
+            user, validated_token = result
+            # Se guarda en el HttpRequest de Django: el Request de DRF lo expone
+            # también como request.tenant
+            request._request.tenant = resolve_tenant(user, validated_token)
+        return result
@@ -0,0 +1,68 @@
+# api/bootstrap.py
+"""
+Datos de sesión que el SPA y la app móvil piden tras el login (permisos, roles
+y catálogos), armados para GET /api/bootstrap/ (BootstrapView).
+
+Cada sección tiene su propio ETag, calculado con las versiones de api/cache.py
+(una sola lectura de la caché compartida para todas): el cliente manda en
+If-None-Match los ETags que ya tiene y esas secciones no se vuelven a enviar.
+Con la caché caliente sólo 'roles' consulta la BD (roles + permisos).
+"""
+import hashlib
+
+from django.utils.http import quote_etag
+
+from .authentication import USER_SCOPE
+from .cache import GLOBAL, data_scope, get_versions
+from .catalogs import catalogo
+from .models import Cargo, CategoriaActivo, Departamento, Estado, Proveedor, Roles, Ubicacion
+from .permissions import PERMISSIONS_SCOPE, USER_PERMISSIONS_SCOPE, get_user_permissions
+from .serializers import RolesSerializer
+
+CATALOGOS = {
+    'departamentos': Departamento,
+    'cargos': Cargo,
+    'categorias': CategoriaActivo,
+    'estados': Estado,
+    'ubicaciones': Ubicacion,
+    'proveedores': Proveedor,
+}
+SECCIONES = ('permisos', 'roles', *CATALOGOS)
+
+
+def _scopes(seccion, user_id, empresa_id):
+    if seccion == 'permisos':
+        # Los mismos que invalidan get_user_permissions, más el User (is_staff)
+        return [(PERMISSIONS_SCOPE, GLOBAL), (PERMISSIONS_SCOPE, empresa_id),
+                (USER_PERMISSIONS_SCOPE, user_id), (USER_SCOPE, user_id)]
+    if seccion == 'roles':
+        return [(data_scope(Roles), empresa_id), (PERMISSIONS_SCOPE, empresa_id), (PERMISSIONS_SCOPE, GLOBAL)]
+    return [(data_scope(CATALOGOS[seccion]), empresa_id)]
+
+
+def etags(secciones, user_id, empresa_id):
+    """ {sección: ETag} de las secciones pedidas. """
+    scopes = {seccion: _scopes(seccion, user_id, empresa_id) for seccion in secciones}
+    versiones = iter(get_versions(*[pair for seccion in secciones for pair in scopes[seccion]]))
+    resultado = {}
+    for seccion in secciones:
+        partes = [seccion, str(user_id), str(empresa_id), *(next(versiones) for _ in scopes[seccion])]
+        resultado[seccion] = quote_etag(hashlib.sha1('|'.join(partes).encode()).hexdigest())
+    return resultado
+
+
+def datos(seccion, request):
+    """ Contenido de la sección: el mismo que el endpoint correspondiente. """
+    empresa_id = request.tenant.empresa_id
+    if seccion == 'permisos':
+        # Como my-permissions/, ordenado para que la respuesta sea estable
+        permisos = set(get_user_permissions(request.user, empresa_id))
+        if request.user.is_staff:
+            permisos.add('is_superuser')
+        return sorted(permisos)
+    if empresa_id is None:
+        return []
+    if seccion == 'roles':
+        roles = Roles.objects.filter(empresa_id=empresa_id).prefetch_related('permisos')
+        return RolesSerializer(roles, many=True).data
+    return catalogo(CATALOGOS[seccion], empresa_id)
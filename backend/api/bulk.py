@@ -0,0 +1,109 @@
+# api/bulk.py
+"""
+Apoyo a las operaciones en bloque de los ViewSets (BulkMixin en views.py).
+
+Validar N filas con un ModelSerializer hace un SELECT por fila y por FK
+(PrimaryKeyRelatedField.to_internal_value usa queryset.get()). preload_related
+cambia esos campos por PreloadedRelatedField: los ids de todas las filas se
+buscan en una sola consulta por modelo, ya filtrada por la empresa, así que un
+id de otra empresa se rechaza igual que uno que no existe.
+"""
+import uuid
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+
+def _pk(value):
+    """ Forma canónica del id (UUID en minúsculas) para buscarlo en el mapa. """
+    try:
+        return str(uuid.UUID(str(value)))
+    except ValueError:
+        return str(value)
+
+
+def _tiene_empresa(model):
+    try:
+        model._meta.get_field('empresa')
+    except FieldDoesNotExist:
+        return False
+    return True
+
+
+class PreloadedRelatedField(serializers.RelatedField):
+    default_error_messages = serializers.PrimaryKeyRelatedField.default_error_messages
+
+    def __init__(self, objects, **kwargs):
+        self.objects = objects
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        instance = self.objects.get(_pk(data))
+        if instance is None:
+            self.fail('does_not_exist', pk_value=data)
+        return instance
+
+    def to_representation(self, value):
+        return value.pk
+
+
+def preload_related(serializer, filas, empresa_id):
+    """
+    Sustituye en 'serializer' (el hijo de un many=True, o uno simple) los
+    PrimaryKeyRelatedField escribibles por PreloadedRelatedField con los
+    objetos referenciados en 'filas' (lista de dicts de entrada).
+    """
+    for name, field in list(serializer.fields.items()):
+        if field.read_only or not isinstance(field, serializers.PrimaryKeyRelatedField):
+            continue
+        ids = {_pk(fila[name]) for fila in filas if isinstance(fila, dict) and fila.get(name) not in (None, '')}
+        queryset = field.get_queryset()
+        if _tiene_empresa(queryset.model):
+            queryset = queryset.filter(empresa_id=empresa_id)
+        validos = []
+        for value in ids:
+            try:
+                queryset.model._meta.pk.to_python(value)
+            except DjangoValidationError:
+                continue # El campo lo rechaza como 'does_not_exist'
+            validos.append(value)
+        objects = {_pk(obj.pk): obj for obj in queryset.filter(pk__in=validos)} if validos else {}
+        kwargs = {'queryset': queryset, 'required': field.required, 'allow_null': field.allow_null}
+        if field.source != name:
+            kwargs['source'] = field.source
+        serializer.fields[name] = PreloadedRelatedField(objects, **kwargs)
+
+
+def seleccion(queryset, data, max_items):
+    """
+    Filtra 'queryset' (ya de la empresa) con {'ids': [...]} o {'filtro': {campo: valor}}
+    (igualdad sobre campos del modelo). Se exige uno de los dos: nunca "todos".
+    """
+    ids, filtro = data.get('ids'), data.get('filtro')
+    if bool(ids) == bool(filtro):
+        raise ValidationError({'detail': "Indique 'ids' (lista) o 'filtro' (objeto), uno de los dos."})
+    if ids:
+        if not isinstance(ids, list) or len(ids) > max_items:
+            raise ValidationError({'ids': f"Debe ser una lista de como máximo {max_items} ids."})
+        try:
+            return queryset.filter(pk__in=ids)
+        except DjangoValidationError:
+            raise ValidationError({'ids': "Contiene ids no válidos."})
+    if not isinstance(filtro, dict):
+        raise ValidationError({'filtro': "Debe ser un objeto {campo: valor}."})
+    condiciones = {}
+    for campo, valor in filtro.items():
+        try:
+            field = queryset.model._meta.get_field(campo)
+        except FieldDoesNotExist:
+            raise ValidationError({'filtro': f"Campo desconocido: {campo}."})
+        if not field.concrete or field.many_to_many or campo == 'empresa':
+            raise ValidationError({'filtro': f"No se puede filtrar por {campo}."})
+        condiciones[field.attname] = valor
+    try:
+        return queryset.filter(**condiciones)
+    except (DjangoValidationError, ValueError):
+        raise ValidationError({'filtro': "Contiene valores no válidos."})
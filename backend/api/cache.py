@@ -0,0 +1,124 @@
+# api/cache.py
+"""
+Caché de dos niveles para datos por empresa (tenant):
+
+1. Un LRU en memoria, local a cada proceso (sin I/O).
+2. El backend compartido de Django (settings.CACHES), visible para todos los workers.
+
+Las entradas no se borran una a una: cada (ámbito, id) tiene un token de versión
+en la caché compartida. Al cambiar los datos se genera un token nuevo y las
+entradas que guardaron el token anterior dejan de ser válidas en todos los procesos.
+"""
+import threading
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+# Id usado para las versiones que no dependen de una empresa concreta
+GLOBAL = 'global'
+
+
+def shared_cache():
+    """ Backend compartido configurado en settings.API_CACHE_ALIAS """
+    return caches[getattr(settings, 'API_CACHE_ALIAS', 'default')]
+
+
+class LocalLRU:
+    """
+    LRU thread-safe en memoria del proceso. Sólo se usa como primer nivel:
+    los valores deben validarse siempre contra la versión compartida.
+    """
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+                return self._data[key]
+            except KeyError:
+                return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# --- VERSIONES ---
+
+def _version_key(scope, ident):
+    return f'v:{scope}:{ident}'
+
+
+def _new_token():
+    return uuid.uuid4().hex[:12]
+
+
+def get_versions(*pairs):
+    """
+    Devuelve la tupla de tokens para cada (scope, id) en una sola consulta a la
+    caché compartida. Si una versión no existe (primera vez, o fue expulsada)
+    se crea un token nuevo: así nunca se reutiliza un valor antiguo.
+    """
+    cache = shared_cache()
+    keys = [_version_key(scope, ident) for scope, ident in pairs]
+    found = cache.get_many(keys)
+    result = []
+    for key in keys:
+        token = found.get(key)
+        if token is None:
+            token = _new_token()
+            # add() no pisa una versión creada en paralelo por otro proceso
+            if not cache.add(key, token, timeout=None):
+                token = cache.get(key) or token
+        result.append(token)
+    return tuple(result)
+
+
+def get_version(scope, ident):
+    return get_versions((scope, ident))[0]
+
+
+def bump_version(scope, ident):
+    """
+    Invalida todo lo cacheado bajo (scope, id) en todos los procesos. Dentro de
+    una transacción espera a que se confirme: con la versión nueva antes de
+    tiempo, otra petición podría guardar bajo ella lo que aún ve (los datos
+    viejos) y servirlo hasta el próximo cambio. Fuera de una, es inmediato.
+    """
+    key = _version_key(scope, ident)
+    transaction.on_commit(lambda: shared_cache().set(key, _new_token(), timeout=None))
+
+
+# --- VERSIONES DE DATOS POR EMPRESA ---
+# Cada modelo con 'empresa' tiene su propio contador por empresa, que las señales
+# de api/signals.py cambian en cada alta/baja/modificación. Las operaciones en
+# bloque (bulk_create, QuerySet.update) no disparan señales: deben llamar a
+# bump_data_version() ellas mismas.
+
+def data_scope(model):
+    return f'datos:{model._meta.model_name}'
+
+
+def get_data_versions(empresa_id, *models):
+    return get_versions(*[(data_scope(model), empresa_id) for model in models])
+
+
+def bump_data_version(model, empresa_id):
+    bump_version(data_scope(model), empresa_id)
@@ -0,0 +1,56 @@
+# api/catalogs.py
+"""
+Caché de lectura de los catálogos por empresa (categorías, estados,
+ubicaciones, cargos, departamentos y proveedores).
+
+Son tablas pequeñas que casi no cambian y que cada pantalla de activos vuelve a
+pedir. Se guarda la lista serializada completa bajo (empresa, modelo, versión
+de datos): LRU del proceso delante de la caché compartida (ver api/cache.py).
+Las señales de api/signals.py cambian la versión en cada alta, edición o baja
+(y BulkMixin en las operaciones en bloque), así que nunca se borra nada: la
+siguiente lectura usa otra clave.
+"""
+from django.conf import settings
+
+from .cache import LocalLRU, get_data_versions, shared_cache
+from .models import Cargo, CategoriaActivo, Departamento, Estado, Proveedor, Ubicacion
+from .serializers import (
+    CargoSerializer, CategoriaActivoSerializer, DepartamentoSerializer,
+    EstadoSerializer, ProveedorSerializer, UbicacionSerializer,
+)
+
+CATALOGOS = {
+    CategoriaActivo: CategoriaActivoSerializer,
+    Estado: EstadoSerializer,
+    Ubicacion: UbicacionSerializer,
+    Cargo: CargoSerializer,
+    Departamento: DepartamentoSerializer,
+    Proveedor: ProveedorSerializer,
+}
+
+_local_catalogs = LocalLRU(getattr(settings, 'CATALOG_LRU_SIZE', 512))
+
+
+def _catalog_key(model, empresa_id, version):
+    return f'catalogo:{model._meta.model_name}:{empresa_id}:{version}'
+
+
+def catalogo(model, empresa_id):
+    """
+    Lista (serializada) de los registros del catálogo de la empresa. Con la caché
+    caliente no hace consultas a la BD. La lista es compartida: no modificarla.
+    """
+    version = get_data_versions(empresa_id, model)[0]
+    cache_key = _catalog_key(model, empresa_id, version)
+    filas = _local_catalogs.get(cache_key)
+    if filas is None:
+        filas = shared_cache().get(cache_key)
+        if filas is None:
+            # La versión se leyó ANTES de consultar: si cambia en medio, esta
+            # entrada queda bajo la clave vieja y nadie más la usará
+            queryset = model.objects.filter(empresa_id=empresa_id)
+            filas = [dict(fila) for fila in CATALOGOS[model](queryset, many=True).data]
+            shared_cache().set(cache_key, filas, getattr(settings, 'CATALOG_CACHE_TIMEOUT', 3600))
+        _local_catalogs.set(cache_key, filas)
+    return filas
+
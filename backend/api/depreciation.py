@@ -0,0 +1,208 @@
+# api/depreciation.py
+"""
+Motor de depreciación vectorizado.
+
+Los activos de una empresa se cargan una sola vez como columnas NumPy (costo,
+vida útil, fecha de adquisición) y cada cálculo es una pasada sobre arrays
+completos, sin bucles por activo en Python: 1M de activos se calculan en
+una fracción de segundo (la carga desde la BD es lo que domina).
+
+Se toma valor_actual como costo de adquisición (el modelo no guarda otro valor)
+y valor residual cero. Los activos con vida_util <= 0 (p. ej. terrenos) no se
+deprecian.
+"""
+from datetime import date
+from itertools import islice
+
+import numpy as np
+
+LINEAL = 'lineal'
+SALDO_DECRECIENTE = 'saldo_decreciente'
+METODOS = (LINEAL, SALDO_DECRECIENTE)
+
+# Saldo doblemente decreciente: tasa anual = FACTOR / vida útil
+FACTOR_SALDO_DECRECIENTE = 2.0
+
+# Columnas que necesita el motor (en este orden) al leer de un queryset
+CAMPOS = ('valor_actual', 'vida_util', 'fecha_adquisicion')
+
+
+def _meses_transcurridos(fecha_adquisicion, fecha):
+    """
+    Meses completos entre cada adquisición y 'fecha' (negativo si aún no se adquirió).
+    'fecha' puede ser una fecha o un array con una fecha por activo.
+    """
+    corte = np.asarray(fecha, dtype='datetime64[D]')
+    adq_mes = fecha_adquisicion.astype('datetime64[M]')
+    corte_mes = corte.astype('datetime64[M]')
+    meses = (corte_mes - adq_mes).astype(np.int64)
+    dia_adq = (fecha_adquisicion - adq_mes.astype('datetime64[D]')).astype(np.int64)
+    dia_corte = (corte - corte_mes.astype('datetime64[D]')).astype(np.int64)
+    return meses - (dia_corte < dia_adq)
+
+
+def _lineal(costo, vida, meses):
+    vida_meses = vida * 12
+    fraccion = np.divide(np.minimum(meses, vida_meses), vida_meses,
+                         out=np.zeros_like(costo), where=vida_meses > 0)
+    return costo * fraccion
+
+
+def _saldo_decreciente(costo, vida, meses, factor=FACTOR_SALDO_DECRECIENTE):
+    """
+    Saldo decreciente anual con cambio a línea recta en el año en que ésta
+    deprecia más (así el activo llega a cero al final de su vida útil).
+    Dentro de cada año la depreciación se prorratea por meses.
+    """
+    n = vida.astype(np.float64)
+    validos = n > 0
+    tasa = np.minimum(np.divide(factor, n, out=np.ones_like(n), where=validos), 1.0)
+    # Primer año en que la línea recta sobre el saldo supera a la tasa decreciente
+    cambio = np.clip(np.ceil(n - 1.0 / tasa), 0, n)
+
+    def libros_inicio(anio):
+        anio = np.minimum(anio, n)
+        saldo = costo * (1.0 - tasa) ** np.minimum(anio, cambio)
+        restantes = n - cambio
+        tramo_lineal = np.divide(np.maximum(anio - cambio, 0), restantes,
+                                 out=np.zeros_like(n), where=restantes > 0)
+        return np.where(anio >= n, 0.0, saldo * (1.0 - tramo_lineal))
+
+    anios = meses / 12.0
+    anio = np.floor(anios)
+    fraccion = anios - anio
+    inicio = libros_inicio(anio)
+    libros = inicio - fraccion * (inicio - libros_inicio(anio + 1))
+    return np.where(validos, costo - libros, 0.0)
+
+
+class Cartera:
+    """ Activos de una empresa en formato columnar. """
+
+    def __init__(self, costo, vida, fecha_adquisicion, grupos=None, etiquetas=()):
+        self.costo = np.asarray(costo, dtype=np.float64)
+        self.vida = np.asarray(vida, dtype=np.int64)
+        self.fecha_adquisicion = np.asarray(fecha_adquisicion, dtype='datetime64[D]')
+        # Código entero por activo (p. ej. su categoría) para totales por grupo
+        self.grupos = None if grupos is None else np.asarray(grupos, dtype=np.int64)
+        self.etiquetas = list(etiquetas)
+
+    def __len__(self):
+        return len(self.costo)
+
+    @classmethod
+    def desde_filas(cls, filas):
+        """ filas: tuplas (valor_actual, vida_util, fecha_adquisicion). """
+        filas = list(filas)
+        if not filas:
+            return cls([], [], [])
+        costo, vida, fechas = zip(*filas)
+        return cls(np.array(costo, dtype=np.float64), vida, fechas)
+
+    @classmethod
+    def desde_queryset(cls, queryset, agrupar_por=None, chunk_size=10000):
+        """
+        Lee los activos por bloques del cursor. agrupar_por: (campo id, campo nombre),
+        p. ej. ('categoria_id', 'categoria__nombre').
+        """
+        campos = list(CAMPOS) + (list(agrupar_por) if agrupar_por else [])
+        costo, vida, fechas, grupos = [], [], [], []
+        codigos, etiquetas = {}, []
+        for fila in queryset.order_by().values_list(*campos).iterator(chunk_size=chunk_size):
+            costo.append(fila[0])
+            vida.append(fila[1])
+            fechas.append(fila[2])
+            if agrupar_por:
+                codigo = codigos.get(fila[3])
+                if codigo is None:
+                    codigo = codigos[fila[3]] = len(etiquetas)
+                    etiquetas.append({'id': fila[3], 'nombre': fila[4]})
+                grupos.append(codigo)
+        return cls(
+            np.array(costo, dtype=np.float64), vida, fechas,
+            grupos if agrupar_por else None, etiquetas
+        )
+
+    def calcular(self, fecha, metodo=LINEAL):
+        """
+        Devuelve (depreciación acumulada, valor en libros) por activo a 'fecha'
+        (una fecha común o un array con una por activo). Los activos adquiridos
+        después de 'fecha' valen 0 en ambos arrays.
+        """
+        if metodo not in METODOS:
+            raise ValueError(f"Método de depreciación no válido: {metodo}")
+        meses = _meses_transcurridos(self.fecha_adquisicion, fecha)
+        adquiridos = meses >= 0
+        meses = np.maximum(meses, 0)
+        if metodo == LINEAL:
+            acumulada = _lineal(self.costo, self.vida, meses)
+        else:
+            acumulada = _saldo_decreciente(self.costo, self.vida, meses)
+        acumulada = np.where(adquiridos, acumulada, 0.0)
+        libros = np.where(adquiridos, self.costo - acumulada, 0.0)
+        return acumulada, libros
+
+    def totales(self, fecha, metodo=LINEAL):
+        acumulada, libros = self.calcular(fecha, metodo)
+        adquiridos = self.fecha_adquisicion <= np.datetime64(fecha, 'D')
+        return _totales(
+            int(adquiridos.sum()), self.costo[adquiridos].sum(), acumulada.sum(), libros.sum()
+        )
+
+    def totales_por_grupo(self, fecha, metodo=LINEAL):
+        """ Totales por código de grupo con np.bincount (una pasada, sin ordenar). """
+        if self.grupos is None:
+            return []
+        acumulada, libros = self.calcular(fecha, metodo)
+        adquiridos = self.fecha_adquisicion <= np.datetime64(fecha, 'D')
+        n = len(self.etiquetas)
+        cantidad = np.bincount(self.grupos, weights=adquiridos.astype(np.float64), minlength=n)
+        costo = np.bincount(self.grupos, weights=np.where(adquiridos, self.costo, 0.0), minlength=n)
+        acumulada = np.bincount(self.grupos, weights=acumulada, minlength=n)
+        libros = np.bincount(self.grupos, weights=libros, minlength=n)
+        return [
+            dict(etiqueta, **_totales(int(cantidad[i]), costo[i], acumulada[i], libros[i]))
+            for i, etiqueta in enumerate(self.etiquetas)
+        ]
+
+    def calendario(self, desde, anios, metodo=LINEAL):
+        """ Proyección al cierre de cada año: depreciación del año y valor en libros. """
+        resultado = []
+        anterior = self.calcular(date(desde - 1, 12, 31), metodo)[0].sum()
+        for anio in range(desde, desde + anios):
+            acumulada, libros = self.calcular(date(anio, 12, 31), metodo)
+            total = acumulada.sum()
+            resultado.append({
+                'anio': anio,
+                'depreciacion': round(float(total - anterior), 2),
+                'valor_libros': round(float(libros.sum()), 2),
+            })
+            anterior = total
+        return resultado
+
+
+def _totales(cantidad, costo, acumulada, libros):
+    return {
+        'cantidad': cantidad,
+        'costo': round(float(costo), 2),
+        'depreciacion_acumulada': round(float(acumulada), 2),
+        'valor_libros': round(float(libros), 2),
+    }
+
+
+def con_depreciacion(filas, fecha, metodo=LINEAL, chunk_size=2000):
+    """
+    Para exportaciones en streaming: filas terminan en los CAMPOS del motor;
+    se calculan por lotes y se devuelven sin ellos, con (depreciación acumulada,
+    valor en libros) al final. La memoria sigue acotada por chunk_size.
+    """
+    filas = iter(filas)
+    extra = len(CAMPOS)
+    while True:
+        lote = list(islice(filas, chunk_size))
+        if not lote:
+            return
+        cartera = Cartera.desde_filas(fila[-extra:] for fila in lote)
+        acumulada, libros = cartera.calcular(fecha, metodo)
+        for fila, a, l in zip(lote, acumulada.round(2).tolist(), libros.round(2).tolist()):
+            yield fila[:-extra] + (a, l)
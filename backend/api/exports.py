@@ -0,0 +1,182 @@
+# api/exports.py
+"""
+Trabajos de exportación en segundo plano.
+
+La web sólo encola un TrabajoExportacion; 'manage.py run_export_worker' los
+reclama y genera el fichero en EXPORT_RESULTS_DIR. El nombre del fichero es la
+clave del trabajo, un hash de (empresa, formato, filtros, versión de los datos):
+si otro usuario pide el mismo reporte y los activos no cambiaron, se reutiliza
+el fichero en lugar de regenerarlo.
+
+Mientras se genera, un hilo del proceso que lo ejecuta renueva 'latido' cada
+EXPORT_JOB_HEARTBEAT segundos; sólo se re-encolan los trabajos cuyo latido
+lleva más de EXPORT_JOB_TIMEOUT segundos parado (el proceso murió), no los
+que simplemente tardan. 'fecha_inicio' identifica cada reclamo: si el trabajo
+se re-encoló y otro worker lo tomó, el primero no pisa su estado al terminar.
+"""
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import metrics
+from .cache import get_data_versions
+from .instrumentation import log_event, logger
+from .models import ActivoFijo, Estado, TrabajoExportacion, Ubicacion
+from .filtros import filtrar_activos
+from .reports import iter_rows, stream_csv, write_pdf, write_xlsx
+
+# Extensión y content-type de cada formato
+EXPORT_FORMATS = {
+    'pdf': ('pdf', 'application/pdf'),
+    'excel': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'csv': ('csv', 'text/csv; charset=utf-8'),
+}
+
+# Modelos cuyos datos aparecen en el reporte (EXPORT_COLUMNS)
+REPORT_MODELS = (ActivoFijo, Ubicacion, Estado)
+
+# Lo que ve el cliente cuando falla; el detalle queda en el log del worker
+ERROR_GENERICO = 'No se pudo generar el reporte. Inténtelo de nuevo o contacte con soporte.'
+
+
+
+def export_key(empresa_id, formato, filtros):
+    versions = get_data_versions(empresa_id, *REPORT_MODELS)
+    raw = json.dumps([str(empresa_id), formato, filtros, versions], sort_keys=True)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def result_path(trabajo):
+    extension, _ = EXPORT_FORMATS[trabajo.formato]
+    return Path(settings.EXPORT_RESULTS_DIR) / str(trabajo.empresa_id) / f'{trabajo.clave}.{extension}'
+
+
+def generar_archivo(trabajo):
+    """ Escribe el reporte del trabajo en disco (vía fichero temporal + rename atómico). """
+    path = result_path(trabajo)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    rows = iter_rows(filtrar_activos(trabajo.empresa_id, trabajo.filtros))
+    try:
+        with open(tmp, 'wb') as fh:
+            if trabajo.formato == 'excel':
+                write_xlsx(rows, fh)
+            elif trabajo.formato == 'csv':
+                for chunk in stream_csv(rows):
+                    fh.write(chunk)
+            else:
+                write_pdf(rows, fh)
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    return path
+
+
+def _reclamo(trabajo):
+    """ El trabajo mientras siga siendo de este reclamo (estado y fecha_inicio de cuando se tomó). """
+    return TrabajoExportacion.objects.filter(
+        pk=trabajo.pk, estado=TrabajoExportacion.PROCESANDO, fecha_inicio=trabajo.fecha_inicio
+    )
+
+
+@contextmanager
+def latido(trabajo):
+    """ Renueva trabajo.latido cada EXPORT_JOB_HEARTBEAT segundos mientras dura el bloque. """
+    intervalo = getattr(settings, 'EXPORT_JOB_HEARTBEAT', 30)
+    parar = threading.Event()
+
+    def renovar():
+        try:
+            while not parar.wait(intervalo):
+                _reclamo(trabajo).update(latido=timezone.now())
+        except Exception:
+            logger.exception("Error renovando el latido de la exportación %s", trabajo.pk)
+        finally:
+            connection.close() # Conexión propia del hilo
+
+    hilo = threading.Thread(target=renovar, name=f'latido-{trabajo.pk}', daemon=True)
+    hilo.start()
+    try:
+        yield
+    finally:
+        parar.set()
+        hilo.join()
+
+
+def run_export_job(trabajo_id):
+    """ Ejecuta un trabajo ya reclamado (estado 'procesando'). Corre en el pool del worker. """
+    trabajo = TrabajoExportacion.objects.get(pk=trabajo_id)
+    try:
+        with latido(trabajo), metrics.observe_duration('api_export_duration_seconds', format=trabajo.formato):
+            path = generar_archivo(trabajo)
+    except Exception:
+        logger.exception("Error generando la exportación %s", trabajo_id)
+        cambios = {'estado': TrabajoExportacion.ERROR, 'error': ERROR_GENERICO}
+    else:
+        cambios = {'estado': TrabajoExportacion.COMPLETADO, 'archivo': str(path), 'error': ''}
+    if not _reclamo(trabajo).update(fecha_fin=timezone.now(), **cambios):
+        # Se re-encoló (latido parado) y lo tomó otro reclamo: su estado manda
+        log_event('exportacion.reclamo_perdido', id=trabajo_id, formato=trabajo.formato)
+        return None
+    log_event('exportacion.fin', id=trabajo_id, estado=cambios['estado'], formato=trabajo.formato)
+    return cambios['estado']
+
+
+# --- COLA ---
+
+def claim_jobs(limit):
+    """
+    Reclama hasta 'limit' trabajos pendientes (los más antiguos primero).
+    SKIP LOCKED permite varios workers sin que dos tomen el mismo trabajo.
+    """
+    with transaction.atomic():
+        ids = list(
+            TrabajoExportacion.objects.select_for_update(skip_locked=True)
+            .filter(estado=TrabajoExportacion.PENDIENTE)
+            .order_by('fecha_creacion')
+            .values_list('pk', flat=True)[:limit]
+        )
+        if ids:
+            ahora = timezone.now()
+            TrabajoExportacion.objects.filter(pk__in=ids).update(
+                estado=TrabajoExportacion.PROCESANDO, fecha_inicio=ahora, latido=ahora
+            )
+    return ids
+
+
+def requeue_stale_jobs():
+    """
+    Devuelve a la cola los trabajos de un worker que murió a mitad de proceso:
+    los 'procesando' sin latido en EXPORT_JOB_TIMEOUT segundos.
+    """
+    limite = timezone.now() - timedelta(seconds=getattr(settings, 'EXPORT_JOB_TIMEOUT', 5 * 60))
+    return TrabajoExportacion.objects.annotate(
+        ultimo_latido=Coalesce(F('latido'), F('fecha_inicio'))
+    ).filter(
+        estado=TrabajoExportacion.PROCESANDO, ultimo_latido__lt=limite
+    ).update(estado=TrabajoExportacion.PENDIENTE, fecha_inicio=None, latido=None)
+
+
+def purge_expired_results():
+    """ Borra los ficheros (y sus trabajos) más antiguos que EXPORT_RESULTS_TTL_DAYS. """
+    limite = timezone.now() - timedelta(days=getattr(settings, 'EXPORT_RESULTS_TTL_DAYS', 7))
+    expirados = TrabajoExportacion.objects.filter(fecha_creacion__lt=limite).exclude(
+        estado__in=[TrabajoExportacion.PENDIENTE, TrabajoExportacion.PROCESANDO]
+    )
+    for archivo in expirados.exclude(archivo='').values_list('archivo', flat=True).iterator():
+        try:
+            os.remove(archivo)
+        except FileNotFoundError:
+            pass
+    return expirados.delete()[0]
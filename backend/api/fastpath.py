@@ -0,0 +1,204 @@
+# api/fastpath.py
+"""
+Camino rápido de lectura para los list de BaseTenantViewSet (fast_list = True).
+
+Un ModelSerializer construye una instancia del modelo por fila y recorre la
+maquinaria de campos de DRF (get_attribute, PKOnlyObject, ...) para cada una.
+Aquí se compila una vez por serializer un Plan: las columnas de .values() que
+necesita (con los JOINs de las FKs) y, por campo, la clave de la que sale y la
+conversión (el mismo to_representation del campo, o str/int cuando es
+equivalente). Los ManyToMany salen de una consulta extra por relación, con el
+mismo JOIN que usa prefetch_related. La salida es idéntica byte a byte a la del
+serializer.
+
+Si el serializer usa algo que el plan no sabe reproducir (SerializerMethodField,
+source='*', to_representation propio, relaciones inversas...) compilar()
+devuelve None y la vista sigue por el camino normal.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import F
+from rest_framework import fields as drf_fields, relations, serializers
+from rest_framework.fields import empty
+
+from .cache import LocalLRU
+
+# Conversiones equivalentes a to_representation para los valores que da la BD
+_IDENTICAS = {
+    drf_fields.CharField.to_representation: str,
+    drf_fields.IntegerField.to_representation: int,
+}
+
+_planes = LocalLRU(256) # (serializer, variante de ?fields=/?expand=) -> Plan | _SIN_PLAN
+_SIN_PLAN = object()
+
+
+class NoSoportado(Exception):
+    pass
+
+
+def _convertir(field):
+    """ Función valor -> representación del campo (None: el valor tal cual). """
+    metodo = type(field).to_representation
+    if metodo in _IDENTICAS:
+        return _IDENTICAS[metodo]
+    if isinstance(field, drf_fields.UUIDField) and field.uuid_format == 'hex_verbose':
+        return str
+    if isinstance(field, relations.PrimaryKeyRelatedField) and type(field).to_representation is relations.PrimaryKeyRelatedField.to_representation:
+        # DRF devuelve el pk tal cual (el renderer JSON lo pasa a texto)
+        return field.pk_field.to_representation if field.pk_field is not None else None
+    if isinstance(field, (relations.RelatedField, relations.ManyRelatedField, serializers.BaseSerializer)):
+        raise NoSoportado(field)
+    return field.to_representation
+
+
+def _ruta(model, attrs):
+    """
+    Recorre 'a.b.c' por FKs hasta un campo concreto. Devuelve (lookup de values(),
+    campo final, si algún tramo admite NULL).
+    """
+    nulo = False
+    for i, attr in enumerate(attrs):
+        try:
+            field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            raise NoSoportado(attr)
+        if not field.concrete or field.many_to_many:
+            raise NoSoportado(attr)
+        if i < len(attrs) - 1:
+            if not field.many_to_one and not field.one_to_one:
+                raise NoSoportado(attr)
+            nulo = nulo or field.null
+            model = field.related_model
+    return '__'.join(attrs), field, nulo
+
+
+class Plan:
+    """
+    Columnas de .values() y pasos para armar cada fila como la armaría el serializer.
+    'prefijo' se usa en los serializers anidados de una FK (departamento__...).
+    """
+    def __init__(self, serializer, prefijo=''):
+        if type(serializer).to_representation is not serializers.Serializer.to_representation:
+            raise NoSoportado(serializer)
+        self.model = serializer.Meta.model
+        self.columnas = []
+        self.campos = [] # (nombre, tipo, datos)
+        self.muchos = [] # (nombre, campo M2M, plan o None, conversión)
+        for field in serializer._readable_fields:
+            if field.source == '*' or isinstance(field, (drf_fields.SerializerMethodField, drf_fields.HiddenField)):
+                raise NoSoportado(field)
+            if field.default is not empty:
+                raise NoSoportado(field)
+            if isinstance(field, (serializers.ListSerializer, relations.ManyRelatedField)):
+                self._muchos(field)
+            elif isinstance(field, serializers.BaseSerializer):
+                self._anidado(field, prefijo)
+            else:
+                self._simple(field, prefijo)
+
+    def _columna(self, lookup):
+        if lookup not in self.columnas:
+            self.columnas.append(lookup)
+        return lookup
+
+    def _simple(self, field, prefijo):
+        lookup, model_field, nulo = _ruta(self.model, field.source_attrs)
+        if nulo and not field.allow_null:
+            raise NoSoportado(field) # DRF omitiría la clave (SkipField) con la FK a NULL
+        if model_field.is_relation and not isinstance(field, relations.PrimaryKeyRelatedField):
+            raise NoSoportado(field)
+        self.campos.append((field.field_name, 'simple', (self._columna(prefijo + lookup), _convertir(field))))
+
+    def _anidado(self, field, prefijo):
+        lookup, model_field, _ = _ruta(self.model, field.source_attrs)
+        if not model_field.is_relation:
+            raise NoSoportado(field)
+        plan = Plan(field, prefijo=f'{prefijo}{lookup}__')
+        if plan.muchos:
+            raise NoSoportado(field)
+        for columna in plan.columnas:
+            self._columna(columna)
+        # La FK decide si el anidado es None
+        self.campos.append((field.field_name, 'anidado', (self._columna(prefijo + lookup), plan)))
+
+    def _muchos(self, field):
+        if len(field.source_attrs) != 1:
+            raise NoSoportado(field)
+        try:
+            m2m = self.model._meta.get_field(field.source_attrs[0])
+        except FieldDoesNotExist:
+            raise NoSoportado(field)
+        if not m2m.many_to_many or not m2m.concrete:
+            raise NoSoportado(field) # Sólo ManyToManyField directos
+        if isinstance(field, serializers.ListSerializer):
+            self.muchos.append((field.field_name, m2m, Plan(field.child), None))
+        else:
+            self.muchos.append((field.field_name, m2m, None, _convertir(field.child_relation)))
+        self.campos.append((field.field_name, 'muchos', None))
+        self._columna('pk')
+
+    def valores(self, queryset, *extra):
+        """ queryset.values() con las columnas del plan (y 'extra', p. ej. las del orden). """
+        return queryset.prefetch_related(None).values(*self.columnas, *[c for c in extra if c not in self.columnas])
+
+    def fila(self, valores):
+        fila = {}
+        for nombre, tipo, datos in self.campos:
+            if tipo == 'simple':
+                lookup, convertir = datos
+                valor = valores[lookup]
+                fila[nombre] = valor if valor is None or convertir is None else convertir(valor)
+            elif tipo == 'anidado':
+                fk, plan = datos
+                fila[nombre] = None if valores[fk] is None else plan.fila(valores)
+            else:
+                fila[nombre] = None # Lo rellena convertir(), conserva la posición de la clave
+        return fila
+
+    def convertir(self, filas_valores):
+        """ Lista de dicts de .values() -> lista de representaciones. """
+        filas = [self.fila(valores) for valores in filas_valores]
+        for nombre, m2m, plan, convertir in self.muchos:
+            relacionados = self._relacionados(m2m, plan, convertir, [valores['pk'] for valores in filas_valores])
+            for fila, valores in zip(filas, filas_valores):
+                fila[nombre] = relacionados.get(valores['pk'], [])
+        return filas
+
+    def _relacionados(self, m2m, plan, convertir, pks):
+        """
+        {pk dueño: [representaciones]} con la misma consulta (y orden) que
+        prefetch_related: related.filter(<related_query_name>__in=pks).
+        """
+        if not pks:
+            return {}
+        query_name = m2m.related_query_name()
+        queryset = m2m.related_model._default_manager.filter(**{f'{query_name}__in': pks})
+        if plan is None:
+            filas = queryset.values_list(F(query_name), 'pk')
+            agrupados = {}
+            for dueno, pk in filas:
+                agrupados.setdefault(dueno, []).append(pk if convertir is None else convertir(pk))
+            return agrupados
+        filas_valores = list(queryset.values(*plan.columnas, _dueno=F(query_name)))
+        agrupados = {}
+        for valores, fila in zip(filas_valores, plan.convertir(filas_valores)):
+            agrupados.setdefault(valores['_dueno'], []).append(fila)
+        return agrupados
+
+
+def compilar(serializer_class, variante=None, construir=None):
+    """
+    Plan (cacheado por clase y variante) o None si el serializer no admite el
+    camino rápido. 'construir' arma la instancia de esa variante (por defecto
+    serializer_class()); sus errores (p. ej. ?fields= inválido) se propagan.
+    """
+    clave = (serializer_class, variante)
+    plan = _planes.get(clave)
+    if plan is None:
+        serializer = construir() if construir is not None else serializer_class()
+        try:
+            plan = Plan(getattr(serializer, 'child', serializer))
+        except NoSoportado:
+            plan = _SIN_PLAN
+        _planes.set(clave, plan)
+    return None if plan is _SIN_PLAN else plan
@@ -0,0 +1,53 @@
+# api/filtros.py
+"""
+Filtros de activos comunes a la vista previa, la exportación y los trabajos de
+exportación en segundo plano. Sin dependencias de los generadores de reportes:
+los serializers lo importan para validar los filtros de un trabajo.
+"""
+import uuid
+
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+from .models import ActivoFijo
+
+# Filtros admitidos por la vista previa, la exportación y los trabajos de exportación
+FILTER_PARAMS = ('ubicacion_id', 'fecha_min', 'fecha_max')
+
+
+def normalizar_filtros(params):
+    """ Sólo los filtros admitidos y con valor, como strings (para hashear de forma estable). """
+    return {name: str(params[name]) for name in FILTER_PARAMS if params.get(name)}
+
+
+def _convertir(name, value):
+    if name == 'ubicacion_id':
+        try:
+            return uuid.UUID(value)
+        except ValueError:
+            raise ValidationError({name: "ID de ubicación no válido."})
+    try:
+        fecha = parse_date(value)
+    except ValueError:
+        fecha = None
+    if fecha is None:
+        raise ValidationError({name: "Formato de fecha no válido (AAAA-MM-DD)."})
+    return fecha
+
+
+def parsear_filtros(params):
+    """ Filtros admitidos ya convertidos (UUID / date); ValidationError (400) si alguno no lo es. """
+    return {name: _convertir(name, value) for name, value in normalizar_filtros(params).items()}
+
+
+def filtrar_activos(empresa_id, params):
+    """ Activos de la empresa filtrados por ubicacion_id / fecha_min / fecha_max. """
+    filtros = parsear_filtros(params)
+    queryset = ActivoFijo.objects.filter(empresa_id=empresa_id)
+    if 'ubicacion_id' in filtros:
+        queryset = queryset.filter(ubicacion_id=filtros['ubicacion_id'])
+    if 'fecha_min' in filtros:
+        queryset = queryset.filter(fecha_adquisicion__gte=filtros['fecha_min'])
+    if 'fecha_max' in filtros:
+        queryset = queryset.filter(fecha_adquisicion__lte=filtros['fecha_max'])
+    return queryset.order_by('fecha_adquisicion')
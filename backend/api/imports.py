@@ -0,0 +1,337 @@
+# api/imports.py
+"""
+Importación masiva de activos fijos desde CSV o XLSX.
+
+El fichero se lee fila a fila (csv.reader / openpyxl en modo read-only) y cada
+fila se valida en Python contra mapas en memoria de la empresa: nombre de
+catálogo -> id (categoría, estado, ubicación, proveedor) y códigos internos ya
+usados. Ninguna fila consulta la BD por separado.
+
+Las filas válidas se guardan con bulk_create en bloques de IMPORT_CHUNK_SIZE,
+cada bloque en su propia transacción; las inválidas se saltan y se informan
+con su número de línea. bulk_create no dispara señales: al terminar se sube
+la versión de datos de la empresa y se marcan los activos para el histórico
+de depreciación, como harían post_save.
+"""
+import csv
+import io
+import re
+import unicodedata
+import uuid
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from openpyxl import load_workbook
+
+from .cache import bump_data_version
+from .instrumentation import log_event
+from .models import ActivoFijo, CategoriaActivo, Estado, Proveedor, Ubicacion
+from .snapshots import marcar_pendientes
+
+CSV, XLSX = 'csv', 'xlsx'
+FORMATOS = (CSV, XLSX)
+
+# Catálogos que se resuelven por nombre (o id): columna -> modelo
+CATALOGOS = {
+    'categoria': CategoriaActivo,
+    'estado': Estado,
+    'ubicacion': Ubicacion,
+    'proveedor': Proveedor,
+}
+COLUMNAS_REQUERIDAS = (
+    'nombre', 'codigo_interno', 'fecha_adquisicion', 'valor_actual', 'vida_util',
+    'categoria', 'estado', 'ubicacion',
+)
+COLUMNAS_OPCIONALES = ('proveedor',)
+# Encabezados alternativos (normalizados), p. ej. los del reporte exportado
+ALIAS = {
+    'codigo': 'codigo_interno',
+    'fecha': 'fecha_adquisicion',
+    'valor': 'valor_actual',
+    'valor_actual_bs': 'valor_actual',
+    'vida_util_anios': 'vida_util',
+    'categoria_activo': 'categoria',
+}
+FORMATOS_FECHA = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y')
+MAX_VALOR = Decimal('9999999999.99') # max_digits=12, decimal_places=2
+
+
+def normalizar(texto):
+    """ 'Código Interno' -> 'codigo_interno'. """
+    texto = unicodedata.normalize('NFKD', str(texto or '')).encode('ascii', 'ignore').decode()
+    return re.sub(r'[^a-z0-9]+', '_', texto.lower()).strip('_')
+
+
+def _clave(nombre):
+    """ Clave de búsqueda de un nombre de catálogo: sin mayúsculas ni espacios de más. """
+    return ' '.join(str(nombre).split()).casefold()
+
+
+def formato_de(nombre_fichero):
+    extension = nombre_fichero.rsplit('.', 1)[-1].lower() if '.' in nombre_fichero else ''
+    return {'csv': CSV, 'txt': CSV, 'xlsx': XLSX, 'xlsm': XLSX}.get(extension)
+
+
+# --- LECTURA ---
+
+def _filas_csv(fichero):
+    texto = io.TextIOWrapper(fichero, encoding='utf-8-sig', newline='')
+    muestra = texto.read(4096)
+    texto.seek(0)
+    try:
+        dialecto = csv.Sniffer().sniff(muestra, delimiters=',;\t')
+    except csv.Error:
+        dialecto = csv.excel
+    try:
+        yield from csv.reader(texto, dialecto)
+    finally:
+        texto.detach() # El fichero lo cierra quien lo abrió
+
+
+def _filas_xlsx(fichero):
+    libro = load_workbook(fichero, read_only=True, data_only=True)
+    try:
+        yield from libro.active.iter_rows(values_only=True)
+    finally:
+        libro.close()
+
+
+def leer_filas(fichero, formato):
+    """ (número de línea, {columna: valor}) por fila con datos, tras validar el encabezado. """
+    filas = _filas_csv(fichero) if formato == CSV else _filas_xlsx(fichero)
+    encabezado = next(filas, None)
+    if encabezado is None:
+        raise ValueError("El fichero está vacío.")
+    columnas = [ALIAS.get(normalizar(celda), normalizar(celda)) for celda in encabezado]
+    faltan = [columna for columna in COLUMNAS_REQUERIDAS if columna not in columnas]
+    if faltan:
+        raise ValueError(f"Faltan columnas: {', '.join(faltan)}.")
+    conocidas = set(COLUMNAS_REQUERIDAS + COLUMNAS_OPCIONALES)
+    for linea, valores in enumerate(filas, start=2):
+        if not any(valor not in (None, '') for valor in valores):
+            continue # Filas en blanco (frecuentes al final de un XLSX)
+        yield linea, {
+            columna: valor for columna, valor in zip(columnas, valores) if columna in conocidas
+        }
+
+
+# --- VALIDACIÓN ---
+
+class Catalogos:
+    """
+    Mapas nombre -> id de los catálogos de la empresa; crea los que falten si
+    se pide (con simular, como en dry_run, sólo los cuenta).
+    """
+
+    def __init__(self, empresa_id, crear=False, simular=False):
+        self.empresa_id = empresa_id
+        self.crear = crear
+        self.simular = simular
+        self.creados = {campo: 0 for campo in CATALOGOS}
+        self._mapas = {}
+        for campo, modelo in CATALOGOS.items():
+            mapa = {}
+            for pk, nombre in modelo.objects.filter(empresa_id=empresa_id).order_by('nombre', 'id').values_list('id', 'nombre'):
+                mapa.setdefault(_clave(nombre), pk)
+                mapa[str(pk)] = pk
+            self._mapas[campo] = mapa
+
+    def resolver(self, campo, valor):
+        """ Id del catálogo para 'valor' (nombre o id), o ValueError. """
+        valor = str(valor).strip()
+        mapa = self._mapas[campo]
+        pk = mapa.get(valor.lower()) or mapa.get(_clave(valor))
+        if pk is not None:
+            return pk
+        if not self.crear:
+            raise ValueError(f"No existe '{valor}'.")
+        modelo = CATALOGOS[campo]
+        if len(valor) > modelo._meta.get_field('nombre').max_length:
+            raise ValueError("Nombre demasiado largo.")
+        # create() dispara post_save: la versión de datos del catálogo sube sola
+        pk = uuid.uuid4() if self.simular else modelo.objects.create(empresa_id=self.empresa_id, nombre=valor).pk
+        mapa[_clave(valor)] = mapa[str(pk)] = pk
+        self.creados[campo] += 1
+        return pk
+
+
+def _texto(valor, max_length):
+    texto = str(valor).strip() if valor is not None else ''
+    if not texto:
+        raise ValueError("Obligatorio.")
+    if len(texto) > max_length:
+        raise ValueError(f"Máximo {max_length} caracteres.")
+    return texto
+
+
+def _fecha(valor):
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    texto = str(valor or '').strip()
+    try:
+        return date.fromisoformat(texto) # El caso habitual, sin probar formatos
+    except ValueError:
+        pass
+    for formato in FORMATOS_FECHA[1:]:
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            continue
+    raise ValueError("Fecha no válida (AAAA-MM-DD o DD/MM/AAAA).")
+
+
+def _decimal(valor):
+    if valor is None or str(valor).strip() == '':
+        raise ValueError("Obligatorio.")
+    try:
+        numero = Decimal(str(valor).strip().replace(' ', ''))
+    except (InvalidOperation, ValueError):
+        raise ValueError("Número no válido.")
+    if not numero.is_finite() or numero < 0 or numero > MAX_VALOR:
+        raise ValueError(f"Debe estar entre 0 y {MAX_VALOR}.")
+    return numero.quantize(Decimal('0.01'))
+
+
+def _entero_positivo(valor):
+    if valor is None or str(valor).strip() == '':
+        raise ValueError("Obligatorio.")
+    try:
+        numero = Decimal(str(valor).strip())
+    except (InvalidOperation, ValueError):
+        raise ValueError("Número entero no válido.")
+    if numero != numero.to_integral_value() or numero <= 0:
+        raise ValueError("Debe ser un entero mayor que 0.")
+    return int(numero)
+
+
+VALIDADORES = {
+    'nombre': lambda valor: _texto(valor, 100),
+    'codigo_interno': lambda valor: _texto(valor, 50),
+    'fecha_adquisicion': _fecha,
+    'valor_actual': _decimal,
+    'vida_util': _entero_positivo,
+}
+
+
+def validar_fila(datos, catalogos):
+    """ (campos del modelo, {}) si la fila es válida, o (None, {columna: error}). """
+    campos, errores = {}, {}
+    for columna, validador in VALIDADORES.items():
+        try:
+            campos[columna] = validador(datos.get(columna))
+        except ValueError as exc:
+            errores[columna] = str(exc)
+    for columna in CATALOGOS:
+        valor = datos.get(columna)
+        if valor in (None, ''):
+            if columna in COLUMNAS_REQUERIDAS:
+                errores[columna] = "Obligatorio."
+            continue
+        try:
+            campos[f'{columna}_id'] = catalogos.resolver(columna, valor)
+        except ValueError as exc:
+            errores[columna] = str(exc)
+    return (None, errores) if errores else (campos, {})
+
+
+# --- IMPORTACIÓN ---
+
+class Resultado:
+    def __init__(self, max_errores):
+        self.filas = 0
+        self.creados = 0
+        self.total_errores = 0
+        self.incompleto = False
+        self.errores = []
+        self.max_errores = max_errores
+
+    def error(self, linea, errores):
+        self.total_errores += 1
+        if len(self.errores) < self.max_errores:
+            self.errores.append({'fila': linea, 'errores': errores})
+
+    def as_dict(self, **extra):
+        return {
+            'filas': self.filas,
+            'creados': self.creados,
+            'total_errores': self.total_errores,
+            'incompleto': self.incompleto,
+            'errores': self.errores, # Los primeros max_errores
+            **extra,
+        }
+
+
+def _guardar(bloque, empresa_id, resultado, ids):
+    """ bulk_create de un bloque [(línea, ActivoFijo)] en una transacción. """
+    try:
+        with transaction.atomic():
+            ActivoFijo.objects.bulk_create([activo for _, activo in bloque])
+    except IntegrityError:
+        # Un código creado por otro proceso durante la importación: se quitan y se reintenta una vez
+        codigos = ActivoFijo.objects.filter(
+            empresa_id=empresa_id, codigo_interno__in=[activo.codigo_interno for _, activo in bloque]
+        ).values_list('codigo_interno', flat=True)
+        ocupados = set(codigos)
+        for linea, activo in bloque:
+            if activo.codigo_interno in ocupados:
+                resultado.error(linea, {'codigo_interno': "Ya existe en la empresa."})
+        bloque = [(linea, activo) for linea, activo in bloque if activo.codigo_interno not in ocupados]
+        with transaction.atomic():
+            ActivoFijo.objects.bulk_create([activo for _, activo in bloque])
+    resultado.creados += len(bloque)
+    ids.extend(activo.pk for _, activo in bloque)
+
+
+def importar_activos(fichero, formato, empresa_id, dry_run=False, crear_catalogos=False,
+                     max_filas=None, chunk_size=None, max_errores=None):
+    """
+    Importa los activos de 'fichero' (binario) en la empresa. Devuelve un dict
+    con filas, creados, total_errores y errores [{fila, errores: {columna: msg}}].
+    Lanza ValueError si el formato o el encabezado no son válidos.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato no soportado; use {' o '.join(FORMATOS)}.")
+    chunk_size = chunk_size or getattr(settings, 'IMPORT_CHUNK_SIZE', 2000)
+    resultado = Resultado(max_errores or getattr(settings, 'IMPORT_MAX_ERRORS', 1000))
+    catalogos = Catalogos(empresa_id, crear=crear_catalogos, simular=dry_run)
+    # Códigos ya usados en la empresa y en el propio fichero (unique_together)
+    codigos = set(ActivoFijo.objects.filter(empresa_id=empresa_id).values_list('codigo_interno', flat=True))
+    bloque, ids = [], []
+
+    try:
+        for linea, datos in leer_filas(fichero, formato):
+            if max_filas and resultado.filas >= max_filas:
+                # Lo anterior ya puede estar guardado: se corta aquí y se informa
+                resultado.error(linea, {'archivo': f"Máximo {max_filas} filas por importación; el resto no se procesó."})
+                resultado.incompleto = True
+                break
+            resultado.filas += 1
+            campos, errores = validar_fila(datos, catalogos)
+            if campos is not None and campos['codigo_interno'] in codigos:
+                campos, errores = None, {'codigo_interno': "Ya existe en la empresa o se repite en el fichero."}
+            if campos is None:
+                resultado.error(linea, errores)
+                continue
+            codigos.add(campos['codigo_interno'])
+            if dry_run:
+                resultado.creados += 1
+                continue
+            bloque.append((linea, ActivoFijo(empresa_id=empresa_id, **campos)))
+            if len(bloque) >= chunk_size:
+                _guardar(bloque, empresa_id, resultado, ids)
+                bloque = []
+        if bloque:
+            _guardar(bloque, empresa_id, resultado, ids)
+    finally:
+        # Los bloques ya confirmados se quedan aunque falle uno posterior (o el
+        # fichero a medio leer): su versión y sus marcas no pueden perderse
+        if ids:
+            bump_data_version(ActivoFijo, empresa_id)
+            marcar_pendientes((pk, empresa_id) for pk in ids)
+    log_event('activos.importados', empresa=empresa_id, filas=resultado.filas, creados=resultado.creados,
+              errores=resultado.total_errores, dry_run=dry_run)
+    return resultado.as_dict(dry_run=dry_run, catalogos_creados=catalogos.creados)
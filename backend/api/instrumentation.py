@@ -0,0 +1,130 @@
+# api/instrumentation.py
+"""
+Instrumentación de la API:
+
+- log_event(): logging estructurado (una línea JSON por evento) en el logger 'api'.
+  Si el nivel está deshabilitado no se construye ningún mensaje.
+- request_stats() / timed(): contadores por request (consultas y tiempo de BD por
+  alias, tiempo de serializer y de render). Sólo se activan cuando algún
+  middleware los pide; sin ellos timed() no hace nada.
+"""
+import json
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+from rest_framework.renderers import JSONRenderer
+
+logger = logging.getLogger('api')
+
+
+def log_event(event, level=logging.DEBUG, **fields):
+    """ Registra 'event' con campos estructurados, sólo si el nivel está activo. """
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={'fields': fields})
+
+
+class StructuredFormatter(logging.Formatter):
+    """ Formatea cada registro como una línea JSON: {"ts", "level", "logger", "event", ...campos}. """
+    def format(self, record):
+        data = {
+            'ts': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'event': record.getMessage(),
+        }
+        data.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+# --- CONTADORES POR REQUEST ---
+
+class RequestStats:
+    """ Acumula consultas/tiempo de BD por alias y tiempos por fase de un request. """
+    def __init__(self):
+        self.queries = {}   # alias -> nº de consultas
+        self.db_time = {}   # alias -> segundos
+        self.timings = {}   # fase ('serializer', 'render', ...) -> segundos
+
+    @property
+    def total_queries(self):
+        return sum(self.queries.values())
+
+    @property
+    def total_db_time(self):
+        return sum(self.db_time.values())
+
+    def add_time(self, name, seconds):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    def db_wrapper(self, alias):
+        """ Devuelve un execute_wrapper de Django que cuenta las consultas de 'alias'. """
+        def wrapper(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                self.queries[alias] = self.queries.get(alias, 0) + 1
+                self.db_time[alias] = self.db_time.get(alias, 0.0) + time.perf_counter() - start
+        return wrapper
+
+
+_current_stats = ContextVar('api_request_stats', default=None)
+
+
+def current_stats():
+    """ RequestStats activo o None si nadie está midiendo este request. """
+    return _current_stats.get()
+
+
+@contextmanager
+def request_stats():
+    """
+    Activa los contadores para el bloque. Es reentrante: si ya hay unos activos
+    (otro middleware) se reutilizan en lugar de contar dos veces.
+    """
+    stats = _current_stats.get()
+    if stats is not None:
+        yield stats
+        return
+
+    stats = RequestStats()
+    token = _current_stats.set(stats)
+    try:
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(stats.db_wrapper(alias)))
+            yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+@contextmanager
+def timed(name):
+    """
+    Suma al request activo el tiempo del bloque bajo 'name', descontando el
+    tiempo de BD ocurrido dentro (ya contado aparte). Sin request activo no mide.
+    """
+    stats = _current_stats.get()
+    if stats is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    db_before = stats.total_db_time
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start - (stats.total_db_time - db_before)
+        stats.add_time(name, elapsed)
+
+
+class InstrumentedJSONRenderer(JSONRenderer):
+    """ JSONRenderer que registra su tiempo como fase 'render'. """
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed('render'):
+            return super().render(data, accepted_media_type, renderer_context)
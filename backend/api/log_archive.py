@@ -0,0 +1,271 @@
+# api/log_archive.py
+"""
+Archivo en frío de la bitácora (modelo Log, BD 'logs').
+
+'manage.py archive_logs --before=FECHA' recorre los logs anteriores a FECHA
+mes a mes (cada mes es una partición, ver api/log_partitions.py) y los escribe
+en LOG_ARCHIVE_DIR, un fichero por empresa y mes:
+
+    LOG_ARCHIVE_DIR/tenant=<empresa>/<AAAA-MM>.<n>.ndjson.gz   (o .parquet)
+
+Parquet sólo si pyarrow está instalado; si no, NDJSON comprimido con gzip.
+Los ficheros se escriben con un nombre temporal y se renombran al terminar:
+sólo después se borran los logs del mes (DROP de la partición si el mes entero
+queda archivado, DELETE si no). Una ejecución repetida no pisa ficheros previos,
+añade la parte <n> siguiente.
+La retención (manage_log_partitions) borra sin archivar: este comando debe
+ejecutarse antes, con una fecha más reciente que el corte de retención.
+
+leer_archivo() responde consultas sobre lo archivado: el directorio y el nombre
+del fichero dicen empresa y mes, así que sólo se abren los que caen en el rango.
+"""
+import gzip
+import json
+import os
+import re
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count, Min
+from django.utils.dateparse import parse_datetime
+
+from .instrumentation import log_event
+from .log_partitions import LOGS_DB, inicio_mes, mes_siguiente, nombre_particion, particiones, soporta_particiones
+from .models import Log
+
+try:
+    import pyarrow
+    import pyarrow.parquet as pq
+except ImportError: # Opcional: sin pyarrow se archiva en NDJSON
+    pyarrow = None
+
+NDJSON, PARQUET = 'ndjson', 'parquet'
+EXTENSIONES = {NDJSON: 'ndjson.gz', PARQUET: 'parquet'}
+SIN_EMPRESA = 'ninguna' # Directorio de los logs sin tenant_id
+COLUMNAS = ('id', 'timestamp', 'usuario_id', 'ip_address', 'accion', 'tenant_id', 'payload')
+
+_FICHERO_RE = re.compile(r'^(\d{4})-(\d{2})\.(\d+)\.(ndjson\.gz|parquet)$')
+
+
+def directorio_archivo():
+    return Path(getattr(settings, 'LOG_ARCHIVE_DIR', settings.BASE_DIR / 'log_archive'))
+
+
+def formato_por_defecto():
+    return PARQUET if pyarrow is not None else NDJSON
+
+
+def _directorio_empresa(base, tenant_id):
+    return base / f'tenant={tenant_id or SIN_EMPRESA}'
+
+
+# --- ESCRITURA ---
+
+def _fila(values):
+    fila = dict(zip(COLUMNAS, values))
+    fila['id'] = str(fila['id'])
+    fila['timestamp'] = fila['timestamp'].isoformat()
+    fila['tenant_id'] = str(fila['tenant_id']) if fila['tenant_id'] else None
+    return fila
+
+
+class _Escritor:
+    """ Un fichero (empresa, mes): escribe en '<nombre>.tmp' y lo renombra en cerrar(). """
+
+    def __init__(self, directorio, mes, formato):
+        directorio.mkdir(parents=True, exist_ok=True)
+        partes = [int(m.group(3)) for m in map(_FICHERO_RE.match, os.listdir(directorio))
+                  if m and f'{m.group(1)}-{m.group(2)}' == mes]
+        self.ruta = directorio / f'{mes}.{max(partes, default=0) + 1}.{EXTENSIONES[formato]}'
+        self.tmp = self.ruta.with_name(self.ruta.name + '.tmp')
+        self.formato = formato
+        self.filas = 0
+        self._lote = []
+        if formato == PARQUET:
+            self._schema = pyarrow.schema([
+                ('id', pyarrow.string()), ('timestamp', pyarrow.timestamp('us', tz='UTC')),
+                ('usuario_id', pyarrow.int64()), ('ip_address', pyarrow.string()),
+                ('accion', pyarrow.string()), ('tenant_id', pyarrow.string()),
+                ('payload', pyarrow.string()), # JSON como texto
+            ])
+            self._writer = pq.ParquetWriter(self.tmp, self._schema, compression='zstd')
+        else:
+            self._file = gzip.open(self.tmp, 'wt', encoding='utf-8')
+
+    def escribir(self, values):
+        self.filas += 1
+        if self.formato == NDJSON:
+            self._file.write(json.dumps(_fila(values), ensure_ascii=False, default=str) + '\n')
+            return
+        fila = dict(zip(COLUMNAS, values))
+        fila['id'] = str(fila['id'])
+        fila['tenant_id'] = str(fila['tenant_id']) if fila['tenant_id'] else None
+        fila['payload'] = json.dumps(fila['payload'], ensure_ascii=False, default=str)
+        self._lote.append(fila)
+        if len(self._lote) >= 10000:
+            self._volcar()
+
+    def _volcar(self):
+        if self._lote:
+            self._writer.write_table(pyarrow.Table.from_pylist(self._lote, schema=self._schema))
+            self._lote = []
+
+    def cerrar(self):
+        if self.formato == PARQUET:
+            self._volcar()
+            self._writer.close()
+        else:
+            self._file.close()
+        os.replace(self.tmp, self.ruta)
+
+    def descartar(self):
+        try:
+            self.cerrar()
+        finally:
+            self.ruta.unlink(missing_ok=True)
+
+
+def _meses(antes):
+    """ Inicios de mes con logs anteriores a 'antes', del más antiguo al más reciente. """
+    primero = Log.objects.using(LOGS_DB).filter(timestamp__lt=antes).aggregate(Min('timestamp'))['timestamp__min']
+    if primero is None:
+        return []
+    meses, inicio = [], inicio_mes(primero)
+    while inicio < antes:
+        meses.append(inicio)
+        inicio = mes_siguiente(inicio)
+    return meses
+
+
+def archivar_mes(inicio, antes, directorio, formato, chunk_size=5000):
+    """
+    Escribe los logs de [inicio, min(fin de mes, antes)) por empresa.
+    Devuelve ({empresa: filas}, [rutas]).
+    """
+    fin = min(mes_siguiente(inicio), antes)
+    mes = f'{inicio:%Y-%m}'
+    filas = (
+        Log.objects.using(LOGS_DB)
+        .filter(timestamp__gte=inicio, timestamp__lt=fin)
+        .order_by('tenant_id', 'timestamp', 'id')
+        .values_list(*COLUMNAS)
+        .iterator(chunk_size=chunk_size)
+    )
+    conteo, rutas, escritor, actual = {}, [], None, object()
+    try:
+        for values in filas:
+            tenant_id = values[COLUMNAS.index('tenant_id')]
+            if tenant_id != actual:
+                if escritor is not None:
+                    escritor.cerrar()
+                    rutas.append(escritor.ruta)
+                actual = tenant_id
+                escritor = _Escritor(_directorio_empresa(directorio, tenant_id), mes, formato)
+            escritor.escribir(values)
+            conteo[str(tenant_id or SIN_EMPRESA)] = escritor.filas
+        if escritor is not None:
+            escritor.cerrar()
+            rutas.append(escritor.ruta)
+            escritor = None
+    except BaseException:
+        # Un mes a medias no se da por archivado: se quitan sus ficheros y no se borra nada
+        if escritor is not None:
+            escritor.descartar()
+        for ruta in rutas:
+            ruta.unlink(missing_ok=True)
+        raise
+    return conteo, rutas
+
+
+def _borrar_mes(inicio, antes):
+    """ DROP de la partición si el mes entero quedó archivado; si no, DELETE del tramo. """
+    fin = mes_siguiente(inicio)
+    logs = Log.objects.using(LOGS_DB)
+    nombre = nombre_particion(inicio)
+    if fin <= antes and soporta_particiones() and nombre in particiones():
+        connection = connections[LOGS_DB]
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE {connection.ops.quote_name(nombre)}')
+        # Filas del mes que hubieran caído en api_log_default
+        logs.filter(timestamp__gte=inicio, timestamp__lt=fin).delete()
+        return nombre
+    logs.filter(timestamp__gte=inicio, timestamp__lt=min(fin, antes)).delete()
+    return None
+
+
+def archivar(antes, directorio=None, formato=None, dry_run=False, chunk_size=5000):
+    """
+    Archiva y borra los logs anteriores a 'antes'. Devuelve una lista de
+    (mes, {empresa: filas}, partición eliminada o None) por mes procesado.
+    """
+    directorio = Path(directorio) if directorio else directorio_archivo()
+    formato = formato or formato_por_defecto()
+    if formato == PARQUET and pyarrow is None:
+        raise ValueError("El formato parquet requiere pyarrow.")
+    resultado = []
+    for inicio in _meses(antes):
+        mes = f'{inicio:%Y-%m}'
+        if dry_run:
+            filas = (
+                Log.objects.using(LOGS_DB)
+                .filter(timestamp__gte=inicio, timestamp__lt=min(mes_siguiente(inicio), antes))
+                .order_by().values('tenant_id').annotate(filas=Count('id'))
+            )
+            resultado.append((mes, {str(row['tenant_id'] or SIN_EMPRESA): row['filas'] for row in filas}, None))
+            continue
+        conteo, rutas = archivar_mes(inicio, antes, directorio, formato, chunk_size)
+        particion = _borrar_mes(inicio, antes)
+        log_event('logs.archivados', mes=mes, filas=sum(conteo.values()), ficheros=len(rutas), particion=particion)
+        resultado.append((mes, conteo, particion))
+    return resultado
+
+
+# --- LECTURA ---
+
+def ficheros(tenant_id, desde=None, hasta=None, directorio=None):
+    """
+    Ficheros de la empresa cuyo mes se solapa con [desde, hasta), en orden.
+    La poda es sólo por nombre: no se abre ningún fichero descartado.
+    """
+    carpeta = _directorio_empresa(Path(directorio) if directorio else directorio_archivo(), tenant_id)
+    if not carpeta.is_dir():
+        return []
+    seleccion = []
+    for nombre in os.listdir(carpeta):
+        match = _FICHERO_RE.match(nombre)
+        if not match:
+            continue # p. ej. '.tmp' de un archivado en curso
+        inicio = datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=dt_timezone.utc)
+        if (hasta is not None and inicio >= hasta) or (desde is not None and mes_siguiente(inicio) <= desde):
+            continue
+        seleccion.append((inicio, int(match.group(3)), carpeta / nombre))
+    return [ruta for _, _, ruta in sorted(seleccion)]
+
+
+def _leer(ruta):
+    if ruta.name.endswith('.parquet'):
+        if pyarrow is None:
+            raise ValueError(f"{ruta.name}: leer parquet requiere pyarrow.")
+        for lote in pq.ParquetFile(ruta).iter_batches():
+            for fila in lote.to_pylist():
+                fila['timestamp'] = fila['timestamp'].isoformat()
+                fila['payload'] = json.loads(fila['payload'])
+                yield fila
+        return
+    with gzip.open(ruta, 'rt', encoding='utf-8') as file:
+        for linea in file:
+            yield json.loads(linea)
+
+
+def leer_archivo(tenant_id, desde=None, hasta=None, accion=None, directorio=None):
+    """ Logs archivados de la empresa en [desde, hasta), del más antiguo al más reciente. """
+    for ruta in ficheros(tenant_id, desde, hasta, directorio):
+        for fila in _leer(ruta):
+            momento = parse_datetime(fila['timestamp'])
+            if (desde is not None and momento < desde) or (hasta is not None and momento >= hasta):
+                continue
+            if accion and not fila['accion'].startswith(accion):
+                continue
+            yield fila
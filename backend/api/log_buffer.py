@@ -0,0 +1,234 @@
+# api/log_buffer.py
+"""
+Escritura diferida de la bitácora (modelo Log, BD 'logs').
+
+Los requests sólo encolan instancias de Log en memoria. Un hilo por proceso las
+vuelca con bulk_create (un INSERT de varias filas por lote) cuando se junta
+LOG_BUFFER_BATCH_SIZE o pasan LOG_BUFFER_FLUSH_INTERVAL segundos.
+
+Política de pérdida (cada caso suma en api_logs_dropped_total{motivo=...}):
+- cola_llena: con LOG_BUFFER_MAX_SIZE entradas pendientes se descartan las
+  nuevas; el request nunca espera a la BD de logs.
+- error_bd: si el lote falla al insertarse se reintenta fila a fila, para que
+  una fila inválida no arrastre al resto, y sólo se descartan las que fallan.
+  Con la BD caída (OperationalError) se descarta el lote entero sin reintentos,
+  para que la memoria no crezca.
+- apagado: al salir (atexit) se escribe lo pendiente durante como mucho
+  LOG_BUFFER_SHUTDOWN_TIMEOUT segundos; el resto se pierde. Un SIGKILL pierde
+  todo lo que esté en la cola (como mucho LOG_BUFFER_MAX_SIZE entradas).
+"""
+import atexit
+import json
+import os
+import queue
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connections, transaction
+
+from . import metrics
+from .instrumentation import log_event, logger
+from .models import Log
+
+LOGS_DB = 'logs'
+POLL_INTERVAL = 0.25 # Segundos entre comprobaciones de apagado del hilo
+
+
+# --- PAYLOAD ---
+# Se compacta al encolar: payloads enormes inflan la tabla y el índice GIN
+
+_SENSITIVE_KEY = re.compile(r'pass|token|secret|clave', re.IGNORECASE)
+# Claves que identifican la entidad afectada: se conservan aunque se recorte el resto
+_ID_KEYS = ('id', 'id_creado')
+
+
+def compactar_payload(payload, depth=0):
+    """
+    Oculta claves sensibles (contraseñas, tokens) y recorta textos, listas y
+    anidamiento según LOG_PAYLOAD_MAX_STRING / _MAX_ITEMS / _MAX_DEPTH.
+    """
+    max_string = getattr(settings, 'LOG_PAYLOAD_MAX_STRING', 256)
+    max_items = getattr(settings, 'LOG_PAYLOAD_MAX_ITEMS', 20)
+    max_depth = getattr(settings, 'LOG_PAYLOAD_MAX_DEPTH', 4)
+    if isinstance(payload, str):
+        return payload if len(payload) <= max_string else payload[:max_string] + '…'
+    if isinstance(payload, dict):
+        if depth >= max_depth:
+            return '{…}'
+        return {
+            str(key): '[oculto]' if _SENSITIVE_KEY.search(str(key)) else compactar_payload(value, depth + 1)
+            for key, value in list(payload.items())[:max_items]
+        }
+    if isinstance(payload, (list, tuple)):
+        if depth >= max_depth:
+            return '[…]'
+        return [compactar_payload(value, depth + 1) for value in payload[:max_items]]
+    if payload is None or isinstance(payload, (bool, int, float)):
+        return payload
+    return compactar_payload(str(payload), depth)
+
+
+def limitar_payload(payload):
+    """ Compacta y, si aún supera LOG_PAYLOAD_MAX_BYTES, deja sólo los ids de la entidad. """
+    if payload is None:
+        return None
+    payload = compactar_payload(payload)
+    size = len(json.dumps(payload, ensure_ascii=False, default=str))
+    if size <= getattr(settings, 'LOG_PAYLOAD_MAX_BYTES', 4096):
+        return payload
+    resumen = {key: payload[key] for key in _ID_KEYS if isinstance(payload, dict) and key in payload}
+    resumen.update({'_truncado': True, '_bytes': size})
+    return resumen
+
+
+class LogBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        self._stopping = threading.Event()
+
+    @property
+    def max_size(self):
+        return getattr(settings, 'LOG_BUFFER_MAX_SIZE', 10000)
+
+    @property
+    def batch_size(self):
+        return getattr(settings, 'LOG_BUFFER_BATCH_SIZE', 500)
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, 'LOG_BUFFER_FLUSH_INTERVAL', 2.0)
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # Primer uso, o proceso hijo tras un fork: cola e hilo propios
+            self._queue = queue.Queue(maxsize=self.max_size)
+            self._stopping = threading.Event()
+            self._thread = threading.Thread(target=self._run, name='log-buffer', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    # --- PRODUCTORES (requests) ---
+
+    def enqueue(self, log):
+        """ Encola un Log sin guardar. Devuelve False si se descartó (cola llena). """
+        log.payload = limitar_payload(log.payload)
+        if not getattr(settings, 'LOG_BUFFER_ENABLED', True):
+            log.save(using=LOGS_DB)
+            return True
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(log)
+        except queue.Full:
+            self._dropped('cola_llena', 1)
+            return False
+        return True
+
+    def enqueue_many(self, logs):
+        """ Devuelve cuántos se aceptaron. """
+        return sum(1 for log in logs if self.enqueue(log))
+
+    # --- CONSUMIDOR (hilo de fondo) ---
+
+    def _next_batch(self):
+        """
+        Espera la primera entrada y junta hasta batch_size o flush_interval.
+        Las esperas son cortas para notar el apagado y escribir el lote en curso.
+        """
+        batch = []
+        deadline = None
+        while len(batch) < self.batch_size and not self._stopping.is_set():
+            timeout = POLL_INTERVAL
+            if deadline is not None:
+                timeout = min(timeout, deadline - time.monotonic())
+                if timeout <= 0:
+                    break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                continue
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+        return batch
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._next_batch()
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch):
+        connection = connections[LOGS_DB]
+        try:
+            connection.close_if_unusable_or_obsolete()
+            # Todo o nada: si falla, la reescritura fila a fila no duplica lo ya insertado
+            with transaction.atomic(using=LOGS_DB):
+                Log.objects.using(LOGS_DB).bulk_create(batch, batch_size=self.batch_size)
+        except OperationalError:
+            logger.exception("No se pudo escribir un lote de %s logs", len(batch))
+            self._dropped('error_bd', len(batch))
+        except Exception:
+            self._write_rows(batch)
+        else:
+            metrics.registry.inc('api_logs_written_total', (), len(batch))
+
+    def _write_rows(self, batch):
+        """ Un INSERT por fila tras fallar el lote: sólo se pierden las inválidas. """
+        escritos = 0
+        for indice, log in enumerate(batch):
+            try:
+                with transaction.atomic(using=LOGS_DB):
+                    log.save(using=LOGS_DB, force_insert=True)
+            except OperationalError:
+                logger.exception("No se pudo escribir un lote de %s logs", len(batch))
+                self._dropped('error_bd', len(batch) - indice)
+                break
+            except Exception:
+                logger.exception("Log descartado al escribirse: %s", log.accion)
+                self._dropped('error_bd', 1)
+            else:
+                escritos += 1
+        if escritos:
+            metrics.registry.inc('api_logs_written_total', (), escritos)
+
+    def _dropped(self, motivo, count):
+        metrics.registry.inc('api_logs_dropped_total', metrics.labels(motivo=motivo), count)
+        log_event('logs.descartados', motivo=motivo, cantidad=count)
+
+    # --- APAGADO ---
+
+    def shutdown(self, timeout=None):
+        """ Detiene el hilo y escribe lo pendiente hasta 'timeout' segundos. """
+        if self._pid != os.getpid():
+            return
+        timeout = getattr(settings, 'LOG_BUFFER_SHUTDOWN_TIMEOUT', 5.0) if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        self._stopping.set()
+        self._thread.join(timeout) # El hilo escribe su lote en curso antes de terminar
+        pending = []
+        while True:
+            try:
+                pending.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        for start in range(0, len(pending), self.batch_size):
+            if time.monotonic() >= deadline:
+                self._dropped('apagado', len(pending) - start)
+                break
+            self._write(pending[start:start + self.batch_size])
+        self._pid = None
+
+    def pending(self):
+        return self._queue.qsize() if self._pid == os.getpid() else 0
+
+
+log_buffer = LogBuffer()
+atexit.register(log_buffer.shutdown)
@@ -0,0 +1,167 @@
+# api/log_partitions.py
+"""
+Particiones mensuales de api_log (BD 'logs', sólo PostgreSQL) y retención.
+
+La tabla se particiona por RANGE(timestamp) en la migración 0006: una partición
+api_log_pAAAAMM por mes más api_log_default para lo que quede fuera. Los índices
+del modelo (tenant_id, timestamp) se declaran en la tabla padre y PostgreSQL los
+crea en cada partición, así una consulta de la última semana sólo toca las
+particiones recientes.
+
+Las particiones son de todas las empresas, así que sólo se pueden borrar
+enteras cuando vencen para la retención más larga. Las empresas con una
+retención más corta se recortan con DELETE, que por el índice y la poda de
+particiones sólo recorre las particiones antiguas. api_log_default no tiene
+mes: lo vencido para la retención más larga se borra de ella con DELETE.
+"""
+import re
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .models import Log, RetencionLogs
+
+LOGS_DB = 'logs'
+TABLE = 'api_log'
+DEFAULT_PARTITION = f'{TABLE}_default'
+_PARTITION_RE = re.compile(rf'^{TABLE}_p(\d{{4}})(\d{{2}})$')
+
+
+def _connection():
+    return connections[LOGS_DB]
+
+
+def soporta_particiones():
+    return _connection().vendor == 'postgresql'
+
+
+def inicio_mes(fecha):
+    return datetime(fecha.year, fecha.month, 1, tzinfo=dt_timezone.utc)
+
+
+def mes_siguiente(inicio):
+    return inicio.replace(year=inicio.year + 1, month=1) if inicio.month == 12 else inicio.replace(month=inicio.month + 1)
+
+
+def nombre_particion(inicio):
+    return f'{TABLE}_p{inicio:%Y%m}'
+
+
+def particiones():
+    """ {nombre: inicio del mes} de las particiones mensuales existentes. """
+    with _connection().cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = %s",
+            [TABLE],
+        )
+        nombres = [row[0] for row in cursor.fetchall()]
+    result = {}
+    for nombre in nombres:
+        match = _PARTITION_RE.match(nombre)
+        if match:
+            result[nombre] = datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=dt_timezone.utc)
+    return result
+
+
+def crear_particion(inicio):
+    """
+    Crea la partición del mes que empieza en 'inicio'. Si api_log_default ya
+    tiene filas de ese mes (no se creó a tiempo), se mueven a la partición nueva.
+    """
+    nombre, fin = nombre_particion(inicio), mes_siguiente(inicio)
+    connection = _connection()
+    quote = connection.ops.quote_name
+    with transaction.atomic(using=LOGS_DB), connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM {quote(DEFAULT_PARTITION)} WHERE "timestamp" >= %s AND "timestamp" < %s)',
+            [inicio, fin],
+        )
+        if not cursor.fetchone()[0]:
+            cursor.execute(
+                f'CREATE TABLE {quote(nombre)} PARTITION OF {quote(TABLE)} FOR VALUES FROM (%s) TO (%s)',
+                [inicio, fin],
+            )
+            return
+        cursor.execute(f'CREATE TABLE {quote(nombre)} (LIKE {quote(TABLE)} INCLUDING DEFAULTS)')
+        cursor.execute(
+            f'WITH movidas AS (DELETE FROM {quote(DEFAULT_PARTITION)} '
+            f'WHERE "timestamp" >= %s AND "timestamp" < %s RETURNING *) '
+            f'INSERT INTO {quote(nombre)} SELECT * FROM movidas',
+            [inicio, fin],
+        )
+        cursor.execute(
+            f'ALTER TABLE {quote(TABLE)} ATTACH PARTITION {quote(nombre)} FOR VALUES FROM (%s) TO (%s)',
+            [inicio, fin],
+        )
+
+
+def asegurar_particiones(meses_adelante=None, ahora=None):
+    """ Crea las particiones del mes actual y de los 'meses_adelante' siguientes. Devuelve las creadas. """
+    if meses_adelante is None:
+        meses_adelante = getattr(settings, 'LOG_PARTITIONS_AHEAD', 3)
+    existentes = particiones()
+    creadas = []
+    inicio = inicio_mes(ahora or timezone.now())
+    for _ in range(meses_adelante + 1):
+        if nombre_particion(inicio) not in existentes:
+            crear_particion(inicio)
+            creadas.append(nombre_particion(inicio))
+        inicio = mes_siguiente(inicio)
+    return creadas
+
+
+def eliminar_particiones(corte, dry_run=False):
+    """ DROP de las particiones cuyo mes termina antes de 'corte'. Devuelve sus nombres. """
+    quote = _connection().ops.quote_name
+    vencidas = sorted(nombre for nombre, inicio in particiones().items() if mes_siguiente(inicio) <= corte)
+    if not dry_run:
+        with _connection().cursor() as cursor:
+            for nombre in vencidas:
+                cursor.execute(f'DROP TABLE {quote(nombre)}')
+    return vencidas
+
+
+def recortar_default(corte, dry_run=False):
+    """ Borra de api_log_default las filas anteriores a 'corte'. Devuelve cuántas. """
+    quote = _connection().ops.quote_name
+    with _connection().cursor() as cursor:
+        if dry_run:
+            cursor.execute(f'SELECT count(*) FROM {quote(DEFAULT_PARTITION)} WHERE "timestamp" < %s', [corte])
+            return cursor.fetchone()[0]
+        cursor.execute(f'DELETE FROM {quote(DEFAULT_PARTITION)} WHERE "timestamp" < %s', [corte])
+        return cursor.rowcount
+
+
+def aplicar_retencion(ahora=None, dry_run=False):
+    """
+    Borra los logs vencidos según la retención de cada empresa.
+    Devuelve (particiones eliminadas, {empresa, 'resto' o api_log_default: filas borradas}).
+    """
+    ahora = ahora or timezone.now()
+    dias_defecto = getattr(settings, 'LOG_RETENTION_DAYS', 365)
+    politicas = dict(RetencionLogs.objects.values_list('empresa_id', 'dias'))
+    dias_max = max([dias_defecto, *politicas.values()])
+
+    eliminadas, borrados = [], {}
+    if soporta_particiones():
+        eliminadas = eliminar_particiones(ahora - timedelta(days=dias_max), dry_run)
+        # Filas anteriores a la primera partición (o escritas sin partición de su mes)
+        borrados[DEFAULT_PARTITION] = recortar_default(ahora - timedelta(days=dias_max), dry_run)
+
+    logs = Log.objects.using(LOGS_DB)
+    for empresa_id, dias in politicas.items():
+        if dias < dias_max or not soporta_particiones():
+            vencidos = logs.filter(tenant_id=empresa_id, timestamp__lt=ahora - timedelta(days=dias))
+            borrados[str(empresa_id)] = vencidos.count() if dry_run else vencidos.delete()[0]
+    if dias_defecto < dias_max or not soporta_particiones():
+        # Empresas sin política propia y logs sin empresa
+        vencidos = logs.exclude(tenant_id__in=list(politicas)).filter(
+            timestamp__lt=ahora - timedelta(days=dias_defecto)
+        )
+        borrados['resto'] = vencidos.count() if dry_run else vencidos.delete()[0]
+    return eliminadas, borrados
@@ -0,0 +1,39 @@
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from api.log_archive import EXTENSIONES, archivar, directorio_archivo, formato_por_defecto
+
+
+class Command(BaseCommand):
+    help = 'Archiva en ficheros comprimidos (por empresa y mes) los logs anteriores a una fecha y los borra de la BD.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', required=True, help='Fecha AAAA-MM-DD: se archiva todo lo anterior (UTC)')
+        parser.add_argument('--directorio', help='Destino (por defecto settings.LOG_ARCHIVE_DIR)')
+        parser.add_argument('--formato', choices=sorted(EXTENSIONES), help='ndjson o parquet (por defecto parquet si pyarrow está instalado)')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Filas por lectura del cursor')
+        parser.add_argument('--dry-run', action='store_true', help='Muestra lo que se archivaría sin escribir ni borrar')
+
+    def handle(self, *args, **options):
+        fecha = parse_date(options['before'] or '')
+        if fecha is None:
+            raise CommandError('--before debe ser una fecha AAAA-MM-DD.')
+        antes = datetime(fecha.year, fecha.month, fecha.day, tzinfo=dt_timezone.utc)
+        formato = options['formato'] or formato_por_defecto()
+        destino = options['directorio'] or directorio_archivo()
+
+        try:
+            resultado = archivar(antes, destino, formato, options['dry_run'], options['chunk_size'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        prefijo = '[dry-run] ' if options['dry_run'] else ''
+        for mes, conteo, particion in resultado:
+            detalle = ', '.join(f'{empresa}: {filas}' for empresa, filas in sorted(conteo.items())) or 'sin filas'
+            borrado = f' (partición {particion} eliminada)' if particion else ''
+            self.stdout.write(f'{prefijo}{mes}: {sum(conteo.values())} logs -> {detalle}{borrado}')
+        if not resultado:
+            self.stdout.write(f'No hay logs anteriores a {fecha}.')
+        self.stdout.write(self.style.SUCCESS(f'{prefijo}Archivo de la bitácora en {destino} ({formato}) terminado.'))
@@ -0,0 +1,215 @@
+import json
+import statistics
+import time
+import tracemalloc
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from api.cache import shared_cache
+from api.urls import router
+
+PREFIJO = '/api/'
+MEDIDAS = ('queries', 'ms', 'memoria_mb', 'bytes')
+
+
+def endpoints(page_size):
+    """
+    (nombre, método, ruta, datos) de lo que se mide: list y detail de cada
+    recurso del router (el detail con el primer id del list, ver Command.handle)
+    y las vistas sueltas de api/urls.py que sólo leen.
+    """
+    lista = []
+    for prefix, viewset, basename in router.registry:
+        nombre = basename or prefix
+        lista.append((f'{nombre}-list', 'get', f'{PREFIJO}{prefix}/', {'page_size': page_size}))
+        lista.append((f'{nombre}-detail', 'get', f'{PREFIJO}{prefix}/{{id}}/', None))
+    lista += [
+        # ?expand= de las FKs (api/sparse.py): JOINs en lugar de consultas por fila
+        ('activofijo-expand-list', 'get', f'{PREFIJO}activos-fijos/',
+         {'page_size': page_size, 'expand': 'categoria,estado,ubicacion,proveedor'}),
+        ('my-permissions', 'get', f'{PREFIJO}my-permissions/', None),
+        ('bootstrap', 'get', f'{PREFIJO}bootstrap/', None),
+        ('activos-preview', 'get', f'{PREFIJO}reportes/activos-preview/', None),
+        ('activos-export-pdf', 'get', f'{PREFIJO}reportes/activos-export/', {'format': 'pdf'}),
+        ('activos-export-excel', 'get', f'{PREFIJO}reportes/activos-export/', {'format': 'excel'}),
+        ('activos-resumen', 'get', f'{PREFIJO}reportes/activos-resumen/', {'por': 'categoria'}),
+        ('depreciacion', 'get', f'{PREFIJO}depreciacion/', None),
+        ('depreciacion-historico', 'get', f'{PREFIJO}depreciacion/historico/', None),
+    ]
+    return lista
+
+
+def _tamano(response):
+    """ Bytes del cuerpo; consume el streaming_content de FileResponse/StreamingHttpResponse. """
+    if response.streaming:
+        total = sum(len(parte) for parte in response.streaming_content)
+        response.close()
+        return total
+    return len(response.content)
+
+
+def _primer_id(response):
+    if response.status_code != 200:
+        return None
+    data = response.json()
+    filas = data.get('results', []) if isinstance(data, dict) else data
+    return filas[0].get('id') if filas and isinstance(filas[0], dict) else None
+
+
+class Command(BaseCommand):
+    help = ('Mide consultas SQL, tiempo, memoria pico y tamaño de respuesta de los endpoints de la API '
+            'y falla si se supera algún presupuesto (ver settings.BENCHMARK_BUDGETS).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', default='load_00000_00000',
+                            help='Usuario con el que se mide (por defecto el admin de la mayor empresa de generate_load_data)')
+        parser.add_argument('--password', default='empresa123')
+        parser.add_argument('--budgets', help='JSON de presupuestos (por defecto settings.BENCHMARK_BUDGETS)')
+        parser.add_argument('--repeticiones', type=int, default=5, help='Pasadas medidas por endpoint (se informa la mediana)')
+        parser.add_argument('--page-size', type=int, default=100, help='page_size de los list')
+        parser.add_argument('--solo', nargs='+', help='Nombres de endpoint a medir (por defecto todos)')
+        parser.add_argument('--caliente', action='store_true',
+                            help='Mide con la caché llena (una pasada de calentamiento y sin vaciarla); por defecto '
+                                 'se vacía antes de cada pasada, como la primera petición tras un cambio de datos')
+        parser.add_argument('--json', dest='salida', help='Escribe los resultados en este fichero JSON')
+        parser.add_argument('--comparar-fast-path', action='store_true',
+                            help='Mide los list con y sin el camino rápido (API_FAST_LIST) y comprueba que respondan lo mismo')
+
+    def handle(self, *args, **options):
+        budgets = self._budgets(options['budgets'] or settings.BENCHMARK_BUDGETS)
+        self.frio = not options['caliente']
+        self.repeticiones = max(1, options['repeticiones'])
+        client = APIClient()
+
+        credenciales = {'username': options['usuario'], 'password': options['password']}
+        resultados = {}
+        if self._elegido('token', options['solo']):
+            resultados['token'] = self.medir(client, 'post', f'{PREFIJO}token/', credenciales)
+        response = client.post(f'{PREFIJO}token/', credenciales, format='json')
+        if response.status_code != 200:
+            raise CommandError(f"No se pudo obtener el token de '{options['usuario']}' ({response.status_code}).")
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.json()['access']}")
+
+        ids, peticiones = {}, {}
+        for nombre, metodo, ruta, datos in endpoints(options['page_size']):
+            if '{id}' in ruta:
+                lista = nombre.replace('-detail', '-list')
+                if lista not in ids:
+                    ids[lista] = _primer_id(client.get(ruta.replace('{id}/', ''), {'page_size': 1}))
+                if ids[lista] is None:
+                    self.stdout.write(self.style.WARNING(f'{nombre}: sin registros, se omite.'))
+                    continue
+                ruta = ruta.format(id=ids[lista])
+            if self._elegido(nombre, options['solo']):
+                peticiones[nombre] = (ruta, datos)
+                resultados[nombre] = self.medir(client, metodo, ruta, datos)
+
+        if options['comparar_fast_path']:
+            return self.comparar_fast_path(client, resultados, peticiones)
+
+        fallos = self._comprobar(resultados, budgets)
+        self._tabla(resultados, fallos)
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as fichero:
+                json.dump({'resultados': resultados, 'fallos': fallos}, fichero, indent=2)
+        if fallos:
+            raise CommandError(f'{len(fallos)} presupuesto(s) superado(s):\n' + '\n'.join(fallos))
+        self.stdout.write(self.style.SUCCESS(f'{len(resultados)} endpoints dentro de presupuesto.'))
+
+    def _elegido(self, nombre, solo):
+        return not solo or nombre in solo
+
+    def _budgets(self, ruta):
+        try:
+            with open(ruta, encoding='utf-8') as fichero:
+                data = json.load(fichero)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f'No se pudo leer {ruta}: {exc}')
+        return data
+
+    def _pasada(self, client, metodo, ruta, datos):
+        if self.frio:
+            # Sin tokens de versión, lo guardado en los LRU de cada proceso tampoco vale
+            shared_cache().clear()
+        opciones = {'format': 'json'} if metodo == 'post' else {}
+        inicio = time.perf_counter()
+        response = getattr(client, metodo)(ruta, datos, **opciones)
+        tamano = _tamano(response)
+        return response, tamano, (time.perf_counter() - inicio) * 1000
+
+    def medir(self, client, metodo, ruta, datos):
+        """
+        Una pasada con tracemalloc (memoria pico) y 'repeticiones' contando
+        consultas por BD y tiempo (mediana). Con --caliente, antes una pasada de
+        calentamiento que llena la caché.
+        """
+        if not self.frio:
+            self._pasada(client, metodo, ruta, datos)
+
+        tracemalloc.start()
+        try:
+            self._pasada(client, metodo, ruta, datos)
+            memoria = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        tiempos, queries = [], {}
+        for _ in range(self.repeticiones):
+            with ExitStack() as stack:
+                capturas = {alias: stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in settings.DATABASES}
+                response, tamano, ms = self._pasada(client, metodo, ruta, datos)
+            tiempos.append(ms)
+            for alias, captura in capturas.items():
+                queries[alias] = max(queries.get(alias, 0), len(captura))
+        return {
+            'ruta': ruta,
+            'status': response.status_code,
+            'queries': sum(queries.values()),
+            'queries_por_bd': queries,
+            'ms': round(statistics.median(tiempos), 1),
+            'memoria_mb': round(memoria / 2**20, 2),
+            'bytes': tamano,
+        }
+
+    def comparar_fast_path(self, client, resultados, peticiones):
+        """ Mediana de cada list con API_FAST_LIST=False y True; falla si el cuerpo cambia. """
+        distintos = []
+        self.stdout.write(f"{'endpoint':<32} {'serializer ms':>14} {'fast ms':>9} {'x':>6}")
+        for nombre, medida in resultados.items():
+            if not nombre.endswith('-list'):
+                continue
+            ruta, datos = peticiones[nombre]
+            with override_settings(API_FAST_LIST=False):
+                lento = self.medir(client, 'get', ruta, datos)
+                cuerpo = client.get(ruta, datos).content
+            if client.get(ruta, datos).content != cuerpo:
+                distintos.append(nombre)
+            x = lento['ms'] / medida['ms'] if medida['ms'] else 0
+            self.stdout.write(f"{nombre:<32} {lento['ms']:>14} {medida['ms']:>9} {x:>6.2f}")
+        if distintos:
+            raise CommandError(f"El camino rápido cambia la respuesta de: {', '.join(distintos)}")
+        self.stdout.write(self.style.SUCCESS('Respuestas idénticas con y sin el camino rápido.'))
+
+    def _comprobar(self, resultados, budgets):
+        defaults = budgets.get('defaults', {})
+        fallos = []
+        for nombre, medida in resultados.items():
+            if medida['status'] >= 400:
+                fallos.append(f"{nombre}: respondió {medida['status']}")
+            limites = {**defaults, **budgets.get('endpoints', {}).get(nombre, {})}
+            for clave in MEDIDAS:
+                if limites.get(clave) is not None and medida[clave] > limites[clave]:
+                    fallos.append(f'{nombre}: {clave} = {medida[clave]} > {limites[clave]}')
+        return fallos
+
+    def _tabla(self, resultados, fallos):
+        con_fallo = {fallo.split(':')[0] for fallo in fallos}
+        self.stdout.write(f"{'endpoint':<32} {'status':>6} {'queries':>8} {'ms':>9} {'MB':>8} {'bytes':>10}")
+        for nombre, m in resultados.items():
+            linea = f"{nombre:<32} {m['status']:>6} {m['queries']:>8} {m['ms']:>9} {m['memoria_mb']:>8} {m['bytes']:>10}"
+            self.stdout.write(self.style.ERROR(linea) if nombre in con_fallo else linea)
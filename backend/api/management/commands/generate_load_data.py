@@ -0,0 +1,293 @@
+import multiprocessing
+import os
+import random
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from api.models import (
+    ActivoFijo, Cargo, CategoriaActivo, Departamento, Empleado, Empresa, Estado,
+    Log, Permisos, Presupuesto, Proveedor, Roles, Ubicacion,
+)
+from api.snapshots import marcar_pendientes
+
+PASSWORD = 'empresa123' # La misma que seed_data
+LOGS_DB = 'logs'
+
+CATEGORIAS = ['Laptops', 'Servidores', 'Mobiliario', 'Vehículos', 'Maquinaria', 'Herramientas', 'Redes',
+              'Impresoras', 'Climatización', 'Telefonía', 'Inmuebles', 'Software', 'Laboratorio', 'Cocina']
+ESTADOS = [('Nuevo', 20), ('En Uso', 60), ('Mantenimiento', 8), ('En Reparación', 4), ('De Baja', 8)]
+DEPARTAMENTOS = ['TI', 'Finanzas', 'Operaciones', 'Logística', 'Ventas', 'RRHH', 'Legal', 'Producción', 'Compras', 'Calidad']
+CARGOS = ['Gerente', 'Analista', 'Técnico', 'Asistente', 'Supervisor', 'Contador', 'Operario', 'Jefe de Área']
+ROLES = ['Admin', 'Gestor de Activos', 'Auditor', 'Consulta']
+NOMBRES = ['Ana', 'Carlos', 'Lucía', 'Jorge', 'María', 'Luis', 'Sofía', 'Diego', 'Valeria', 'Andrés']
+APELLIDOS = ['Gómez', 'Vega', 'Méndez', 'Rojas', 'Flores', 'Quispe', 'Mamani', 'Torrez', 'Vargas', 'Rivera']
+ACCIONES = [('UPDATE', 50), ('CREATE', 30), ('DELETE', 5), ('IMPORT', 1), ('EXPORT', 14)]
+MODELOS_LOG = ['ActivoFijo', 'Ubicacion', 'Estado', 'Empleado', 'Presupuesto']
+FECHA_INICIO = date(2010, 1, 1)
+
+
+def tamanos(total, partes, sesgo):
+    """
+    Reparte 'total' entre 'partes' con pesos de Zipf (1/rango^sesgo): unas pocas
+    empresas enormes y muchas pequeñas. Cada parte recibe al menos 1.
+    """
+    if partes == 0:
+        return []
+    pesos = [1 / (rango ** sesgo) for rango in range(1, partes + 1)]
+    suma = sum(pesos)
+    return [max(1, round(total * peso / suma)) for peso in pesos]
+
+
+def _uuid(rng):
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+
+def _acumulados(pesos):
+    acumulados, total = [], 0
+    for peso in pesos:
+        total += peso
+        acumulados.append(total)
+    return acumulados
+
+
+def _zipf(n, sesgo=1.1):
+    """ Pesos acumulados de Zipf para elegir entre n elementos con rng.choices. """
+    return _acumulados([1 / (rango ** sesgo) for rango in range(1, n + 1)])
+
+
+def _bloques(filas, chunk_size):
+    bloque = []
+    for fila in filas:
+        bloque.append(fila)
+        if len(bloque) >= chunk_size:
+            yield bloque
+            bloque = []
+    if bloque:
+        yield bloque
+
+
+def _guardar(model, filas, chunk_size, using='default'):
+    total = 0
+    for bloque in _bloques(filas, chunk_size):
+        model.objects.using(using).bulk_create(bloque, batch_size=chunk_size)
+        total += len(bloque)
+    return total
+
+
+def generar_empresa(tarea):
+    """
+    Crea una empresa completa. Todo sale de un Random propio (prefijo, semilla, índice):
+    UUIDs, nombres, importes y fechas son los mismos sin importar el proceso ni el
+    orden de ejecución. La excepción son los id autoincrementales de User (y con
+    ellos Log.usuario_id): con --workers > 1 dependen de qué empresa inserte antes;
+    el usuario elegido en cada log, identificado por su username, no cambia.
+    """
+    indice, prefijo, semilla, activos, empleados, logs, password_hash, permisos, chunk_size = tarea
+    rng = random.Random(f'{prefijo}-{semilla}-{indice}')
+    connections.close_all() # Tras el fork: conexiones propias del proceso
+    inicio = time.perf_counter()
+
+    empresa = Empresa.objects.create(
+        id=_uuid(rng), nombre=f'{prefijo} {indice:05d}', nit=f'{prefijo[:6]}{semilla % 1000:03d}{indice:07d}',
+        email=f'contacto{indice}@{prefijo.lower()}.test',
+    )
+    eid = empresa.pk
+    # Catálogos: más grandes cuanto más grande es la empresa
+    escala = max(1, activos // 2000)
+
+    def catalogo(model, nombres, **extra):
+        objs = [model(id=_uuid(rng), empresa_id=eid, nombre=nombre, **extra) for nombre in nombres]
+        model.objects.bulk_create(objs)
+        return [obj.pk for obj in objs]
+
+    departamentos = catalogo(Departamento, DEPARTAMENTOS[:rng.randint(3, len(DEPARTAMENTOS))])
+    cargos = catalogo(Cargo, CARGOS[:rng.randint(3, len(CARGOS))])
+    categorias = catalogo(CategoriaActivo, rng.sample(CATEGORIAS, rng.randint(4, len(CATEGORIAS))))
+    estados = catalogo(Estado, [nombre for nombre, _ in ESTADOS])
+    ubicaciones = catalogo(Ubicacion, [f'Sede {n // 5 + 1} - Piso {n % 5 + 1}' for n in range(min(500, 2 + 3 * escala))])
+    proveedores = catalogo(Proveedor, [f'Proveedor {n + 1:04d}' for n in range(min(2000, 5 + 10 * escala))])
+    roles = catalogo(Roles, ROLES[:rng.randint(2, len(ROLES))])
+    Roles.permisos.through.objects.bulk_create([
+        Roles.permisos.through(roles_id=rol, permisos_id=permiso)
+        for posicion, rol in enumerate(roles)
+        for permiso in (permisos if posicion == 0 else rng.sample(permisos, len(permisos) // (posicion + 1)))
+    ])
+
+    # Usuarios y empleados (un solo hash de contraseña para todos)
+    usuarios = [
+        User(username=f'{prefijo.lower()}_{indice:05d}_{n:05d}', password=password_hash,
+             first_name=rng.choice(NOMBRES), email=f'u{n}@e{indice}.{prefijo.lower()}.test')
+        for n in range(empleados)
+    ]
+    User.objects.bulk_create(usuarios, batch_size=chunk_size)
+    usuario_ids = list(User.objects.filter(username__startswith=f'{prefijo.lower()}_{indice:05d}_')
+                       .order_by('username').values_list('id', flat=True))
+    empleados_objs = [
+        Empleado(id=_uuid(rng), usuario_id=usuario_id, empresa_id=eid, ci=str(rng.randint(1000000, 9999999)),
+                 apellido_p=rng.choice(APELLIDOS), apellido_m=rng.choice(APELLIDOS),
+                 sueldo=Decimal(rng.randint(2500, 25000)), cargo_id=rng.choice(cargos),
+                 departamento_id=rng.choice(departamentos))
+        for usuario_id in usuario_ids
+    ]
+    _guardar(Empleado, empleados_objs, chunk_size)
+    _guardar(Empleado.roles.through, (
+        Empleado.roles.through(empleado_id=empleado.pk, roles_id=roles[0 if n == 0 else rng.randrange(len(roles))])
+        for n, empleado in enumerate(empleados_objs)
+    ), chunk_size)
+
+    presupuestos = _guardar(Presupuesto, (
+        Presupuesto(id=_uuid(rng), empresa_id=eid, departamento_id=departamento,
+                    monto=Decimal(rng.randint(1000, 500000)), fecha=date(anio, mes, 1))
+        for departamento in departamentos for anio in (2023, 2024, 2025) for mes in range(1, 13, 3)
+    ), chunk_size)
+
+    # Activos: categorías y ubicaciones con sesgo de Zipf, compras más frecuentes en años recientes
+    pesos_categoria, pesos_ubicacion = _zipf(len(categorias)), _zipf(len(ubicaciones))
+    pesos_estado = _acumulados([peso for _, peso in ESTADOS])
+    dias = (date(2025, 12, 31) - FECHA_INICIO).days
+    prefijo_codigo = f'E{indice:05d}'
+
+    def activos_gen():
+        for n in range(activos):
+            yield ActivoFijo(
+                id=_uuid(rng), empresa_id=eid, nombre=f'{rng.choice(CATEGORIAS)} {n + 1}',
+                codigo_interno=f'{prefijo_codigo}-{n + 1:07d}',
+                fecha_adquisicion=FECHA_INICIO + timedelta(days=int(rng.betavariate(2, 1) * dias)),
+                valor_actual=Decimal(min(9_999_999_999, round(rng.lognormvariate(7.5, 1.3), 2))).quantize(Decimal('0.01')),
+                vida_util=rng.choice((3, 5, 5, 10, 10, 20)),
+                categoria_id=rng.choices(categorias, cum_weights=pesos_categoria)[0],
+                estado_id=rng.choices(estados, cum_weights=pesos_estado)[0],
+                ubicacion_id=rng.choices(ubicaciones, cum_weights=pesos_ubicacion)[0],
+                proveedor_id=rng.choice(proveedores) if rng.random() < 0.7 else None,
+            )
+
+    creados = 0
+    for bloque in _bloques(activos_gen(), chunk_size):
+        ActivoFijo.objects.bulk_create(bloque, batch_size=chunk_size)
+        # bulk_create no dispara post_save: sin marca, refresh_depreciacion no los vería
+        marcar_pendientes([(activo.pk, eid) for activo in bloque])
+        creados += len(bloque)
+
+    # Bitácora en la BD 'logs': más actividad reciente y de unos pocos usuarios
+    ahora = timezone.now()
+    pesos_accion, pesos_usuario = _acumulados([peso for _, peso in ACCIONES]), _zipf(len(usuario_ids))
+    acciones = [accion for accion, _ in ACCIONES]
+
+    def logs_gen():
+        for _ in range(logs):
+            accion = rng.choices(acciones, cum_weights=pesos_accion)[0]
+            yield Log(
+                id=_uuid(rng), timestamp=ahora - timedelta(seconds=int(rng.random() ** 2 * 540 * 86400)),
+                usuario_id=rng.choices(usuario_ids, cum_weights=pesos_usuario)[0] if usuario_ids else None,
+                ip_address=f'10.{indice % 256}.{rng.randrange(256)}.{rng.randrange(1, 255)}',
+                accion=f'{accion}: {rng.choice(MODELOS_LOG)}', tenant_id=eid,
+                payload={'id': str(_uuid(rng)), 'cambios': {'estado': [None, 'En Uso']}},
+            )
+
+    logs_creados = _guardar(Log, logs_gen(), chunk_size, using=LOGS_DB)
+    return {
+        'empresa': empresa.nombre, 'activos': creados, 'empleados': len(empleados_objs),
+        'presupuestos': presupuestos, 'logs': logs_creados, 'segundos': time.perf_counter() - inicio,
+    }
+
+
+class Command(BaseCommand):
+    help = ('Genera datos sintéticos a gran escala (empresas de tamaño muy desigual, activos, empleados, '
+            'catálogos, presupuestos y bitácora) para pruebas de carga. Determinista según --seed '
+            '(salvo los id numéricos de los usuarios con --workers > 1).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--empresas', type=int, default=20)
+        parser.add_argument('--activos-por-empresa', type=int, default=5000, help='Media; el total se reparte con sesgo')
+        parser.add_argument('--empleados', type=int, default=50, help='Media de empleados por empresa')
+        parser.add_argument('--logs', type=int, default=20000, help='Media de registros de bitácora por empresa')
+        parser.add_argument('--sesgo', type=float, default=1.1, help='Exponente de Zipf del tamaño de las empresas (0 = iguales)')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--prefijo', default='LOAD', help='Prefijo de los nombres de empresa y usuario generados')
+        parser.add_argument('--workers', type=int, default=min(8, os.cpu_count() or 1), help='Procesos en paralelo (1 en SQLite)')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Filas por bulk_create')
+        parser.add_argument('--limpiar', action='store_true', help='Borra antes los datos generados con el mismo prefijo')
+
+    def handle(self, *args, **options):
+        prefijo, n = options['prefijo'], options['empresas']
+        if not prefijo.isalnum():
+            raise CommandError('--prefijo debe ser alfanumérico.')
+        generadas = Empresa.objects.filter(nombre__startswith=f'{prefijo} ')
+        if generadas.exists() or User.objects.filter(username__startswith=f'{prefijo.lower()}_').exists():
+            if not options['limpiar']:
+                raise CommandError(f"Ya hay empresas '{prefijo} ...'; use --limpiar o otro --prefijo.")
+            self.limpiar(prefijo, generadas)
+
+        if not Permisos.objects.exists():
+            call_command('create_permissions', stdout=self.stdout)
+        permisos = list(Permisos.objects.order_by('nombre').values_list('id', flat=True))
+
+        activos = tamanos(n * options['activos_por_empresa'], n, options['sesgo'])
+        empleados = tamanos(n * options['empleados'], n, options['sesgo'])
+        logs = tamanos(n * options['logs'], n, options['sesgo'])
+        password_hash = make_password(PASSWORD) # Un hash para todos: el hasher es lento a propósito
+        tareas = [
+            (i, prefijo, options['seed'], activos[i], empleados[i], logs[i], password_hash, permisos, options['chunk_size'])
+            for i in range(n)
+        ]
+
+        workers = max(1, options['workers'])
+        if connections['default'].vendor == 'sqlite' or connections[LOGS_DB].vendor == 'sqlite':
+            workers = 1 # SQLite serializa las escrituras: en paralelo sólo habría bloqueos
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            workers = 1
+
+        inicio = time.perf_counter()
+        totales = {'activos': 0, 'empleados': 0, 'presupuestos': 0, 'logs': 0}
+        if workers == 1:
+            resultados = map(generar_empresa, tareas)
+        else:
+            # Hijos por fork: heredan Django ya configurado y abren sus propias conexiones
+            connections.close_all()
+            pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork'))
+            resultados = pool.map(generar_empresa, tareas) # Las más grandes primero (índices bajos)
+        try:
+            for resultado in resultados:
+                for clave in totales:
+                    totales[clave] += resultado[clave]
+                self.stdout.write(
+                    f"{resultado['empresa']}: {resultado['activos']} activos, {resultado['empleados']} empleados, "
+                    f"{resultado['logs']} logs ({resultado['segundos']:.1f} s)"
+                )
+        finally:
+            if workers > 1:
+                pool.shutdown()
+
+        segundos = time.perf_counter() - inicio
+        filas = sum(totales.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"{n} empresas: {totales['activos']} activos, {totales['empleados']} empleados, "
+            f"{totales['presupuestos']} presupuestos, {totales['logs']} logs en {segundos:.1f} s "
+            f"({filas / max(segundos, 1e-9):,.0f} filas/s, {workers} procesos)."
+        ))
+        self.stdout.write(
+            f"Usuarios '{prefijo.lower()}_<empresa>_<n>' con contraseña {PASSWORD}. Siguientes pasos opcionales: "
+            "manage.py manage_log_partitions y manage.py refresh_depreciacion."
+        )
+
+    def limpiar(self, prefijo, generadas):
+        ids = list(generadas.values_list('id', flat=True))
+        self.stdout.write(self.style.WARNING(f'Borrando {len(ids)} empresas (y sus usuarios) generadas con el prefijo {prefijo}...'))
+        Log.objects.using(LOGS_DB).filter(tenant_id__in=ids).delete()
+        # Activos primero: sus FKs a los catálogos son PROTECT
+        ActivoFijo.objects.filter(empresa_id__in=ids).delete()
+        generadas.delete() # Empleados, catálogos, roles y presupuestos en cascada
+        # Sin el Collector: seguiría la FK Log.usuario, que vive en la BD 'logs'. Los
+        # usuarios generados no tienen grupos ni permisos propios, y sus logs ya se borraron
+        usuarios = User.objects.filter(username__startswith=f'{prefijo.lower()}_')
+        usuarios._raw_delete(usuarios.db)
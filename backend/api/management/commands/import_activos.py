@@ -0,0 +1,55 @@
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from api.imports import FORMATOS, formato_de, importar_activos
+from api.models import Empresa
+
+
+class Command(BaseCommand):
+    help = 'Importa activos fijos de una empresa desde un CSV o XLSX (catálogos por nombre).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del fichero CSV o XLSX')
+        parser.add_argument('--empresa', required=True, help='ID de la empresa destino')
+        parser.add_argument('--formato', choices=FORMATOS, help='Por defecto, según la extensión')
+        parser.add_argument('--crear-catalogos', action='store_true', help='Crea las categorías, estados, ubicaciones y proveedores que no existan')
+        parser.add_argument('--dry-run', action='store_true', help='Sólo valida; no guarda nada')
+        parser.add_argument('--chunk-size', type=int, help='Filas por bulk_create (por defecto settings.IMPORT_CHUNK_SIZE)')
+
+    def handle(self, *args, **options):
+        try:
+            empresa = Empresa.objects.get(pk=options['empresa'])
+        except (Empresa.DoesNotExist, ValidationError):
+            raise CommandError(f"No existe la empresa {options['empresa']}")
+        formato = options['formato'] or formato_de(options['archivo'])
+
+        inicio = time.perf_counter()
+        try:
+            with open(options['archivo'], 'rb') as fichero:
+                resultado = importar_activos(
+                    fichero, formato, empresa.pk,
+                    dry_run=options['dry_run'],
+                    crear_catalogos=options['crear_catalogos'],
+                    chunk_size=options['chunk_size'],
+                )
+        except OSError as exc:
+            raise CommandError(str(exc))
+        except ValueError as exc:
+            raise CommandError(f"{options['archivo']}: {exc}")
+        segundos = time.perf_counter() - inicio
+
+        for error in resultado['errores']:
+            detalle = '; '.join(f'{columna}: {mensaje}' for columna, mensaje in error['errores'].items())
+            self.stdout.write(self.style.WARNING(f"Fila {error['fila']}: {detalle}"))
+        if resultado['total_errores'] > len(resultado['errores']):
+            self.stdout.write(f"... y {resultado['total_errores'] - len(resultado['errores'])} filas con errores más")
+        creados = {campo: n for campo, n in resultado['catalogos_creados'].items() if n}
+        if creados:
+            self.stdout.write(f"Catálogos creados: {', '.join(f'{campo}: {n}' for campo, n in creados.items())}")
+        prefijo = '[dry-run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefijo}{empresa.nombre}: {resultado['creados']} de {resultado['filas']} activos importados "
+            f"({resultado['total_errores']} filas con errores) en {segundos:.1f} s."
+        ))
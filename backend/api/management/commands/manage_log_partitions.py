@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from api.log_partitions import aplicar_retencion, asegurar_particiones, soporta_particiones
+
+
+class Command(BaseCommand):
+    help = 'Crea las particiones mensuales futuras de la bitácora y borra los logs vencidos por empresa.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meses-adelante', type=int, help='Meses futuros a pre-crear (por defecto settings.LOG_PARTITIONS_AHEAD)')
+        parser.add_argument('--sin-retencion', action='store_true', help='Sólo crea particiones, no borra nada')
+        parser.add_argument('--dry-run', action='store_true', help='Muestra lo que se borraría sin borrarlo')
+
+    def handle(self, *args, **options):
+        if soporta_particiones():
+            creadas = [] if options['dry_run'] else asegurar_particiones(options['meses_adelante'])
+            self.stdout.write(f"Particiones creadas: {', '.join(creadas) or 'ninguna'}")
+        else:
+            self.stdout.write(self.style.WARNING('La BD de logs no es PostgreSQL: sin particiones, la retención usa DELETE.'))
+
+        if options['sin_retencion']:
+            return
+        eliminadas, borrados = aplicar_retencion(dry_run=options['dry_run'])
+        prefijo = '[dry-run] ' if options['dry_run'] else ''
+        self.stdout.write(f"{prefijo}Particiones eliminadas: {', '.join(eliminadas) or 'ninguna'}")
+        for empresa, filas in borrados.items():
+            self.stdout.write(f'{prefijo}{empresa}: {filas} logs vencidos borrados')
+        self.stdout.write(self.style.SUCCESS('Mantenimiento de la bitácora terminado.'))
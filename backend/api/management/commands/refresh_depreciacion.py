@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from api.depreciation import METODOS
+from api.models import ActivoFijo, Empresa
+from api.snapshots import marcar_pendientes, refrescar_empresa, ultimo_cierre
+
+
+class Command(BaseCommand):
+    help = 'Actualiza el histórico mensual de depreciación (sólo activos modificados y meses nuevos).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--empresa', help='ID de una empresa (por defecto, todas)')
+        parser.add_argument('--hasta', help='Último cierre a materializar, AAAA-MM-DD (por defecto, fin del mes anterior)')
+        parser.add_argument('--metodo', action='append', choices=METODOS,
+                            help='Método a materializar (repetible; por defecto settings.DEPRECIACION_METODOS_MENSUALES)')
+        parser.add_argument('--completo', action='store_true', help='Recalcula todos los activos, no sólo los marcados')
+
+    def handle(self, *args, **options):
+        hasta = ultimo_cierre()
+        if options['hasta']:
+            hasta = parse_date(options['hasta'])
+            if hasta is None:
+                raise CommandError('--hasta debe tener el formato AAAA-MM-DD')
+
+        empresas = Empresa.objects.all()
+        if options['empresa']:
+            empresas = empresas.filter(pk=options['empresa'])
+            if not empresas.exists():
+                raise CommandError(f"No existe la empresa {options['empresa']}")
+
+        for empresa_id, nombre in empresas.values_list('id', 'nombre'):
+            if options['completo']:
+                marcar_pendientes(ActivoFijo.objects.filter(empresa_id=empresa_id).values_list('id', 'empresa_id'))
+            meses, recalculados = refrescar_empresa(empresa_id, hasta, options['metodo'])
+            self.stdout.write(f'{nombre}: meses añadidos {meses}, activos recalculados {recalculados}')
+
+        self.stdout.write(self.style.SUCCESS(f'Histórico de depreciación actualizado hasta {hasta}.'))
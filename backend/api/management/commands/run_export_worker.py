@@ -0,0 +1,72 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+
+# Segundos entre tareas de mantenimiento (re-encolar trabajos colgados, purgar ficheros)
+MAINTENANCE_INTERVAL = 60
+
+
+# Los procesos del pool se crean con 'spawn': cada uno arranca Django desde cero
+# y abre sus propias conexiones (no comparte sockets con el padre). Por eso este
+# módulo no importa modelos al cargarse: el hijo lo importa antes de django.setup().
+
+def _init_worker():
+    django.setup()
+
+
+def _run_job(trabajo_id):
+    from api.exports import run_export_job
+    return run_export_job(trabajo_id)
+
+
+class Command(BaseCommand):
+    help = 'Procesa los trabajos de exportación pendientes (PDF/Excel/CSV) con un pool de procesos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=2, help='Procesos generando reportes en paralelo')
+        parser.add_argument('--intervalo', type=float, default=2.0, help='Segundos entre sondeos de la cola vacía')
+        parser.add_argument('--una-vez', action='store_true', help='Procesa lo pendiente y termina')
+
+    def handle(self, *args, **options):
+        from api.exports import claim_jobs, purge_expired_results, requeue_stale_jobs
+
+        procesos = max(1, options['procesos'])
+        self.stdout.write(self.style.NOTICE(f'Worker de exportaciones iniciado ({procesos} procesos).'))
+
+        context = multiprocessing.get_context('spawn')
+        last_maintenance = 0.0
+        running = set()
+        with ProcessPoolExecutor(max_workers=procesos, mp_context=context, initializer=_init_worker) as pool:
+            try:
+                while True:
+                    if time.monotonic() - last_maintenance > MAINTENANCE_INTERVAL:
+                        requeued = requeue_stale_jobs()
+                        purged = purge_expired_results()
+                        if requeued or purged:
+                            self.stdout.write(f'Re-encolados: {requeued}, purgados: {purged}')
+                        last_maintenance = time.monotonic()
+
+                    claimed = claim_jobs(procesos - len(running)) if len(running) < procesos else []
+                    for trabajo_id in claimed:
+                        self.stdout.write(f'Procesando {trabajo_id}')
+                        running.add(pool.submit(_run_job, trabajo_id))
+
+                    finished = {future for future in running if future.done()}
+                    for future in finished:
+                        try:
+                            future.result()
+                        except Exception as e: # El proceso hijo murió: el trabajo se re-encolará por timeout
+                            self.stderr.write(self.style.ERROR(f'Error en el pool: {e}'))
+                    running -= finished
+
+                    if options['una_vez'] and not claimed and not running:
+                        break
+                    if not claimed:
+                        time.sleep(options['intervalo'] if not running else 0.2)
+            except KeyboardInterrupt:
+                self.stdout.write(self.style.WARNING('Deteniendo worker...'))
+
+        self.stdout.write(self.style.SUCCESS('Worker de exportaciones detenido.'))
@@ -0,0 +1,299 @@
+# api/metrics.py
+"""
+Métricas estilo Prometheus en proceso, expuestas en /api/metrics/.
+
+- Cada hilo escribe en su propio "shard" (dicts sin lock); el lock sólo se toma
+  al registrar un hilo nuevo o al leer. Una lectura concurrente puede ver un
+  histograma a medio actualizar, nunca corromperlo.
+- Modo multiproceso (settings.METRICS_MULTIPROC_DIR): cada proceso vuelca su
+  snapshot a un fichero JSON propio cada METRICS_FLUSH_INTERVAL segundos y el
+  scrape suma todos los ficheros, así los contadores son correctos aunque el
+  request de /metrics/ lo atienda un solo worker de gunicorn. Los ficheros de
+  procesos ya terminados se suman a metrics-terminados.json y se borran: el
+  directorio no crece con cada reinicio y los contadores no retroceden.
+"""
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+# Fichero de cada proceso (metrics-<pid>-<inicio>.json) y acumulado de los terminados
+_PROCESS_FILE = re.compile(r'^metrics-(\d+)-\d+\.json$')
+DEAD_FILE = 'metrics-terminados.json'
+LOCK_FILE = '.metrics.lock'
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# nombre -> (tipo, ayuda)
+METRICS = {
+    'api_requests_total': ('counter', 'Requests atendidos por vista, método y status.'),
+    'api_request_duration_seconds': ('histogram', 'Latencia de los requests por vista y método.'),
+    'api_db_queries_total': ('counter', 'Consultas SQL por vista y alias de BD.'),
+    'api_db_duration_seconds_total': ('counter', 'Tiempo en BD por vista y alias de BD.'),
+    'api_tenant_request_duration_seconds': ('summary', 'Tiempo total de requests por empresa.'),
+    'api_export_duration_seconds': ('histogram', 'Duración de la generación de reportes por formato.'),
+    'api_logs_written_total': ('counter', 'Logs de auditoría escritos por el buffer.'),
+    'api_logs_dropped_total': ('counter', 'Logs de auditoría descartados, por motivo.'),
+}
+
+
+class _Shard:
+    """ Valores escritos por un único hilo. """
+    def __init__(self):
+        self.counters = {}    # (nombre, labels) -> valor
+        self.histograms = {}  # (nombre, labels) -> [conteos por bucket..., suma, total]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._started = int(time.time())
+        self._local = threading.local()
+        self._shards = []
+        self._last_flush = 0.0
+
+    def _shard(self):
+        if self._pid != os.getpid():
+            # Proceso hijo tras un fork: no heredar los valores del padre
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset()
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    # --- ESCRITURA (hot path) ---
+
+    def inc(self, name, labels, value=1):
+        counters = self._shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name, labels, value, buckets=DEFAULT_BUCKETS):
+        histograms = self._shard().histograms
+        key = (name, labels)
+        data = histograms.get(key)
+        if data is None:
+            data = histograms[key] = [0] * len(buckets) + [0.0, 0]
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                data[i] += 1
+                break
+        data[-2] += value
+        data[-1] += 1
+
+    def summary(self, name, labels, value):
+        """ Sólo suma y total (sin buckets): apto para labels de alta cardinalidad. """
+        self.inc(f'{name}_sum', labels, value)
+        self.inc(f'{name}_count', labels, 1)
+
+    # --- LECTURA ---
+
+    def snapshot(self):
+        """ Suma de todos los hilos del proceso, en formato serializable. """
+        counters, histograms = {}, {}
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for key, value in dict(shard.counters).items():
+                counters[key] = counters.get(key, 0) + value
+            for key, data in dict(shard.histograms).items():
+                acc = histograms.setdefault(key, [0] * len(data))
+                for i, value in enumerate(list(data)):
+                    acc[i] += value
+        return {
+            'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+            'histograms': [[name, list(labels), data] for (name, labels), data in histograms.items()],
+        }
+
+    # --- MULTIPROCESO ---
+
+    def _path(self, directory):
+        return os.path.join(directory, f'metrics-{self._pid}-{self._started}.json')
+
+    def maybe_flush(self):
+        directory = getattr(settings, 'METRICS_MULTIPROC_DIR', None)
+        if not directory:
+            return
+        now = time.monotonic()
+        if now - self._last_flush < getattr(settings, 'METRICS_FLUSH_INTERVAL', 5):
+            return
+        self._last_flush = now
+        self.flush(directory)
+
+    def flush(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        path = self._path(directory)
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as fh:
+            json.dump(self.snapshot(), fh)
+        os.replace(tmp, path) # atómico: quien lee nunca ve un fichero a medias
+
+    def collect(self):
+        """
+        Snapshot a exponer: el del proceso actual más, en modo multiproceso, los
+        ficheros de los demás procesos y el acumulado de los ya terminados.
+        """
+        snapshots = [self.snapshot()]
+        directory = getattr(settings, 'METRICS_MULTIPROC_DIR', None)
+        if directory and os.path.isdir(directory):
+            purge_dead(directory)
+            own = os.path.basename(self._path(directory))
+            for filename in os.listdir(directory):
+                if not filename.endswith('.json') or filename == own:
+                    continue
+                snapshot = _load(os.path.join(directory, filename))
+                if snapshot is not None:
+                    snapshots.append(snapshot)
+        return _merge(snapshots)
+
+
+def _load(path):
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def _merge(snapshots):
+    """ Suma snapshots: ({(nombre, labels): valor}, {(nombre, labels): [buckets..., suma, total]}). """
+    counters, histograms = {}, {}
+    for snap in snapshots:
+        for name, labels, value in snap['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, data in snap['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            acc = histograms.setdefault(key, [0] * len(data))
+            for i, value in enumerate(data):
+                acc[i] += value
+    return counters, histograms
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True # Existe, pero es de otro usuario
+    return True
+
+
+def purge_dead(directory):
+    """
+    Suma los ficheros de los procesos que ya no existen a DEAD_FILE y los borra.
+    Bajo un flock del directorio: dos scrapes a la vez no suman dos veces.
+    """
+    import fcntl # Sólo Unix, como el modo multiproceso (gunicorn)
+
+    with open(os.path.join(directory, LOCK_FILE), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        dead = []
+        for filename in os.listdir(directory):
+            match = _PROCESS_FILE.match(filename)
+            if match and int(match.group(1)) != os.getpid() and not _alive(int(match.group(1))):
+                dead.append(os.path.join(directory, filename))
+        if not dead:
+            return []
+        path = os.path.join(directory, DEAD_FILE)
+        snapshots = [snap for snap in map(_load, [path, *dead]) if snap is not None]
+        counters, histograms = _merge(snapshots)
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as fh:
+            json.dump({
+                'counters': [[name, [list(pair) for pair in pairs], value] for (name, pairs), value in counters.items()],
+                'histograms': [[name, [list(pair) for pair in pairs], data] for (name, pairs), data in histograms.items()],
+            }, fh)
+        os.replace(tmp, path)
+        for dead_path in dead:
+            os.remove(dead_path)
+        return dead
+
+
+registry = MetricsRegistry()
+
+
+def labels(**kwargs):
+    """ Labels como tupla ordenada (hashable) de pares (nombre, valor). """
+    return tuple(sorted((key, str(value)) for key, value in kwargs.items()))
+
+
+@contextmanager
+def observe_duration(name, **label_values):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe(name, labels(**label_values), time.perf_counter() - start)
+
+
+def observe_iterator(name, iterable, **label_values):
+    """
+    Envuelve un generador (respuestas en streaming) y observa la duración
+    cuando termina de consumirse, no cuando se construye la respuesta.
+    """
+    start = time.perf_counter()
+    try:
+        yield from iterable
+    finally:
+        registry.observe(name, labels(**label_values), time.perf_counter() - start)
+
+
+# --- FORMATO DE TEXTO DE PROMETHEUS ---
+
+def _format_labels(pairs, extra=()):
+    pairs = list(pairs) + list(extra)
+    if not pairs:
+        return ''
+    body = ','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in pairs
+    )
+    return '{' + body + '}'
+
+
+def _base_name(name):
+    for suffix in ('_sum', '_count'):
+        if name.endswith(suffix) and name[:-len(suffix)] in METRICS:
+            return name[:-len(suffix)]
+    return name
+
+
+def render_prometheus():
+    counters, histograms = registry.collect()
+    lines = []
+    families = {}
+    for (name, pairs), value in counters.items():
+        families.setdefault(_base_name(name), []).append((name, pairs, value))
+    for (name, pairs), data in histograms.items():
+        families.setdefault(name, []).append((name, pairs, data))
+
+    for family in sorted(families):
+        kind, help_text = METRICS.get(family, ('untyped', ''))
+        lines.append(f'# HELP {family} {help_text}')
+        lines.append(f'# TYPE {family} {kind}')
+        for name, pairs, value in sorted(families[family], key=lambda item: (item[0], item[1])):
+            if kind != 'histogram':
+                lines.append(f'{name}{_format_labels(pairs)} {value}')
+                continue
+            cumulative = 0
+            for bound, count in zip(DEFAULT_BUCKETS, value[:-2]):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(pairs, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_bucket{_format_labels(pairs, [("le", "+Inf")])} {value[-1]}')
+            lines.append(f'{name}_sum{_format_labels(pairs)} {value[-2]}')
+            lines.append(f'{name}_count{_format_labels(pairs)} {value[-1]}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,97 @@
+# api/middleware.py
+import logging
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.functional import SimpleLazyObject
+
+from . import metrics
+from .authentication import TenantContext, resolve_tenant
+from .instrumentation import log_event, request_stats
+
+
+class TenantMiddleware:
+    """
+    Asegura que todo request tenga 'request.tenant'.
+
+    Para sesiones de Django (admin) se resuelve de forma perezosa desde
+    request.user; en la API, TenantJWTAuthentication lo reemplaza por el
+    tenant del token sin consultar la BD.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.tenant = SimpleLazyObject(lambda: resolve_tenant(request.user))
+        return self.get_response(request)
+
+
+class RequestInstrumentationMiddleware:
+    """
+    Contadores por request (opt-in con settings.API_REQUEST_METRICS).
+
+    Añade a la respuesta 'X-Query-Count' y 'Server-Timing' (db, serializer,
+    render, total) y emite un evento 'request' en el logger 'api'.
+    Deshabilitado, Django lo quita de la cadena y no cuesta nada.
+    """
+    def __init__(self, get_response):
+        if not getattr(settings, 'API_REQUEST_METRICS', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        with request_stats() as stats:
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        tenant = getattr(request, 'tenant', None)
+        timings = {'db': stats.total_db_time, **stats.timings, 'total': total}
+        response['X-Query-Count'] = str(stats.total_queries)
+        response['Server-Timing'] = ', '.join(
+            f'{name};dur={seconds * 1000:.1f}' for name, seconds in timings.items()
+        )
+        log_event(
+            'request', logging.INFO,
+            method=request.method, path=request.path, status=response.status_code,
+            tenant=tenant.empresa_id if tenant is not None else None,
+            queries=stats.queries, **{f'{name}_ms': round(seconds * 1000, 2) for name, seconds in timings.items()},
+        )
+        return response
+
+
+class MetricsMiddleware:
+    """
+    Alimenta el registro de api/metrics.py (settings.API_METRICS_ENABLED):
+    latencia y status por vista/método, consultas y tiempo de BD por alias
+    ('default' y 'logs' de LogRouter) y tiempo total por empresa.
+    """
+    def __init__(self, get_response):
+        if not getattr(settings, 'API_METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        with request_stats() as stats:
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = match.view_name if match is not None else 'unmatched'
+        registry = metrics.registry
+        registry.inc('api_requests_total', metrics.labels(view=view, method=request.method, status=response.status_code))
+        registry.observe('api_request_duration_seconds', metrics.labels(view=view, method=request.method), elapsed)
+        for alias, count in stats.queries.items():
+            registry.inc('api_db_queries_total', metrics.labels(view=view, alias=alias), count)
+            registry.inc('api_db_duration_seconds_total', metrics.labels(view=view, alias=alias), stats.db_time[alias])
+
+        # Sólo si la autenticación JWT ya fijó el tenant: evaluar el valor perezoso
+        # de TenantMiddleware podría consultar la sesión en la BD
+        tenant = request.__dict__.get('tenant')
+        if type(tenant) is TenantContext and tenant.empresa_id is not None:
+            registry.summary('api_tenant_request_duration_seconds', metrics.labels(empresa=tenant.empresa_id), elapsed)
+
+        registry.maybe_flush()
+        return response
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='activofijo',
+            index=models.Index(fields=['empresa', 'fecha_adquisicion', 'id'], name='activo_empresa_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='categoriaactivo',
+            index=models.Index(fields=['empresa', 'nombre', 'id'], name='categoria_empresa_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='empleado',
+            index=models.Index(fields=['empresa', 'apellido_p', 'id'], name='empleado_empresa_apellido_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='estado',
+            index=models.Index(fields=['empresa', 'nombre', 'id'], name='estado_empresa_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='presupuesto',
+            index=models.Index(fields=['empresa', 'fecha', 'id'], name='presupuesto_empresa_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proveedor',
+            index=models.Index(fields=['empresa', 'nombre', 'id'], name='proveedor_empresa_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ubicacion',
+            index=models.Index(fields=['empresa', 'nombre', 'id'], name='ubicacion_empresa_nombre_idx'),
+        ),
+    ]
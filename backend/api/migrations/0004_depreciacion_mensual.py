@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_trabajo_exportacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivoPendienteDepreciacion',
+            fields=[
+                ('activo', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='api.activofijo')),
+                ('fecha_marca', models.DateTimeField()),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.empresa')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DepreciacionMensual',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('metodo', models.CharField(max_length=20)),
+                ('periodo', models.DateField()),
+                ('depreciacion_acumulada', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('valor_libros', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('activo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='depreciaciones_mensuales', to='api.activofijo')),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='depreciaciones_mensuales', to='api.empresa')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['empresa', 'metodo', 'periodo'], name='depmensual_empresa_periodo_idx')],
+                'unique_together': {('activo', 'metodo', 'periodo')},
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:35
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_depreciacion_mensual'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='log',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,109 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:36
+
+from datetime import datetime, timezone
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Sólo en la BD 'logs' (LogRouter decide con este hint) y sólo en PostgreSQL;
+# en otros motores api_log sigue siendo una tabla normal
+LOG_HINTS = {'model_name': 'log'}
+MESES_ADELANTE = 3
+
+
+def _mes_siguiente(inicio):
+    return inicio.replace(year=inicio.year + 1, month=1) if inicio.month == 12 else inicio.replace(month=inicio.month + 1)
+
+
+def _indices(cursor, tabla):
+    cursor.execute(
+        "SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s",
+        [tabla, f'{tabla}_pkey'],
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def particionar_log(apps, schema_editor):
+    """ Convierte api_log en una tabla particionada por mes, conservando filas e índices. """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        indices = _indices(cursor, 'api_log')
+        cursor.execute('SELECT min("timestamp"), now() FROM api_log')
+        primero, ahora = cursor.fetchone()
+
+        cursor.execute('ALTER TABLE api_log RENAME TO api_log_legacy')
+        cursor.execute('ALTER INDEX api_log_pkey RENAME TO api_log_legacy_pkey')
+        for indexdef in indices:
+            nombre = indexdef.split()[2] if indexdef.startswith('CREATE INDEX') else indexdef.split()[3]
+            cursor.execute(f'ALTER INDEX {nombre} RENAME TO {nombre}_legacy')
+
+        # La clave primaria de una tabla particionada debe incluir la columna de partición
+        cursor.execute('CREATE TABLE api_log (LIKE api_log_legacy INCLUDING DEFAULTS) PARTITION BY RANGE ("timestamp")')
+        cursor.execute('ALTER TABLE api_log ADD PRIMARY KEY (id, "timestamp")')
+        cursor.execute('CREATE TABLE api_log_default PARTITION OF api_log DEFAULT')
+
+        inicio = datetime((primero or ahora).year, (primero or ahora).month, 1, tzinfo=timezone.utc)
+        limite = datetime(ahora.year, ahora.month, 1, tzinfo=timezone.utc)
+        for _ in range(MESES_ADELANTE):
+            limite = _mes_siguiente(limite)
+        while inicio <= limite:
+            fin = _mes_siguiente(inicio)
+            cursor.execute(
+                f'CREATE TABLE api_log_p{inicio:%Y%m} PARTITION OF api_log FOR VALUES FROM (%s) TO (%s)',
+                [inicio, fin],
+            )
+            inicio = fin
+
+        cursor.execute('INSERT INTO api_log SELECT * FROM api_log_legacy')
+        cursor.execute('DROP TABLE api_log_legacy')
+        # Índices previos (p. ej. usuario_id): en la tabla padre se propagan a cada partición
+        for indexdef in indices:
+            cursor.execute(indexdef)
+
+
+def desparticionar_log(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        indices = _indices(cursor, 'api_log')
+        cursor.execute('ALTER TABLE api_log RENAME TO api_log_particionada')
+        cursor.execute('ALTER INDEX api_log_pkey RENAME TO api_log_particionada_pkey')
+        for indexdef in indices:
+            nombre = indexdef.split()[2] if indexdef.startswith('CREATE INDEX') else indexdef.split()[3]
+            cursor.execute(f'ALTER INDEX {nombre} RENAME TO {nombre}_particionada')
+        cursor.execute('CREATE TABLE api_log (LIKE api_log_particionada INCLUDING DEFAULTS)')
+        cursor.execute('ALTER TABLE api_log ADD PRIMARY KEY (id)')
+        cursor.execute('INSERT INTO api_log SELECT * FROM api_log_particionada')
+        cursor.execute('DROP TABLE api_log_particionada CASCADE')
+        for indexdef in indices:
+            cursor.execute(indexdef.replace(' ONLY ', ' '))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_log_timestamp_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RetencionLogs',
+            fields=[
+                ('empresa', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='retencion_logs', serialize=False, to='api.empresa')),
+                ('dias', models.PositiveIntegerField()),
+            ],
+        ),
+        # Antes de los índices nuevos: al crearlos en la tabla padre llegan a todas las particiones
+        migrations.RunPython(particionar_log, desparticionar_log, hints=LOG_HINTS),
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['tenant_id', 'timestamp'], name='log_tenant_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['timestamp'], name='log_timestamp_idx'),
+        ),
+    ]
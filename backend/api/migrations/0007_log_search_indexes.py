@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_log_partitioning'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['tenant_id', 'usuario', 'timestamp'], name='log_tenant_usuario_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['tenant_id', 'ip_address', 'timestamp'], name='log_tenant_ip_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['tenant_id', 'accion'], name='log_tenant_accion_idx', opclasses=['uuid_ops', 'varchar_pattern_ops']),
+        ),
+    ]
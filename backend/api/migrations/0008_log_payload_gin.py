@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:39
+
+import django.contrib.postgres.indexes
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_log_search_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='log',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['payload'], name='log_payload_gin_idx', opclasses=['jsonb_path_ops']),
+        ),
+    ]
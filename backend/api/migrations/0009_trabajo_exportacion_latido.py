@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_log_payload_gin'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trabajoexportacion',
+            name='latido',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
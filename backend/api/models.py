@@ -1,6 +1,8 @@
 # api/models.py
 import uuid
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 
 class Empresa(models.Model):
@@ -56,6 +58,9 @@ class Empleado(models.Model):
     cargo = models.ForeignKey(Cargo, on_delete=models.SET_NULL, null=True, blank=True)
     departamento = models.ForeignKey(Departamento, on_delete=models.SET_NULL, null=True, blank=True)
     roles = models.ManyToManyField(Roles, blank=True)
+    class Meta:
+        # Orden estable para la paginación keyset de EmpleadoViewSet
+        indexes = [models.Index(fields=['empresa', 'apellido_p', 'id'], name='empleado_empresa_apellido_idx')]
     def __str__(self): return f"{self.usuario.first_name} {self.apellido_p}"
 
 class ActivoFijo(models.Model):
@@ -70,7 +75,9 @@ class ActivoFijo(models.Model):
     estado = models.ForeignKey('Estado', on_delete=models.PROTECT)
     ubicacion = models.ForeignKey('Ubicacion', on_delete=models.PROTECT)
     proveedor = models.ForeignKey('Proveedor', on_delete=models.SET_NULL, null=True, blank=True)
-    class Meta: unique_together = ('empresa', 'codigo_interno')
+    class Meta:
+        unique_together = ('empresa', 'codigo_interno')
+        indexes = [models.Index(fields=['empresa', 'fecha_adquisicion', 'id'], name='activo_empresa_fecha_idx')]
     def __str__(self): return self.nombre
 
 class CategoriaActivo(models.Model):
@@ -78,6 +85,8 @@ class CategoriaActivo(models.Model):
     empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, related_name='categorias_activos')
     nombre = models.CharField(max_length=100)
     descripcion = models.TextField(blank=True, null=True)
+    class Meta:
+        indexes = [models.Index(fields=['empresa', 'nombre', 'id'], name='categoria_empresa_nombre_idx')]
     def __str__(self): return self.nombre
 
 class Estado(models.Model):
@@ -85,6 +94,8 @@ class Estado(models.Model):
     empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, related_name='estados_activos')
     nombre = models.CharField(max_length=50)
     detalle = models.TextField(blank=True, null=True)
+    class Meta:
+        indexes = [models.Index(fields=['empresa', 'nombre', 'id'], name='estado_empresa_nombre_idx')]
     def __str__(self): return self.nombre
 
 class Ubicacion(models.Model):
@@ -93,6 +104,8 @@ class Ubicacion(models.Model):
     nombre = models.CharField(max_length=100)
     direccion = models.CharField(max_length=255, blank=True, null=True)
     detalle = models.TextField(blank=True, null=True)
+    class Meta:
+        indexes = [models.Index(fields=['empresa', 'nombre', 'id'], name='ubicacion_empresa_nombre_idx')]
     def __str__(self): return self.nombre
 
 class Proveedor(models.Model):
@@ -105,6 +118,8 @@ class Proveedor(models.Model):
     pais = models.CharField(max_length=50, blank=True)
     direccion = models.CharField(max_length=255, blank=True, null=True)
     estado = models.CharField(max_length=20, default='activo')
+    class Meta:
+        indexes = [models.Index(fields=['empresa', 'nombre', 'id'], name='proveedor_empresa_nombre_idx')]
     def __str__(self): return self.nombre
 
 class Presupuesto(models.Model):
@@ -114,12 +129,77 @@ class Presupuesto(models.Model):
     monto = models.DecimalField(max_digits=15, decimal_places=2)
     fecha = models.DateField()
     descripcion = models.TextField(blank=True, null=True)
+    class Meta:
+        indexes = [models.Index(fields=['empresa', 'fecha', 'id'], name='presupuesto_empresa_fecha_idx')]
     def __str__(self): return f"Presupuesto {self.departamento.nombre} - {self.fecha}"
 
+# --- Exportaciones en segundo plano (manage.py run_export_worker) ---
+class TrabajoExportacion(models.Model):
+    PENDIENTE = 'pendiente'
+    PROCESANDO = 'procesando'
+    COMPLETADO = 'completado'
+    ERROR = 'error'
+    ESTADOS = [
+        (PENDIENTE, 'Pendiente'),
+        (PROCESANDO, 'Procesando'),
+        (COMPLETADO, 'Completado'),
+        (ERROR, 'Error'),
+    ]
+    FORMATOS = [('pdf', 'PDF'), ('excel', 'Excel'), ('csv', 'CSV')]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, related_name='trabajos_exportacion')
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    formato = models.CharField(max_length=10, choices=FORMATOS, default='pdf')
+    filtros = models.JSONField(default=dict, blank=True)
+    clave = models.CharField(max_length=64) # hash de (empresa, formato, filtros, versión de los datos)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default=PENDIENTE)
+    archivo = models.CharField(max_length=500, blank=True)
+    error = models.TextField(blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+    latido = models.DateTimeField(null=True, blank=True) # Último latido del proceso que lo genera
+    class Meta:
+        indexes = [
+            models.Index(fields=['empresa', 'clave'], name='exportacion_empresa_clave_idx'),
+            models.Index(fields=['estado', 'fecha_creacion'], name='exportacion_cola_idx'),
+        ]
+    def __str__(self): return f"Exportación {self.formato} ({self.estado})"
+
+# --- Histórico de depreciación (manage.py refresh_depreciacion) ---
+class DepreciacionMensual(models.Model):
+    """ Valor de cada activo al cierre de cada mes, materializado por api/snapshots.py """
+    id = models.BigAutoField(primary_key=True)
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, related_name='depreciaciones_mensuales')
+    activo = models.ForeignKey(ActivoFijo, on_delete=models.CASCADE, related_name='depreciaciones_mensuales')
+    metodo = models.CharField(max_length=20)
+    periodo = models.DateField() # Último día del mes
+    depreciacion_acumulada = models.DecimalField(max_digits=12, decimal_places=2)
+    valor_libros = models.DecimalField(max_digits=12, decimal_places=2)
+    class Meta:
+        unique_together = ('activo', 'metodo', 'periodo')
+        indexes = [models.Index(fields=['empresa', 'metodo', 'periodo'], name='depmensual_empresa_periodo_idx')]
+    def __str__(self): return f"{self.activo_id} {self.periodo} ({self.metodo})"
+
+class ActivoPendienteDepreciacion(models.Model):
+    """ Activos modificados cuyo histórico hay que recalcular (los marca api/signals.py) """
+    activo = models.OneToOneField(ActivoFijo, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, related_name='+')
+    fecha_marca = models.DateTimeField()
+    def __str__(self): return f"Pendiente: {self.activo_id}"
+
 # --- Modelos de Log/Bitácora (Punto 3 del PDF) ---
+class RetencionLogs(models.Model):
+    """ Días que se conservan los logs de una empresa (por defecto settings.LOG_RETENTION_DAYS) """
+    empresa = models.OneToOneField(Empresa, on_delete=models.CASCADE, primary_key=True, related_name='retencion_logs')
+    dias = models.PositiveIntegerField()
+    def __str__(self): return f"{self.empresa.nombre}: {self.dias} días"
+
 class Log(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # default (no auto_now_add): los logs en cola (api/log_buffer.py) conservan la hora del evento
+    timestamp = models.DateTimeField(default=timezone.now)
     #usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     usuario = models.ForeignKey(
         User,
@@ -131,4 +211,20 @@ class Log(models.Model):
     ip_address = models.GenericIPAddressField()
     accion = models.CharField(max_length=255) # ej: "CREATE: ActivoFijo, ID: xxx"
     tenant_id = models.UUIDField(null=True, blank=True) # Guarda el ID de la empresa afectada
-    payload = models.JSONField(null=True, blank=True) # Guarda los datos de la petición
\ No newline at end of file
+    payload = models.JSONField(null=True, blank=True) # Guarda los datos de la petición
+    class Meta:
+        # En PostgreSQL la tabla está particionada por mes (api/log_partitions.py):
+        # cada partición recibe su propia copia de estos índices
+        indexes = [
+            models.Index(fields=['tenant_id', 'timestamp'], name='log_tenant_timestamp_idx'),
+            models.Index(fields=['timestamp'], name='log_timestamp_idx'),
+            # Filtros de la búsqueda de la bitácora (LogViewSet)
+            models.Index(fields=['tenant_id', 'usuario', 'timestamp'], name='log_tenant_usuario_idx'),
+            models.Index(fields=['tenant_id', 'ip_address', 'timestamp'], name='log_tenant_ip_idx'),
+            # varchar_pattern_ops: el índice sirve para LIKE 'prefijo%' con cualquier collation
+            models.Index(fields=['tenant_id', 'accion'], name='log_tenant_accion_idx',
+                         opclasses=['uuid_ops', 'varchar_pattern_ops']),
+            # Búsquedas por contenido (payload @> {...}); jsonb_path_ops es más
+            # compacto que el opclass por defecto y sólo hace falta @>
+            GinIndex(fields=['payload'], name='log_payload_gin_idx', opclasses=['jsonb_path_ops']),
+        ]
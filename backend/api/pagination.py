@@ -0,0 +1,131 @@
+# api/pagination.py
+import base64
+import json
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginación por cursor (keyset) sobre un orden estable y único.
+
+    Es opt-in: sólo pagina si el cliente envía '?page_size=' o '?cursor=';
+    sin ellos la lista se devuelve completa como antes (clientes React/Flutter).
+
+    El orden sale de 'view.keyset_ordering' (ej. ('fecha_adquisicion', 'id'));
+    el último campo debe ser único. El cursor guarda los valores de la última
+    fila y la página siguiente se pide con WHERE (a, b) > (x, y): no hay
+    OFFSET ni COUNT(*), así que la página N cuesta lo mismo que la primera si
+    existe un índice (empresa, a, b).
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 50
+    max_page_size = 500
+    default_ordering = ('id',)
+
+    # False: pagina siempre, aunque el cliente no envíe page_size ni cursor
+    opt_in = True
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.opt_in and self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+
+        self.request = request
+        self.ordering = tuple(getattr(view, 'keyset_ordering', self.default_ordering))
+        self.page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        cursor = params.get(self.cursor_query_param)
+        if cursor:
+            try:
+                queryset = queryset.filter(self.keyset_filter(self.decode_cursor(cursor)))
+            except (DjangoValidationError, TypeError, ValueError):
+                # Valores que no son del tipo de su columna: cursor manipulado
+                raise NotFound('Cursor inválido.')
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        self.next_values = [self._value(rows[-1], field) for field in self.ordering] if self.has_next else None
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def keyset_filter(self, values):
+        """
+        (a, b, c) > (x, y, z) respetando la dirección de cada campo, más una
+        cota sobre el primer campo (a >= x) para que el planner arranque el
+        recorrido del índice en x en lugar de evaluar el OR fila a fila.
+        """
+        if len(values) != len(self.ordering):
+            raise NotFound('Cursor inválido.')
+        names = [field.lstrip('-') for field in self.ordering]
+        after = Q()
+        for i, field in enumerate(self.ordering):
+            op = 'lt' if field.startswith('-') else 'gt'
+            step = Q(**{f'{names[i]}__{op}': values[i]})
+            for name, value in zip(names[:i], values[:i]):
+                step &= Q(**{name: value})
+            after |= step
+        first_op = 'lte' if self.ordering[0].startswith('-') else 'gte'
+        return Q(**{f'{names[0]}__{first_op}': values[0]}) & after
+
+    @staticmethod
+    def _value(row, field):
+        name = field.lstrip('-')
+        # Admite instancias de modelo y dicts de .values()
+        return row[name] if isinstance(row, dict) else getattr(row, name)
+
+    def encode_cursor(self, values):
+        raw = json.dumps(values, default=str, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        except (TypeError, ValueError):
+            raise NotFound('Cursor inválido.')
+        if not isinstance(values, list):
+            raise NotFound('Cursor inválido.')
+        return values
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_values))
+        return replace_query_param(url, self.page_size_query_param, self.page_size)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class RequiredKeysetPagination(KeysetPagination):
+    """ KeysetPagination obligatoria, para listas que no caben en una respuesta (bitácora). """
+    opt_in = False
@@ -1,6 +1,80 @@
 # api/permissions.py
+import hmac
+
+from django.conf import settings
 from rest_framework import permissions
 
+from .cache import GLOBAL, LocalLRU, get_versions, shared_cache
+from .instrumentation import logger
+from .models import Empleado, Permisos
+
+# --- CACHÉ DE PERMISOS POR USUARIO ---
+# Ámbito de versión usado por las señales en api/signals.py:
+#   ('permisos', empresa_id) -> cambian roles/permisos de esa empresa
+#   ('permisos', GLOBAL)     -> cambia el catálogo global de Permisos
+#   ('permisos-usuario', user_id) -> cambia el Empleado de ese usuario
+PERMISSIONS_SCOPE = 'permisos'
+USER_PERMISSIONS_SCOPE = 'permisos-usuario'
+
+_local_permissions = LocalLRU(getattr(settings, 'PERMISSIONS_LRU_SIZE', 2048))
+
+
+def _permissions_key(user_id):
+    return f'perms:{user_id}'
+
+
+def _current_versions(user_id, empresa_id):
+    return get_versions(
+        (PERMISSIONS_SCOPE, GLOBAL),
+        (PERMISSIONS_SCOPE, empresa_id),
+        (USER_PERMISSIONS_SCOPE, user_id),
+    )
+
+
+# Marca "empresa desconocida" (None es un valor válido: usuario sin empresa)
+_UNKNOWN = object()
+
+
+def get_user_permissions(user, empresa_id=_UNKNOWN):
+    """
+    Devuelve el frozenset de nombres de permisos del usuario (vía sus roles).
+
+    Con la caché caliente no hace consultas a la BD: sólo una lectura de las
+    versiones en la caché compartida. Una entrada es válida mientras las
+    versiones global, de su empresa y del usuario no hayan cambiado.
+    Si se conoce la empresa (request.tenant) se evita buscarla en frío.
+    """
+    if not user or not user.is_authenticated:
+        return frozenset()
+
+    cache_key = _permissions_key(user.pk)
+    entry = _local_permissions.get(cache_key) or shared_cache().get(cache_key)
+    if empresa_id is _UNKNOWN:
+        if entry is not None:
+            empresa_id = entry[1]
+        else:
+            empresa_id = Empleado.objects.filter(usuario_id=user.pk).values_list('empresa_id', flat=True).first()
+
+    current = _current_versions(user.pk, empresa_id)
+    if entry is not None and entry[0] == current and entry[1] == empresa_id:
+        _local_permissions.set(cache_key, entry)
+        return entry[2]
+
+    # Las versiones se leen ANTES de consultar los permisos: si cambian en medio,
+    # la entrada queda guardada con la versión vieja y se recalcula en la próxima.
+    if empresa_id is None:
+        perms = frozenset()
+    else:
+        perms = frozenset(
+            Permisos.objects.filter(roles__empleado__usuario_id=user.pk)
+            .values_list('nombre', flat=True).distinct()
+        )
+    entry = (current, empresa_id, perms)
+    _local_permissions.set(cache_key, entry)
+    shared_cache().set(cache_key, entry, getattr(settings, 'PERMISSIONS_CACHE_TIMEOUT', 3600))
+    return perms
+
+
 class HasPermission(permissions.BasePermission):
     """
     Custom permission to check if the user has a specific named permission
@@ -20,17 +94,13 @@ class HasPermission(permissions.BasePermission):
             return False
 
         try:
-            empleado = request.user.empleado
-            # Check if any role assigned to the employee has the required permission
-            # Note: This requires optimizing permission lookup if performance becomes an issue
-            # (e.g., caching permissions per user session)
-            has_perm = empleado.roles.filter(permisos__nombre=self.required_permission).exists()
-            # print(f"DEBUG: Checking {self.required_permission} for {request.user}: {has_perm}") # Optional debug
-            return has_perm
-        except AttributeError: # Handle cases where user might not have 'empleado' linked yet
-             return False
-        except Exception as e: # Catch other potential errors
-             print(f"ERROR checking permission {self.required_permission}: {e}")
+            # Users without an 'empleado' link get an empty set (no permissions).
+            # The set is cached per user, so warm checks cost no queries.
+            tenant = getattr(request, 'tenant', None)
+            empresa_id = tenant.empresa_id if tenant is not None else _UNKNOWN
+            return self.required_permission in get_user_permissions(request.user, empresa_id)
+        except Exception: # Catch other potential errors
+             logger.exception("Error checking permission %s", self.required_permission)
              return False
 
     # Optional: Implement has_object_permission if you need row-level checks
@@ -40,4 +110,16 @@ class HasPermission(permissions.BasePermission):
 def check_permission(request, view, permission_name):
     """ Instantiates and checks HasPermission """
     checker = HasPermission(permission_name)
-    return checker.has_permission(request, view)
\ No newline at end of file
+    return checker.has_permission(request, view)
+
+
+class HasMetricsToken(permissions.BasePermission):
+    """
+    Allows the Prometheus scraper in with 'Authorization: Bearer <METRICS_AUTH_TOKEN>'.
+    Without a configured token nobody gets in: the labels include tenant ids.
+    """
+    def has_permission(self, request, view):
+        token = getattr(settings, 'METRICS_AUTH_TOKEN', None)
+        if not token:
+            return False
+        return hmac.compare_digest(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}')
@@ -0,0 +1,187 @@
+# api/reports.py
+"""
+Generación de los reportes de activos en memoria constante.
+
+Las filas se leen con values_list(...).iterator(chunk_size=...): en PostgreSQL
+eso usa un cursor del lado del servidor, así que nunca hay más de un bloque de
+tuplas en RAM (ni instancias de modelo).
+"""
+import csv
+import tempfile
+
+from django.conf import settings
+from django.db.models import Count, Sum
+from django.db.models.functions import ExtractYear, TruncMonth
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.units import inch
+from reportlab.pdfgen import canvas
+
+from .depreciation import CAMPOS as CAMPOS_DEPRECIACION, con_depreciacion
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# (Encabezado, campo de values_list)
+EXPORT_COLUMNS = [
+    ("Nombre", 'nombre'),
+    ("Código Interno", 'codigo_interno'),
+    ("Ubicación", 'ubicacion__nombre'),
+    ("Fecha Adquisición", 'fecha_adquisicion'),
+    ("Valor Actual (Bs.)", 'valor_actual'),
+    ("Estado", 'estado__nombre'),
+]
+# Columnas calculadas por el motor de depreciación (?depreciacion=): van siempre al final
+DEPRECIACION_COLUMNS = [
+    ("Depreciación Acum. (Bs.)", None),
+    ("Valor en Libros (Bs.)", None),
+]
+
+
+# --- RESUMEN (GROUP BY en la BD) ---
+
+# Dimensiones por catálogo: nombre -> (columna agrupada, columna con el nombre)
+RESUMEN_CATALOGOS = {
+    'categoria': ('categoria_id', 'categoria__nombre'),
+    'estado': ('estado_id', 'estado__nombre'),
+    'ubicacion': ('ubicacion_id', 'ubicacion__nombre'),
+    'proveedor': ('proveedor_id', 'proveedor__nombre'),
+}
+# Dimensiones por fecha de adquisición: nombre -> expresión del periodo
+RESUMEN_PERIODOS = {
+    'anio': ExtractYear('fecha_adquisicion'),
+    'mes': TruncMonth('fecha_adquisicion'),
+}
+RESUMEN_DIMENSIONES = tuple(RESUMEN_CATALOGOS) + tuple(RESUMEN_PERIODOS)
+
+
+def totales_activos(queryset):
+    totales = queryset.order_by().aggregate(cantidad=Count('id'), valor_total=Sum('valor_actual'))
+    totales['valor_total'] = totales['valor_total'] or 0
+    return totales
+
+
+def resumir_activos(queryset, dimension):
+    """
+    Cantidad y suma de valor_actual por dimensión, en un único GROUP BY.
+    order_by() reemplaza el orden de filtrar_activos (api/filtros.py): si no, la fecha entraría
+    en el GROUP BY y devolvería una fila por activo.
+    """
+    metricas = {'cantidad': Count('id'), 'valor_total': Sum('valor_actual')}
+    if dimension in RESUMEN_PERIODOS:
+        filas = (
+            queryset.annotate(periodo=RESUMEN_PERIODOS[dimension])
+            .values('periodo').annotate(**metricas).order_by('periodo')
+        )
+        if dimension == 'mes':
+            return [dict(fila, periodo=fila['periodo'].strftime('%Y-%m')) for fila in filas]
+        return list(filas)
+
+    columna, nombre = RESUMEN_CATALOGOS[dimension]
+    filas = queryset.values(columna, nombre).annotate(**metricas).order_by(nombre, columna)
+    return [
+        {'id': fila[columna], 'nombre': fila[nombre], 'cantidad': fila['cantidad'], 'valor_total': fila['valor_total']}
+        for fila in filas
+    ]
+
+
+def iter_rows(queryset, columns=EXPORT_COLUMNS, depreciacion=None):
+    """
+    Tuplas de la exportación, leídas por bloques desde un cursor del servidor.
+    depreciacion: (método, fecha) para añadir las DEPRECIACION_COLUMNS, que se
+    calculan con NumPy bloque a bloque.
+    """
+    chunk_size = getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+    fields = [field for _, field in columns if field]
+    if depreciacion is None:
+        return queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+    metodo, fecha = depreciacion
+    rows = queryset.values_list(*fields, *CAMPOS_DEPRECIACION).iterator(chunk_size=chunk_size)
+    return con_depreciacion(rows, fecha, metodo, chunk_size)
+
+
+class _Echo:
+    """ Pseudo-buffer para csv.writer: devuelve la línea en vez de guardarla. """
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows, columns=EXPORT_COLUMNS):
+    """ Genera el CSV línea a línea (bytes UTF-8 con BOM para que Excel lea los acentos). """
+    writer = csv.writer(_Echo())
+    yield '\ufeff'.encode('utf-8') + writer.writerow([header for header, _ in columns]).encode('utf-8')
+    for row in rows:
+        yield writer.writerow(row).encode('utf-8')
+
+
+def write_xlsx(rows, fileobj, columns=EXPORT_COLUMNS, title="Reporte de Activos"):
+    """
+    Escribe el libro con el modo write-only de openpyxl: cada fila se vuelca a
+    disco al añadirla, así la memoria no crece con el tamaño del reporte.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title)
+
+    header = []
+    for text, _ in columns:
+        cell = WriteOnlyCell(ws, value=text)
+        cell.font = Font(bold=True)
+        header.append(cell)
+    ws.append(header)
+
+    for row in rows:
+        ws.append(row)
+    wb.save(fileobj)
+
+
+def xlsx_tempfile(rows, columns=EXPORT_COLUMNS):
+    """ Genera el .xlsx en un fichero temporal en disco y lo devuelve rebobinado. """
+    fileobj = tempfile.TemporaryFile()
+    write_xlsx(rows, fileobj, columns)
+    fileobj.seek(0)
+    return fileobj
+
+
+def write_pdf(rows, fileobj):
+    """ Dibuja el reporte en PDF (ReportLab) a partir de las filas de EXPORT_COLUMNS. """
+    p = canvas.Canvas(fileobj, pagesize=letter)
+    width, height = letter
+
+    p.setFont('Helvetica-Bold', 16)
+    p.drawString(inch, height - inch, "Reporte de Activos Fijos")
+
+    p.setFont('Helvetica-Bold', 10)
+    y = height - 1.5 * inch
+    headers = ["Nombre", "Código", "Ubicación", "Fecha Adq.", "Valor (Bs.)"]
+    col_widths = [2.5 * inch, 1 * inch, 1.5 * inch, 1 * inch, 1 * inch]
+    x = inch
+    for i, header in enumerate(headers):
+        p.drawString(x, y, header)
+        x += col_widths[i]
+
+    p.line(inch, y - 0.1 * inch, width - inch, y - 0.1 * inch)
+    y -= 0.25 * inch
+
+    p.setFont('Helvetica', 9)
+    for nombre, codigo, ubicacion, fecha, valor, _estado in rows:
+        if y < inch:
+            p.showPage()
+            p.setFont('Helvetica', 9)
+            y = height - inch
+
+        data = [
+            nombre[:30],
+            codigo,
+            ubicacion[:20] if ubicacion else 'N/A',
+            str(fecha),
+            str(valor)
+        ]
+        x = inch
+        for i, item in enumerate(data):
+            p.drawString(x, y, item)
+            x += col_widths[i]
+        y -= 0.25 * inch
+
+    p.showPage()
+    p.save()
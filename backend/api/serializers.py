@@ -3,6 +3,7 @@ from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.contrib.auth.models import User
 from .permissions import check_permission, HasPermission
+from .filtros import normalizar_filtros, parsear_filtros
 from .models import *
 
 class EmpresaSerializer(serializers.ModelSerializer):
@@ -252,6 +253,20 @@ class RegisterEmpresaSerializer(serializers.Serializer):
 class LogSerializer(serializers.ModelSerializer):
     class Meta:
         model = Log
-        # Definimos los campos que esperamos recibir del frontend
-        fields = ['accion', 'payload']
+        # Definimos los campos que esperamos recibir del frontend (accion, payload);
+        # el resto lo asigna el servidor y sólo se devuelve en las consultas
+        fields = ['id', 'timestamp', 'usuario', 'ip_address', 'accion', 'payload']
+        read_only_fields = ('id', 'timestamp', 'usuario', 'ip_address')
 
+# --- EXPORTACIONES EN SEGUNDO PLANO ---
+class TrabajoExportacionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TrabajoExportacion
+        fields = ['id', 'formato', 'filtros', 'estado', 'error', 'fecha_creacion', 'fecha_inicio', 'fecha_fin']
+        read_only_fields = ('estado', 'error', 'fecha_creacion', 'fecha_inicio', 'fecha_fin')
+
+    def validate_filtros(self, value):
+        if not isinstance(value, dict):
+            raise serializers.ValidationError("Debe ser un objeto con ubicacion_id, fecha_min y/o fecha_max.")
+        parsear_filtros(value) # Que el worker no falle con un valor mal formado
+        return normalizar_filtros(value)
@@ -0,0 +1,105 @@
+# api/signals.py
+"""
+Receptores de señales que invalidan las cachés versionadas (ver api/cache.py).
+Se conectan en ApiConfig.ready().
+"""
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import USER_SCOPE
+from .cache import GLOBAL, bump_data_version, bump_version
+from .models import (
+    ActivoFijo, Cargo, CategoriaActivo, Departamento, Empleado, Estado,
+    Permisos, Presupuesto, Proveedor, Roles, Ubicacion,
+)
+from .permissions import PERMISSIONS_SCOPE, USER_PERMISSIONS_SCOPE
+from .snapshots import marcar_pendientes
+
+_M2M_ACTIONS = ('post_add', 'post_remove', 'post_clear')
+
+
+# --- PERMISOS POR USUARIO ---
+
+@receiver(m2m_changed, sender=Roles.permisos.through)
+def roles_permisos_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in _M2M_ACTIONS:
+        return
+    if not reverse:
+        # rol.permisos.add/remove/clear(...)
+        bump_version(PERMISSIONS_SCOPE, instance.empresa_id)
+    elif pk_set:
+        # permiso.roles_set.add/remove(...) -> afecta a las empresas de esos roles
+        for empresa_id in set(Roles.objects.filter(pk__in=pk_set).values_list('empresa_id', flat=True)):
+            bump_version(PERMISSIONS_SCOPE, empresa_id)
+    else:
+        # permiso.roles_set.clear(): no sabemos qué empresas se vieron afectadas
+        bump_version(PERMISSIONS_SCOPE, GLOBAL)
+
+
+@receiver(m2m_changed, sender=Empleado.roles.through)
+def empleado_roles_changed(sender, instance, action, reverse, **kwargs):
+    if action in _M2M_ACTIONS:
+        # En ambos sentidos 'instance' (Empleado o Roles) tiene empresa_id
+        bump_version(PERMISSIONS_SCOPE, instance.empresa_id)
+
+
+@receiver(post_delete, sender=Roles)
+def rol_deleted(sender, instance, **kwargs):
+    # El borrado en cascada de la tabla intermedia no dispara m2m_changed
+    bump_version(PERMISSIONS_SCOPE, instance.empresa_id)
+
+
+@receiver(post_save, sender=Permisos)
+@receiver(post_delete, sender=Permisos)
+def permiso_changed(sender, instance, **kwargs):
+    # Los permisos son globales: un renombrado afecta a todas las empresas
+    bump_version(PERMISSIONS_SCOPE, GLOBAL)
+
+
+@receiver(post_save, sender=Empleado)
+@receiver(post_delete, sender=Empleado)
+def empleado_changed(sender, instance, **kwargs):
+    # Cubre altas/bajas y cambios de empresa del usuario
+    bump_version(USER_PERMISSIONS_SCOPE, instance.usuario_id)
+
+
+# --- VERSIONES DE DATOS POR EMPRESA ---
+# Invalidan lo derivado de estos modelos (p. ej. reportes ya generados)
+VERSIONED_MODELS = (
+    ActivoFijo, CategoriaActivo, Estado, Ubicacion, Proveedor,
+    Cargo, Departamento, Presupuesto, Roles, Empleado,
+)
+
+
+def tenant_data_changed(sender, instance, **kwargs):
+    bump_data_version(sender, instance.empresa_id)
+
+
+for _model in VERSIONED_MODELS:
+    post_save.connect(tenant_data_changed, sender=_model, dispatch_uid=f'data_version_save_{_model._meta.model_name}')
+    post_delete.connect(tenant_data_changed, sender=_model, dispatch_uid=f'data_version_delete_{_model._meta.model_name}')
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def usuario_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return # El login no cambia nada de lo que se cachea o serializa
+    # User en caché de TenantJWTAuthentication
+    bump_version(USER_SCOPE, instance.pk)
+    # EmpleadoSerializer anida el usuario (username, nombre, email)
+    for empresa_id in set(Empleado.objects.filter(usuario_id=instance.pk).values_list('empresa_id', flat=True)):
+        bump_data_version(Empleado, empresa_id)
+
+
+# --- HISTÓRICO DE DEPRECIACIÓN ---
+
+@receiver(post_save, sender=ActivoFijo)
+def activo_changed(sender, instance, **kwargs):
+    # refresh_depreciacion recalcula sólo los activos marcados; los borrados
+    # arrastran su histórico en cascada. La marca se escribe al confirmar: antes,
+    # un refresco concurrente podría borrarla y recalcular con los datos viejos
+    marca = [(instance.pk, instance.empresa_id)]
+    transaction.on_commit(lambda: marcar_pendientes(marca), using=kwargs.get('using'))
@@ -0,0 +1,164 @@
+# api/snapshots.py
+"""
+Histórico mensual de depreciación materializado en DepreciacionMensual.
+
+'manage.py refresh_depreciacion' lo mantiene de forma incremental:
+
+1. Activos marcados en ActivoPendienteDepreciacion (alta o modificación, ver
+   api/signals.py): se borra y recalcula su histórico completo, porque un
+   cambio de valor, vida útil o fecha afecta a todos sus meses.
+2. Meses nuevos: para el resto de activos sólo se añaden los cierres
+   posteriores al último ya materializado de la empresa.
+
+Los borrados no necesitan marca: el histórico cae en cascada con el activo.
+Un refresco de sólo algunos métodos (--metodo) deja las marcas para los demás.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .depreciation import CAMPOS, Cartera
+from .instrumentation import log_event
+from .models import ActivoFijo, ActivoPendienteDepreciacion, DepreciacionMensual
+
+# Activos recalculados por lote (cada uno genera un registro por mes de vida)
+LOTE_ACTIVOS = 500
+BATCH_SIZE = 5000
+
+
+def ultimo_cierre(hoy=None):
+    """ Último día del mes anterior: el cierre más reciente ya terminado. """
+    hoy = hoy or timezone.localdate() # Fecha en settings.TIME_ZONE, no la del servidor
+    return hoy.replace(day=1) - timedelta(days=1)
+
+
+def metodos_mensuales():
+    """ Métodos que se materializan por defecto. """
+    return getattr(settings, 'DEPRECIACION_METODOS_MENSUALES', ['lineal'])
+
+
+def fin_de_mes(fecha):
+    return (np.datetime64(fecha, 'M') + 1).astype('datetime64[D]') - 1
+
+
+def marcar_pendientes(activos):
+    """
+    Marca (upsert) los activos cuyo histórico hay que recalcular. Lo llaman las
+    señales y las operaciones en bloque, que no las disparan.
+    activos: iterable de (activo_id, empresa_id).
+    """
+    ahora = timezone.now()
+    marcas = [
+        ActivoPendienteDepreciacion(activo_id=activo_id, empresa_id=empresa_id, fecha_marca=ahora)
+        for activo_id, empresa_id in activos
+    ]
+    ActivoPendienteDepreciacion.objects.bulk_create(
+        marcas, batch_size=BATCH_SIZE,
+        update_conflicts=True, unique_fields=['activo'], update_fields=['fecha_marca'],
+    )
+
+
+def _filas(ids, metodo, periodos, acumulada, libros, empresa_id):
+    return [
+        DepreciacionMensual(
+            empresa_id=empresa_id, activo_id=activo_id, metodo=metodo,
+            periodo=periodo, depreciacion_acumulada=a, valor_libros=l,
+        )
+        for activo_id, periodo, a, l in zip(ids, periodos, acumulada.round(2).tolist(), libros.round(2).tolist())
+    ]
+
+
+def _historico_completo(empresa_id, ids, cartera, metodo, hasta):
+    """
+    Todos los cierres de cada activo, desde el mes de adquisición hasta 'hasta',
+    en una sola pasada: cada activo se repite una vez por mes de vida.
+    """
+    hasta_mes = np.datetime64(hasta, 'M')
+    inicio = cartera.fecha_adquisicion.astype('datetime64[M]')
+    meses = np.maximum((hasta_mes - inicio).astype(np.int64) + 1, 0)
+    if not meses.sum():
+        return []
+    fila = np.repeat(np.arange(len(ids)), meses)
+    desplazamiento = np.arange(len(fila)) - np.repeat(np.cumsum(meses) - meses, meses)
+    periodos = (inicio[fila] + desplazamiento + 1).astype('datetime64[D]') - 1
+
+    expandida = Cartera(cartera.costo[fila], cartera.vida[fila], cartera.fecha_adquisicion[fila])
+    acumulada, libros = expandida.calcular(periodos, metodo)
+    return _filas([ids[i] for i in fila], metodo, periodos.tolist(), acumulada, libros, empresa_id)
+
+
+def _cargar(queryset):
+    filas = list(queryset.order_by().values_list('id', *CAMPOS))
+    return [fila[0] for fila in filas], Cartera.desde_filas(fila[1:] for fila in filas)
+
+
+def refrescar_pendientes(empresa_id, metodos, hasta):
+    """ Recalcula el histórico de los activos marcados de la empresa. Devuelve cuántos. """
+    inicio = timezone.now()
+    # Sólo se borra la marca si se recalcularon todos los métodos materializados
+    todos = set(metodos_mensuales()) <= set(metodos)
+    pendientes = list(
+        ActivoPendienteDepreciacion.objects.filter(empresa_id=empresa_id, fecha_marca__lte=inicio)
+        .values_list('activo_id', flat=True)
+    )
+    for desde in range(0, len(pendientes), LOTE_ACTIVOS):
+        lote = pendientes[desde:desde + LOTE_ACTIVOS]
+        ids, cartera = _cargar(ActivoFijo.objects.filter(pk__in=lote))
+        with transaction.atomic():
+            DepreciacionMensual.objects.filter(activo_id__in=lote, metodo__in=metodos).delete()
+            for metodo in metodos:
+                DepreciacionMensual.objects.bulk_create(
+                    _historico_completo(empresa_id, ids, cartera, metodo, hasta), batch_size=BATCH_SIZE
+                )
+            # Una marca posterior a 'inicio' (modificado durante el refresco) se conserva
+            if todos:
+                ActivoPendienteDepreciacion.objects.filter(activo_id__in=lote, fecha_marca__lte=inicio).delete()
+    return len(pendientes)
+
+
+def extender_periodos(empresa_id, metodo, hasta, excluir=()):
+    """
+    Añade los cierres posteriores al último materializado de la empresa, con una
+    pasada vectorizada por mes sobre todos sus activos. Devuelve los meses añadidos.
+    """
+    ultimo = DepreciacionMensual.objects.filter(
+        empresa_id=empresa_id, metodo=metodo
+    ).aggregate(ultimo=Max('periodo'))['ultimo']
+    queryset = ActivoFijo.objects.filter(empresa_id=empresa_id).exclude(pk__in=list(excluir))
+    ids, cartera = _cargar(queryset)
+    if not ids:
+        return 0
+
+    if ultimo is None:
+        # Primera vez: desde el mes de la adquisición más antigua
+        primero = fin_de_mes(cartera.fecha_adquisicion.min())
+    else:
+        primero = fin_de_mes(ultimo + timedelta(days=1))
+    periodos = np.arange(np.datetime64(primero, 'M'), np.datetime64(hasta, 'M') + 1)
+
+    for mes in periodos:
+        periodo = ((mes + 1).astype('datetime64[D]') - 1).item()
+        acumulada, libros = cartera.calcular(periodo, metodo)
+        adquiridos = np.flatnonzero(cartera.fecha_adquisicion <= np.datetime64(periodo, 'D'))
+        DepreciacionMensual.objects.bulk_create(
+            _filas([ids[i] for i in adquiridos], metodo, [periodo] * len(adquiridos),
+                   acumulada[adquiridos], libros[adquiridos], empresa_id),
+            batch_size=BATCH_SIZE,
+        )
+    return len(periodos)
+
+
+def refrescar_empresa(empresa_id, hasta=None, metodos=None):
+    hasta = hasta or ultimo_cierre()
+    metodos = metodos or metodos_mensuales()
+    pendientes = set(
+        ActivoPendienteDepreciacion.objects.filter(empresa_id=empresa_id).values_list('activo_id', flat=True)
+    )
+    meses = {metodo: extender_periodos(empresa_id, metodo, hasta, excluir=pendientes) for metodo in metodos}
+    recalculados = refrescar_pendientes(empresa_id, metodos, hasta)
+    log_event('depreciacion.refresh', empresa=empresa_id, hasta=hasta, meses=meses, recalculados=recalculados)
+    return meses, recalculados
@@ -0,0 +1,208 @@
+# api/sparse.py
+"""
+?fields= y ?expand= en los list/retrieve de BaseTenantViewSet.
+
+    ?fields=id,nombre,roles_asignados.nombre   sólo esos campos (con punto, los de un anidado)
+    ?expand=categoria,ubicacion                 la FK sale como {id, nombre} en lugar del UUID
+
+El serializer del request se recorta (aplicar) y el queryset se arma con lo que
+queda (ajustar_queryset): only() de las columnas, select_related de las FKs que
+se recorren y prefetch_related sólo de los ManyToMany pedidos. El camino rápido
+(api/fastpath.py) compila su plan sobre el mismo serializer recortado.
+"""
+import re
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import relations, serializers
+from rest_framework.exceptions import ValidationError
+
+EXPAND_FIELDS = ['id', 'nombre']
+MAX_CAMPOS = 50
+
+_RUTA_RE = re.compile(r'^\w+(\.\w+)*$')
+_expandidos = {}
+
+
+class NoAjustable(Exception):
+    pass
+
+
+def _lista(valor, param, patron):
+    nombres = [nombre.strip() for nombre in valor.split(',') if nombre.strip()]
+    if len(nombres) > MAX_CAMPOS:
+        raise ValidationError({param: f'Como máximo {MAX_CAMPOS} campos.'})
+    invalidos = [nombre for nombre in nombres if not patron.match(nombre)]
+    if invalidos:
+        raise ValidationError({param: f"Nombres no válidos: {', '.join(invalidos)}."})
+    return nombres
+
+
+def _congelar(arbol):
+    return tuple(sorted((nombre, _congelar(sub) if sub else None) for nombre, sub in arbol.items()))
+
+
+def parse(params):
+    """
+    (fields, expand) de los parámetros, o None si no vienen. 'fields' es un árbol
+    hashable ((nombre, subárbol | None), ...) o None (todos); 'expand' una tupla.
+    """
+    raw_fields, raw_expand = params.get('fields'), params.get('expand')
+    if not raw_fields and not raw_expand:
+        return None
+    fields = None
+    if raw_fields:
+        arbol = {}
+        for ruta in _lista(raw_fields, 'fields', _RUTA_RE):
+            nodo, partes = arbol, ruta.split('.')
+            for parte in partes[:-1]:
+                nodo = nodo.setdefault(parte, {})
+                if nodo is None:
+                    break # Ya se pidió el anidado completo
+            else:
+                nodo[partes[-1]] = None
+        fields = _congelar(arbol)
+    expand = tuple(sorted(set(_lista(raw_expand, 'expand', re.compile(r'^\w+$'))))) if raw_expand else ()
+    return fields, expand
+
+
+def expandido(model):
+    """ ModelSerializer {id, nombre} del modelo relacionado (uno por modelo). """
+    if model not in _expandidos:
+        meta = type('Meta', (), {'model': model, 'fields': EXPAND_FIELDS})
+        _expandidos[model] = type(f'{model.__name__}ExpandidoSerializer', (serializers.ModelSerializer,), {'Meta': meta})
+    return _expandidos[model]
+
+
+def _expandir(serializer, nombre):
+    field = serializer.fields.get(nombre)
+    if field is None or field.write_only or not isinstance(field, relations.PrimaryKeyRelatedField) or len(field.source_attrs) != 1:
+        raise ValidationError({'expand': f'No se puede expandir: {nombre}.'})
+    try:
+        model_field = serializer.Meta.model._meta.get_field(field.source_attrs[0])
+        model_field.related_model._meta.get_field('nombre')
+    except FieldDoesNotExist:
+        raise ValidationError({'expand': f'No se puede expandir: {nombre}.'})
+    kwargs = {'read_only': True}
+    if field.source != nombre:
+        kwargs['source'] = field.source
+    # Misma posición en la salida: BindingDict conserva el orden de la clave
+    serializer.fields[nombre] = expandido(model_field.related_model)(**kwargs)
+
+
+def modelos_expandidos(serializer, expand):
+    """
+    Modelos relacionados de las FKs de 'expand' en el serializer sin aplicar:
+    su versión de datos entra en el ETag. Omite los nombres no expandibles
+    (aplicar responde 400 con ellos).
+    """
+    serializer = getattr(serializer, 'child', serializer)
+    modelos = []
+    for nombre in expand:
+        field = serializer.fields.get(nombre)
+        if not isinstance(field, relations.PrimaryKeyRelatedField) or len(field.source_attrs) != 1:
+            continue
+        try:
+            modelos.append(serializer.Meta.model._meta.get_field(field.source_attrs[0]).related_model)
+        except FieldDoesNotExist:
+            continue
+    return modelos
+
+
+def _recortar(serializer, arbol, prefijo=''):
+    pedidos = dict(arbol)
+    legibles = {nombre for nombre, field in serializer.fields.items() if not field.write_only}
+    desconocidos = sorted(pedidos.keys() - legibles)
+    if desconocidos:
+        raise ValidationError({'fields': f"Campos desconocidos: {', '.join(prefijo + n for n in desconocidos)}."})
+    for nombre in list(serializer.fields):
+        if nombre not in legibles:
+            continue # write_only: no salen en la lectura
+        if nombre not in pedidos:
+            serializer.fields.pop(nombre)
+        elif pedidos[nombre] is not None:
+            field = serializer.fields[nombre]
+            hijo = field.child if isinstance(field, serializers.ListSerializer) else field
+            if not isinstance(hijo, serializers.Serializer):
+                raise ValidationError({'fields': f'{prefijo}{nombre} no tiene subcampos.'})
+            _recortar(hijo, pedidos[nombre], f'{prefijo}{nombre}.')
+
+
+def aplicar(serializer, sparse):
+    """ Expande y recorta el serializer (el hijo si es many=True) según (fields, expand). """
+    fields, expand = sparse
+    serializer = getattr(serializer, 'child', serializer)
+    for nombre in expand:
+        _expandir(serializer, nombre)
+    if fields is not None:
+        _recortar(serializer, fields)
+    return serializer
+
+
+def _carga(model, serializer, prefijo=''):
+    """ (only, select_related, prefetch_related) que necesitan los campos del serializer. """
+    only, select, prefetch = set(), set(), []
+    for field in serializer._readable_fields:
+        if field.source == '*':
+            raise NoAjustable(field)
+        if isinstance(field, (serializers.ListSerializer, relations.ManyRelatedField)):
+            if prefijo or len(field.source_attrs) != 1:
+                raise NoAjustable(field)
+            nombre = field.source_attrs[0]
+            try:
+                m2m = model._meta.get_field(nombre)
+            except FieldDoesNotExist:
+                raise NoAjustable(field)
+            if not m2m.many_to_many:
+                raise NoAjustable(field)
+            related = m2m.related_model._default_manager.all()
+            if isinstance(field, serializers.ListSerializer):
+                prefetch.append(Prefetch(nombre, queryset=ajustar_queryset(related, field.child, estricto=True)))
+            else:
+                prefetch.append(Prefetch(nombre, queryset=related.only('pk')))
+            continue
+
+        actual, ruta = model, []
+        anidado = isinstance(field, serializers.BaseSerializer)
+        for i, attr in enumerate(field.source_attrs):
+            try:
+                model_field = actual._meta.get_field(attr)
+            except FieldDoesNotExist:
+                raise NoAjustable(field) # Propiedad o método del modelo
+            ruta.append(attr)
+            if i < len(field.source_attrs) - 1 or anidado:
+                if not model_field.concrete or not (model_field.many_to_one or model_field.one_to_one):
+                    raise NoAjustable(field)
+                select.add(prefijo + '__'.join(ruta))
+                actual = model_field.related_model
+            elif not model_field.concrete or model_field.many_to_many:
+                raise NoAjustable(field)
+        only.add(prefijo + '__'.join(ruta))
+        if anidado:
+            sub_only, sub_select, sub_prefetch = _carga(actual, field, prefijo + '__'.join(ruta) + '__')
+            if sub_prefetch:
+                raise NoAjustable(field)
+            only |= sub_only
+            select |= sub_select
+    return only, select, prefetch
+
+
+def ajustar_queryset(queryset, serializer, extra=(), estricto=False):
+    """
+    El queryset con only()/select_related/prefetch_related de lo que el serializer
+    va a leer ('extra': columnas que necesita la vista, p. ej. las del orden).
+    Si algún campo no sale de una columna (propiedad, source='*') se deja igual.
+    """
+    serializer = getattr(serializer, 'child', serializer)
+    try:
+        only, select, prefetch = _carga(queryset.model, serializer)
+    except NoAjustable:
+        if estricto:
+            raise
+        return queryset
+    queryset = queryset.select_related(None).prefetch_related(None)
+    if select:
+        queryset = queryset.select_related(*sorted(select))
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset.only(*only, *extra)
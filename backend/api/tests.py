@@ -1,3 +1,1514 @@
-from django.test import TestCase
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+from openpyxl import Workbook, load_workbook
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.http import StreamingHttpResponse
+from django.db import connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models.query import QuerySet
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.serializers import BaseSerializer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import audit, exports, fastpath, imports, log_archive, log_partitions, metrics, snapshots
+from .audit import get_client_ip
+from .authentication import USER_FIELDS, USER_SCOPE, TenantJWTAuthentication
+from .cache import get_data_versions, get_version, shared_cache
+from .depreciation import LINEAL, METODOS, SALDO_DECRECIENTE, Cartera
+from .log_buffer import LogBuffer, compactar_payload, limitar_payload
+from .models import *
+from .pagination import KeysetPagination
+from .permissions import get_user_permissions
+from .serializers import MyTokenObtainPairSerializer
+from .urls import router
+
+# Caché en memoria: las pruebas no tocan el directorio de la caché de desarrollo
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def crear_empresa(nombre):
+    return Empresa.objects.create(nombre=nombre, nit=f'NIT-{nombre}')
+
+
+def crear_empleado(empresa, username, roles=()):
+    usuario = User.objects.create_user(username=username, password='clave123', first_name=username.title())
+    empleado = Empleado.objects.create(usuario=usuario, empresa=empresa, ci=username, apellido_p='Pérez', apellido_m='Soto')
+    empleado.roles.set(roles)
+    return empleado
+
+
+def crear_catalogos(empresa, sufijo=''):
+    """ {modelo: instancia} con un registro de cada catálogo que usa ActivoFijo. """
+    return {
+        'categoria': CategoriaActivo.objects.create(empresa=empresa, nombre=f'Equipos{sufijo}'),
+        'estado': Estado.objects.create(empresa=empresa, nombre=f'Nuevo{sufijo}'),
+        'ubicacion': Ubicacion.objects.create(empresa=empresa, nombre=f'Oficina{sufijo}'),
+        'proveedor': Proveedor.objects.create(empresa=empresa, nombre=f'Proveedor{sufijo}', nit='123'),
+    }
+
+
+def crear_activo(empresa, catalogos, codigo, **campos):
+    valores = {
+        'nombre': f'Activo {codigo}', 'fecha_adquisicion': date(2024, 1, 15),
+        'valor_actual': Decimal('1200.00'), 'vida_util': 5, **catalogos, **campos,
+    }
+    return ActivoFijo.objects.create(empresa=empresa, codigo_interno=codigo, **valores)
+
+
+@override_settings(CACHES=TEST_CACHES, LOG_BUFFER_ENABLED=False)
+class TenantTestCase(TestCase):
+    """
+    Empresa con un administrador (todos los permisos de 'manage_*' y 'view_log')
+    y un cliente de la API autenticado con su JWT. Las escrituras que deben
+    confirmarse (versiones de caché, bitácora) van dentro de confirmar().
+    """
+    databases = {'default', 'logs'}
+    PERMISOS = (
+        'manage_activofijo', 'manage_categoriaactivo', 'manage_estadoactivo', 'manage_ubicacion',
+        'manage_proveedor', 'manage_cargo', 'manage_departamento', 'manage_empleado',
+        'manage_presupuesto', 'manage_rol', 'view_log',
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = crear_empresa('Acme')
+        cls.permisos = {nombre: Permisos.objects.create(nombre=nombre, descripcion=nombre) for nombre in cls.PERMISOS}
+        cls.rol_admin = Roles.objects.create(empresa=cls.empresa, nombre='Admin')
+        cls.rol_admin.permisos.set(cls.permisos.values())
+        cls.empleado = crear_empleado(cls.empresa, 'admin', [cls.rol_admin])
+        cls.user = cls.empleado.usuario
+
+    def setUp(self):
+        shared_cache().clear()
+        self.client = self.cliente(self.user)
+
+    @staticmethod
+    def cliente(user):
+        client = APIClient()
+        token = MyTokenObtainPairSerializer.get_token(user).access_token
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return client
+
+    def confirmar(self):
+        """ Ejecuta los on_commit de lo que se haga dentro, como al confirmar la transacción. """
+        return self.captureOnCommitCallbacks(execute=True)
+
+
+class PermisosCacheTests(TenantTestCase):
+    """ Invalidación por versiones de get_user_permissions (api/permissions.py, api/signals.py). """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.ver = Permisos.objects.create(nombre='ver_reportes', descripcion='')
+        cls.editar = Permisos.objects.create(nombre='editar_reportes', descripcion='')
+        cls.rol = Roles.objects.create(empresa=cls.empresa, nombre='Contador')
+        cls.rol.permisos.set([cls.ver])
+        cls.otro_rol = Roles.objects.create(empresa=cls.empresa, nombre='Auditor')
+        cls.otro_rol.permisos.set([cls.editar])
+        cls.contador = crear_empleado(cls.empresa, 'contador', [cls.rol]).usuario
+
+    def actuales(self):
+        return get_user_permissions(self.contador, self.empresa.pk)
+
+    def test_cache_caliente_sin_consultas(self):
+        self.assertEqual(self.actuales(), {'ver_reportes'})
+        with self.assertNumQueries(0):
+            self.assertEqual(self.actuales(), {'ver_reportes'})
+
+    def test_permisos_del_rol_agregados_y_quitados(self):
+        self.assertEqual(self.actuales(), {'ver_reportes'})
+        with self.confirmar():
+            self.rol.permisos.add(self.editar)
+        self.assertEqual(self.actuales(), {'ver_reportes', 'editar_reportes'})
+        with self.confirmar():
+            self.rol.permisos.remove(self.ver)
+        self.assertEqual(self.actuales(), {'editar_reportes'})
+        with self.confirmar():
+            self.editar.roles_set.remove(self.rol) # Lado inverso de la relación
+        self.assertEqual(self.actuales(), frozenset())
+
+    def test_roles_del_empleado(self):
+        empleado = self.contador.empleado
+        self.assertEqual(self.actuales(), {'ver_reportes'})
+        with self.confirmar():
+            empleado.roles.add(self.otro_rol)
+        self.assertEqual(self.actuales(), {'ver_reportes', 'editar_reportes'})
+        with self.confirmar():
+            empleado.roles.remove(self.rol)
+        self.assertEqual(self.actuales(), {'editar_reportes'})
+        with self.confirmar():
+            self.otro_rol.delete()
+        self.assertEqual(self.actuales(), frozenset())
+
+    def test_permiso_global_renombrado(self):
+        self.assertEqual(self.actuales(), {'ver_reportes'})
+        with self.confirmar():
+            self.ver.nombre = 'ver_informes'
+            self.ver.save()
+        self.assertEqual(self.actuales(), {'ver_informes'})
+
+    def test_sin_empresa_conocida(self):
+        # Sin request.tenant la empresa se busca una vez y queda en la entrada
+        self.assertEqual(get_user_permissions(self.contador), {'ver_reportes'})
+        with self.confirmar():
+            self.rol.permisos.add(self.editar)
+        self.assertEqual(get_user_permissions(self.contador), {'ver_reportes', 'editar_reportes'})
+
+
+class TenantJWTTests(TenantTestCase):
+    """ request.tenant sale del claim 'empresa_id' del JWT (api/authentication.py). """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        crear_activo(cls.empresa, crear_catalogos(cls.empresa), 'ACME-1')
+        cls.otra = crear_empresa('Globex')
+        rol = Roles.objects.create(empresa=cls.otra, nombre='Admin')
+        rol.permisos.set(cls.permisos.values())
+        cls.ajeno = crear_empleado(cls.otra, 'globex', [rol]).usuario
+        crear_activo(cls.otra, crear_catalogos(cls.otra, ' Globex'), 'GLX-1')
+
+    def codigos(self, client):
+        response = client.get('/api/activos-fijos/')
+        self.assertEqual(response.status_code, 200)
+        return [fila['codigo_interno'] for fila in response.data]
+
+    def test_cada_usuario_ve_su_empresa(self):
+        self.assertEqual(self.codigos(self.client), ['ACME-1'])
+        self.assertEqual(self.codigos(self.cliente(self.ajeno)), ['GLX-1'])
+
+    def test_token_sin_claim_no_tiene_empresa(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.assertEqual(self.codigos(client), [])
+
+
+class MetricsTests(TestCase):
+    """ /api/metrics/ y el modo multiproceso de api/metrics.py. """
+
+    def test_sin_token_configurado_no_se_expone(self):
+        with override_settings(METRICS_AUTH_TOKEN=None, DEBUG=True), self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+
+    def test_token_del_scraper(self):
+        with override_settings(METRICS_AUTH_TOKEN='secreto'):
+            with self.assertLogs('django.request', 'WARNING'):
+                self.assertEqual(self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer otro').status_code, 403)
+            response = self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer secreto')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+    def test_ficheros_de_procesos_terminados(self):
+        proceso = subprocess.Popen([sys.executable, '-c', 'pass'])
+        proceso.wait() # Su pid ya no existe
+        snapshot = {'counters': [['api_requests_total', [['status', '200']], 3]], 'histograms': []}
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_MULTIPROC_DIR=directory):
+            for inicio in (1, 2): # Dos procesos terminados con el mismo pid (reinicios)
+                with open(os.path.join(directory, f'metrics-{proceso.pid}-{inicio}.json'), 'w') as fh:
+                    json.dump(snapshot, fh)
+            counters, _ = metrics.registry.collect()
+            self.assertEqual(sorted(os.listdir(directory)), [metrics.LOCK_FILE, metrics.DEAD_FILE])
+            self.assertEqual(counters[('api_requests_total', (('status', '200'),))], 6)
+            # Otro proceso que termina: se suma al acumulado, sin retroceder
+            with open(os.path.join(directory, f'metrics-{proceso.pid}-3.json'), 'w') as fh:
+                json.dump(snapshot, fh)
+            counters, _ = metrics.registry.collect()
+            self.assertEqual(counters[('api_requests_total', (('status', '200'),))], 9)
+
+
+class KeysetPaginationTests(TenantTestCase):
+    """ Cursor de api/pagination.py: empates, orden descendente y cursores manipulados. """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.catalogos = crear_catalogos(cls.empresa)
+        # Siete activos con sólo dos fechas de adquisición: casi todo son empates
+        cls.activos = [
+            crear_activo(cls.empresa, cls.catalogos, f'A{i}', fecha_adquisicion=date(2024, 1, 1 + i % 2))
+            for i in range(7)
+        ]
+
+    def recorrer(self, ruta, page_size, **params):
+        ids, url, paginas = [], ruta, 0
+        datos = {'page_size': page_size, **params}
+        while url:
+            response = self.client.get(url, datos if url == ruta else None)
+            self.assertEqual(response.status_code, 200)
+            ids += [fila['id'] for fila in response.data['results']]
+            url, paginas = response.data['next'], paginas + 1
+        return ids, paginas
+
+    def test_empates_en_la_columna_no_unica(self):
+        esperado = [str(a.pk) for a in sorted(self.activos, key=lambda a: (a.fecha_adquisicion, str(a.pk)))]
+        for page_size in (1, 2, 3, 7):
+            ids, paginas = self.recorrer('/api/activos-fijos/', page_size)
+            self.assertEqual(ids, esperado)
+            self.assertEqual(paginas, -(-len(esperado) // page_size))
+
+    def test_orden_descendente(self):
+        trabajos = [
+            TrabajoExportacion.objects.create(empresa=self.empresa, usuario=self.user, clave=f'k{i}')
+            for i in range(5)
+        ]
+        # ('-fecha_creacion', '-id') con empates en la fecha
+        momento = timezone.now()
+        TrabajoExportacion.objects.filter(pk__in=[t.pk for t in trabajos[:3]]).update(fecha_creacion=momento)
+        TrabajoExportacion.objects.filter(pk__in=[t.pk for t in trabajos[3:]]).update(fecha_creacion=momento - timedelta(days=1))
+        esperado = [str(pk) for pk in TrabajoExportacion.objects.order_by('-fecha_creacion', '-id').values_list('pk', flat=True)]
+        self.assertEqual(set(esperado[:3]), {str(t.pk) for t in trabajos[:3]})
+        for page_size in (1, 2, 4):
+            ids, _ = self.recorrer('/api/reportes/exportaciones/', page_size)
+            self.assertEqual(ids, esperado)
+
+    def test_cursor_manipulado(self):
+        paginacion = KeysetPagination()
+        validos = ['2024-01-01', str(self.activos[0].pk)]
+        cursores = [
+            'esto no es base64!',
+            paginacion.encode_cursor({'a': 1}), # No es una lista
+            paginacion.encode_cursor(validos[:1]), # Faltan valores
+            paginacion.encode_cursor(['no-es-fecha', validos[1]]),
+            paginacion.encode_cursor([validos[0], 'no-es-uuid']),
+            paginacion.encode_cursor([{'fecha': 1}, validos[1]]),
+            paginacion.encode_cursor([None, validos[1]]),
+        ]
+        for cursor in cursores:
+            with self.subTest(cursor=cursor):
+                response = self.client.get('/api/activos-fijos/', {'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.client.get('/api/activos-fijos/', {'cursor': paginacion.encode_cursor(validos)}).status_code, 200)
+
+
+class ReporteExportTests(TenantTestCase):
+    """ GET /api/reportes/activos-export/ en CSV (streaming), Excel y PDF. """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        catalogos = crear_catalogos(cls.empresa)
+        for codigo in ('E-1', 'E-2', 'E-3'):
+            crear_activo(cls.empresa, catalogos, codigo)
+        otra = crear_empresa('Globex')
+        crear_activo(otra, crear_catalogos(otra), 'GLX-1')
+
+    def exportar(self, **params):
+        return self.client.get('/api/reportes/activos-export/', params)
+
+    def test_csv_en_streaming(self):
+        response = self.exportar(format='csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response, StreamingHttpResponse)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        lineas = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(lineas[0], 'Nombre,Código Interno,Ubicación,Fecha Adquisición,Valor Actual (Bs.),Estado')
+        # Una fila por activo de la empresa, ninguna de la otra
+        self.assertEqual(sorted(linea.split(',')[1] for linea in lineas[1:]), ['E-1', 'E-2', 'E-3'])
+        self.assertIn('Activo E-1,E-1,Oficina,2024-01-15,1200.00,Nuevo', lineas)
+
+    def test_excel(self):
+        response = self.exportar(format='excel')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        self.assertIn('reporte_activos.xlsx', response['Content-Disposition'])
+        hoja = load_workbook(BytesIO(b''.join(response.streaming_content))).active
+        filas = list(hoja.iter_rows(values_only=True))
+        self.assertEqual(filas[0][1], 'Código Interno')
+        self.assertEqual(sorted(fila[1] for fila in filas[1:]), ['E-1', 'E-2', 'E-3'])
+
+    def test_pdf(self):
+        response = self.exportar(format='pdf')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(response.content.startswith(b'%PDF'))
+
+
+class ExportacionesTests(TenantTestCase):
+    """ Trabajos de exportación (api/exports.py): errores, latido y re-encolado. """
+
+    def setUp(self):
+        super().setUp()
+        self.directorio = tempfile.TemporaryDirectory()
+        self.enterContext(override_settings(EXPORT_RESULTS_DIR=self.directorio.name))
+        self.addCleanup(self.directorio.cleanup)
+
+    def reclamar(self, formato='csv'):
+        trabajo = TrabajoExportacion.objects.create(empresa=self.empresa, usuario=self.user, formato=formato, clave=f'k-{formato}')
+        self.assertEqual(exports.claim_jobs(5), [trabajo.pk])
+        return trabajo
+
+    def test_completado(self):
+        trabajo = self.reclamar()
+        self.assertEqual(exports.run_export_job(trabajo.pk), TrabajoExportacion.COMPLETADO)
+        trabajo.refresh_from_db()
+        self.assertTrue(os.path.exists(trabajo.archivo))
+
+    def test_error_sin_detalles_internos(self):
+        trabajo = self.reclamar()
+        with mock.patch.object(exports, 'generar_archivo', side_effect=OSError('/srv/secreto/disco lleno')), \
+                self.assertLogs('api', 'ERROR'):
+            self.assertEqual(exports.run_export_job(trabajo.pk), TrabajoExportacion.ERROR)
+        response = self.client.get(f'/api/reportes/exportaciones/{trabajo.pk}/')
+        self.assertEqual(response.data['estado'], TrabajoExportacion.ERROR)
+        self.assertEqual(response.data['error'], exports.ERROR_GENERICO)
+        self.assertNotIn('secreto', response.content.decode())
+
+    def test_filtros_mal_formados(self):
+        response = self.client.post('/api/reportes/exportaciones/', {'formato': 'csv', 'filtros': {'fecha_min': 'ayer'}}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('fecha_min', response.data['filtros'])
+        self.assertFalse(TrabajoExportacion.objects.exists())
+
+    def test_solo_se_reencola_sin_latido(self):
+        vivo, muerto = self.reclamar('csv'), self.reclamar('pdf')
+        hace_una_hora = timezone.now() - timedelta(hours=1)
+        # Los dos empezaron hace una hora; sólo 'vivo' sigue latiendo
+        TrabajoExportacion.objects.filter(pk=vivo.pk).update(fecha_inicio=hace_una_hora, latido=timezone.now())
+        TrabajoExportacion.objects.filter(pk=muerto.pk).update(fecha_inicio=hace_una_hora, latido=hace_una_hora)
+        self.assertEqual(exports.requeue_stale_jobs(), 1)
+        vivo.refresh_from_db()
+        muerto.refresh_from_db()
+        self.assertEqual(vivo.estado, TrabajoExportacion.PROCESANDO)
+        self.assertEqual((muerto.estado, muerto.latido), (TrabajoExportacion.PENDIENTE, None))
+
+    def test_reclamo_perdido_no_pisa_el_estado(self):
+        trabajo = self.reclamar()
+
+        def reencolado_y_reclamado(trabajo):
+            # Mientras se generaba: se re-encoló y otro worker lo tomó
+            TrabajoExportacion.objects.filter(pk=trabajo.pk).update(estado=TrabajoExportacion.PENDIENTE, fecha_inicio=None)
+            exports.claim_jobs(1)
+            raise OSError('fallo del primer worker')
+
+        with mock.patch.object(exports, 'generar_archivo', side_effect=reencolado_y_reclamado), self.assertLogs('api', 'ERROR'):
+            self.assertIsNone(exports.run_export_job(trabajo.pk))
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.error), (TrabajoExportacion.PROCESANDO, ''))
+
+
+class LatidoExportacionTests(TransactionTestCase):
+    """ El hilo de latido usa su propia conexión: necesita datos confirmados. """
+
+    def test_latido_mientras_se_genera(self):
+        empresa = crear_empresa('Latido')
+        trabajo = TrabajoExportacion.objects.create(empresa=empresa, formato='csv', clave='k')
+        exports.claim_jobs(1)
+        trabajo.refresh_from_db()
+        inicial = trabajo.latido
+
+        def lento(trabajo):
+            time.sleep(0.3)
+            return 'reporte.csv'
+
+        with override_settings(EXPORT_JOB_HEARTBEAT=0.05), mock.patch.object(exports, 'generar_archivo', side_effect=lento):
+            exports.run_export_job(trabajo.pk)
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, TrabajoExportacion.COMPLETADO)
+        self.assertGreater(trabajo.latido, inicial)
+
+
+class ResumenActivosTests(TenantTestCase):
+    """ GET /api/reportes/activos-resumen/: un GROUP BY por dimensión y filtros validados. """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.a = crear_catalogos(cls.empresa, ' A')
+        b = crear_catalogos(cls.empresa, ' B')
+        crear_activo(cls.empresa, cls.a, 'R-1', valor_actual=Decimal('100.00'), fecha_adquisicion=date(2023, 3, 10))
+        crear_activo(cls.empresa, cls.a, 'R-2', valor_actual=Decimal('250.50'), fecha_adquisicion=date(2024, 3, 1))
+        crear_activo(cls.empresa, {**cls.a, 'ubicacion': b['ubicacion']}, 'R-3',
+                     valor_actual=Decimal('40.00'), fecha_adquisicion=date(2024, 3, 31))
+        crear_activo(cls.empresa, b, 'R-4', valor_actual=Decimal('9.50'), fecha_adquisicion=date(2024, 7, 2))
+        otra = crear_empresa('Globex')
+        crear_activo(otra, crear_catalogos(otra), 'GLX-1', valor_actual=Decimal('1000.00'))
+
+    def resumen(self, **params):
+        return self.client.get('/api/reportes/activos-resumen/', params)
+
+    def filas(self, data, clave):
+        return [(fila[clave], fila['cantidad'], fila['valor_total']) for fila in data]
+
+    def test_totales_por_dimension(self):
+        response = self.resumen(por='categoria,ubicacion,anio,mes')
+        self.assertEqual(response.status_code, 200)
+        data = response.data
+        self.assertEqual(data['total'], {'cantidad': 4, 'valor_total': Decimal('400.00')})
+        self.assertEqual(self.filas(data['categoria'], 'nombre'),
+                         [('Equipos A', 3, Decimal('390.50')), ('Equipos B', 1, Decimal('9.50'))])
+        self.assertEqual(self.filas(data['ubicacion'], 'nombre'),
+                         [('Oficina A', 2, Decimal('350.50')), ('Oficina B', 2, Decimal('49.50'))])
+        self.assertEqual(self.filas(data['anio'], 'periodo'), [(2023, 1, Decimal('100.00')), (2024, 3, Decimal('300.00'))])
+        self.assertEqual(self.filas(data['mes'], 'periodo'),
+                         [('2023-03', 1, Decimal('100.00')), ('2024-03', 2, Decimal('290.50')), ('2024-07', 1, Decimal('9.50'))])
+        self.assertNotIn('estado', data)
+
+    def test_filtros(self):
+        data = self.resumen(por='anio', ubicacion_id=str(self.a['ubicacion'].pk), fecha_min='2024-01-01').data
+        self.assertEqual(data['total'], {'cantidad': 1, 'valor_total': Decimal('250.50')})
+
+    def test_filtros_mal_formados(self):
+        for params in ({'ubicacion_id': 'no-es-uuid'}, {'fecha_min': '2024-13-01'}, {'fecha_max': 'ayer'}):
+            with self.subTest(params=params):
+                response = self.resumen(**params)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(list(response.data), list(params))
+        self.assertEqual(self.resumen(por='color').status_code, 400)
+
+
+class CarteraTests(SimpleTestCase):
+    """
+    Motor vectorizado (api/depreciation.py) contra calendarios calculados a mano:
+    1200 Bs., 5 años de vida útil, adquirido el 15/01/2024, residual cero.
+    """
+    ADQUISICION = date(2024, 1, 15)
+
+    def calcular(self, fechas, metodo, costo=1200, vida=5):
+        cartera = Cartera([costo] * len(fechas), [vida] * len(fechas), [self.ADQUISICION] * len(fechas))
+        acumulada, libros = cartera.calcular(np.array(fechas, dtype='datetime64[D]'), metodo)
+        return [(round(a, 2), round(l, 2)) for a, l in zip(acumulada.tolist(), libros.tolist())]
+
+    def test_linea_recta(self):
+        # 1200 / 60 meses = 20 Bs. por mes completo transcurrido
+        calendario = {
+            date(2023, 12, 31): (0, 0), # Aún no adquirido
+            date(2024, 1, 15): (0, 1200),
+            date(2024, 2, 14): (0, 1200), # Falta un día para el primer mes
+            date(2024, 2, 15): (20, 1180),
+            date(2024, 12, 31): (220, 980), # 11 meses
+            date(2026, 7, 15): (600, 600), # 30 meses
+            date(2029, 1, 14): (1180, 20),
+            date(2029, 1, 15): (1200, 0), # Fin de la vida útil
+            date(2035, 1, 1): (1200, 0),
+        }
+        self.assertEqual(self.calcular(list(calendario), LINEAL), list(calendario.values()))
+
+    def test_saldo_decreciente(self):
+        # Tasa 2/5 = 40 % sobre el saldo; en el 4.º año la línea recta sobre el
+        # saldo (259,2 / 2) supera al 40 % (103,68) y se reparte en los dos que quedan
+        calendario = {
+            date(2024, 1, 15): (0, 1200),
+            date(2025, 1, 15): (480, 720),
+            date(2026, 1, 15): (768, 432),
+            date(2027, 1, 15): (940.8, 259.2),
+            date(2028, 1, 15): (1070.4, 129.6),
+            date(2029, 1, 15): (1200, 0),
+            date(2031, 1, 15): (1200, 0),
+            date(2025, 7, 15): (624, 576), # Año 2 prorrateado: 720 - 6/12 * 288
+            date(2024, 4, 15): (120, 1080), # Año 1: 3/12 * 480
+        }
+        self.assertEqual(self.calcular(list(calendario), SALDO_DECRECIENTE), list(calendario.values()))
+
+    def test_sin_vida_util_no_deprecia(self):
+        for metodo in METODOS:
+            self.assertEqual(self.calcular([date(2030, 1, 1)], metodo, vida=0), [(0, 1200)])
+
+    def test_totales_y_calendario(self):
+        cartera = Cartera(
+            [1200, 600, 1000], [5, 5, 10], [self.ADQUISICION, self.ADQUISICION, date(2025, 6, 1)],
+            grupos=[0, 0, 1], etiquetas=[{'id': 'a'}, {'id': 'b'}],
+        )
+        self.assertEqual(cartera.totales(date(2024, 12, 31)), {
+            'cantidad': 2, 'costo': 1800.0, 'depreciacion_acumulada': 330.0, 'valor_libros': 1470.0,
+        })
+        self.assertEqual(cartera.totales_por_grupo(date(2024, 12, 31)), [
+            {'id': 'a', 'cantidad': 2, 'costo': 1800.0, 'depreciacion_acumulada': 330.0, 'valor_libros': 1470.0},
+            {'id': 'b', 'cantidad': 0, 'costo': 0.0, 'depreciacion_acumulada': 0.0, 'valor_libros': 0.0},
+        ])
+        # 2025: 12 meses de los dos primeros (360) y 6 del tercero (1000 / 120 * 6 = 50)
+        self.assertEqual(cartera.calendario(2024, 2), [
+            {'anio': 2024, 'depreciacion': 330.0, 'valor_libros': 1470.0},
+            {'anio': 2025, 'depreciacion': 410.0, 'valor_libros': 2060.0},
+        ])
+
+
+class FechaLocalTests(TenantTestCase):
+    """ 'Hoy' es el de settings.TIME_ZONE (America/La_Paz, UTC-4), no el del servidor. """
+    # 1 de marzo, 02:00 UTC = 29 de febrero, 22:00 en La Paz
+    AHORA = datetime(2024, 3, 1, 2, 0, tzinfo=dt_timezone.utc)
+
+    def test_fecha_por_defecto_de_la_depreciacion(self):
+        with mock.patch('django.utils.timezone.now', return_value=self.AHORA):
+            response = self.client.get('/api/depreciacion/')
+        self.assertEqual(response.data['fecha'], date(2024, 2, 29))
+
+    def test_ultimo_cierre(self):
+        with mock.patch('django.utils.timezone.now', return_value=self.AHORA):
+            self.assertEqual(snapshots.ultimo_cierre(), date(2024, 1, 31))
+
+
+class DepreciacionParametrosTests(TenantTestCase):
+    """ Parámetros mal formados de /api/depreciacion/ y su histórico: 400, nunca 500. """
+
+    def test_400(self):
+        casos = [
+            ('/api/depreciacion/', {'ubicacion_id': 'x'}, 'ubicacion_id'),
+            ('/api/depreciacion/', {'fecha_max': '2024-02-30'}, 'fecha_max'),
+            ('/api/depreciacion/', {'fecha': '31/12/2024'}, 'fecha'),
+            ('/api/depreciacion/', {'metodo': 'suma'}, 'metodo'),
+            ('/api/depreciacion/', {'anios': 'diez'}, 'anios'),
+            ('/api/depreciacion/historico/', {'desde': 'x'}, 'desde'),
+            ('/api/depreciacion/historico/', {'activo': '1:x'}, 'activo'),
+        ]
+        for ruta, params, campo in casos:
+            with self.subTest(ruta=ruta, params=params):
+                response = self.client.get(ruta, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(campo, response.data)
+
+
+class HistoricoIncrementalTests(TenantTestCase):
+    """ refresh_depreciacion (api/snapshots.py) sólo recalcula los activos marcados. """
+    HASTA = date(2024, 6, 30)
+
+    def setUp(self):
+        super().setUp()
+        catalogos = crear_catalogos(self.empresa)
+        with self.confirmar():
+            self.editado = crear_activo(self.empresa, catalogos, 'A-1')
+            self.intacto = crear_activo(self.empresa, catalogos, 'A-2')
+        snapshots.refrescar_empresa(self.empresa.pk, self.HASTA, [LINEAL])
+
+    def historico(self, activo):
+        return list(
+            DepreciacionMensual.objects.filter(activo=activo).order_by('periodo')
+            .values_list('id', 'periodo', 'depreciacion_acumulada', 'valor_libros')
+        )
+
+    @override_settings(DEPRECIACION_METODOS_MENSUALES=[LINEAL, SALDO_DECRECIENTE])
+    def test_refresco_de_un_solo_metodo(self):
+        snapshots.refrescar_empresa(self.empresa.pk, self.HASTA, [SALDO_DECRECIENTE])
+        lineal = DepreciacionMensual.objects.filter(activo=self.editado, metodo=LINEAL)
+        antes = list(lineal.values_list('id', 'periodo', 'depreciacion_acumulada', 'valor_libros'))
+        self.assertEqual(len(antes), 6)
+        with self.confirmar():
+            self.editado.valor_actual = Decimal('2400.00')
+            self.editado.save()
+
+        # --metodo saldo_decreciente: el lineal del activo editado sigue ahí y pendiente
+        snapshots.refrescar_empresa(self.empresa.pk, self.HASTA, [SALDO_DECRECIENTE])
+        self.assertEqual(list(lineal.values_list('id', 'periodo', 'depreciacion_acumulada', 'valor_libros')), antes)
+        self.assertTrue(ActivoPendienteDepreciacion.objects.filter(activo=self.editado).exists())
+
+        snapshots.refrescar_empresa(self.empresa.pk, self.HASTA)
+        self.assertEqual(lineal.order_by('periodo').last().valor_libros, Decimal('2200.00'))
+        self.assertFalse(ActivoPendienteDepreciacion.objects.exists())
+
+    def test_solo_cambia_el_activo_editado(self):
+        antes_editado, antes_intacto = self.historico(self.editado), self.historico(self.intacto)
+        # Enero (adquisición) a junio; junio: 5 meses de 20 Bs.
+        self.assertEqual(len(antes_editado), 6)
+        self.assertEqual(antes_editado[-1][2:], (Decimal('100.00'), Decimal('1100.00')))
+
+        with self.confirmar():
+            self.editado.valor_actual = Decimal('2400.00')
+            self.editado.save()
+        self.assertEqual(snapshots.refrescar_empresa(self.empresa.pk, self.HASTA, [LINEAL]), ({LINEAL: 0}, 1))
+
+        self.assertEqual(self.historico(self.intacto), antes_intacto) # Mismas filas, ni reescritas
+        despues = self.historico(self.editado)
+        self.assertEqual([fila[1] for fila in despues], [fila[1] for fila in antes_editado])
+        self.assertEqual(despues[-1][2:], (Decimal('200.00'), Decimal('2200.00')))
+        self.assertFalse(ActivoPendienteDepreciacion.objects.exists())
+
+    def test_la_marca_espera_a_la_confirmacion(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.editado.save()
+        self.assertFalse(ActivoPendienteDepreciacion.objects.exists())
+        for callback in callbacks:
+            callback()
+        self.assertEqual(list(ActivoPendienteDepreciacion.objects.values_list('activo_id', flat=True)), [self.editado.pk])
+
+
+@override_settings(LOG_BUFFER_ENABLED=True, LOG_BUFFER_FLUSH_INTERVAL=60)
+class LogBufferTests(TransactionTestCase):
+    """ El hilo de LogBuffer escribe con bulk_create al llenarse un lote y al apagarse. """
+    databases = {'default', 'logs'}
+
+    def setUp(self):
+        self.buffer = LogBuffer()
+        self.addCleanup(self.buffer.shutdown, 0)
+        espia = mock.patch.object(QuerySet, 'bulk_create', autospec=True, side_effect=QuerySet.bulk_create)
+        self.bulk_create = self.enterContext(espia)
+
+    def encolar(self, cantidad):
+        for n in range(cantidad):
+            self.assertTrue(self.buffer.enqueue(Log(ip_address='10.0.0.1', accion=f'CREATE: Cargo {n}')))
+
+    def lotes(self):
+        return [len(llamada.args[1]) for llamada in self.bulk_create.call_args_list]
+
+    @override_settings(LOG_BUFFER_BATCH_SIZE=3)
+    def test_lote_lleno(self):
+        self.encolar(4)
+        # Sin esperar el intervalo (60 s): el lote de 3 sale en cuanto se completa
+        limite = time.monotonic() + 10
+        while Log.objects.count() < 3:
+            self.assertLess(time.monotonic(), limite, 'El lote lleno no se escribió')
+            time.sleep(0.05)
+        self.assertEqual(self.lotes(), [3])
+        # El cuarto espera al siguiente lote (o al intervalo): lo escribe el apagado
+        self.buffer.shutdown()
+        self.assertEqual(Log.objects.count(), 4)
+        self.assertEqual(self.lotes(), [3, 1])
+
+    @override_settings(LOG_BUFFER_BATCH_SIZE=100)
+    def test_apagado_escribe_lo_pendiente(self):
+        self.encolar(5)
+        self.assertEqual(Log.objects.count(), 0)
+        self.buffer.shutdown()
+        self.assertEqual(sorted(Log.objects.values_list('accion', flat=True)), [f'CREATE: Cargo {n}' for n in range(5)])
+        self.assertEqual(sum(self.lotes()), 5)
+
+
+@skipUnless(connections['logs'].vendor == 'postgresql', 'Las particiones de api_log sólo existen en PostgreSQL')
+@override_settings(LOG_RETENTION_DAYS=365)
+class ParticionesLogTests(TenantTestCase):
+    """ Particiones mensuales y retención de la bitácora (api/log_partitions.py). """
+    # Lejos de las particiones que crea la migración (mes actual y 3 siguientes)
+    AHORA = datetime(2031, 3, 15, tzinfo=dt_timezone.utc)
+
+    def log(self, momento, empresa=None):
+        return Log.objects.create(
+            timestamp=momento, ip_address='10.0.0.1', accion='UPDATE: ActivoFijo', tenant_id=(empresa or self.empresa).pk,
+        ).pk
+
+    def en_tabla(self, tabla):
+        with connections['logs'].cursor() as cursor:
+            cursor.execute(f'SELECT id FROM {tabla}')
+            return {fila[0] for fila in cursor.fetchall()}
+
+    def test_particion_tardia_recoge_las_filas_del_default(self):
+        fila = self.log(datetime(2031, 3, 2, tzinfo=dt_timezone.utc))
+        self.assertIn(fila, self.en_tabla(log_partitions.DEFAULT_PARTITION))
+
+        creadas = log_partitions.asegurar_particiones(1, ahora=self.AHORA)
+        self.assertEqual(creadas, ['api_log_p203103', 'api_log_p203104'])
+        self.assertEqual(self.en_tabla('api_log_p203103'), {fila})
+        self.assertNotIn(fila, self.en_tabla(log_partitions.DEFAULT_PARTITION))
+        self.assertEqual(log_partitions.asegurar_particiones(1, ahora=self.AHORA), [])
+
+    def test_retencion_con_la_retencion_maxima(self):
+        # Sin políticas propias todas las empresas tienen la máxima: nada de DELETE
+        # por empresa, pero api_log_default también se recorta
+        log_partitions.asegurar_particiones(0, ahora=datetime(2030, 1, 10, tzinfo=dt_timezone.utc))
+        self.log(datetime(2029, 6, 1, tzinfo=dt_timezone.utc)) # En api_log_default
+        self.log(datetime(2030, 1, 20, tzinfo=dt_timezone.utc)) # En api_log_p203001
+        reciente = self.log(datetime(2031, 3, 1, tzinfo=dt_timezone.utc))
+
+        eliminadas, borrados = log_partitions.aplicar_retencion(ahora=self.AHORA)
+        self.assertIn('api_log_p203001', eliminadas)
+        self.assertEqual(borrados, {log_partitions.DEFAULT_PARTITION: 1})
+        self.assertEqual(set(Log.objects.values_list('id', flat=True)), {reciente})
+
+    def test_retencion_corta_de_una_empresa(self):
+        otra = crear_empresa('Globex')
+        RetencionLogs.objects.create(empresa=otra, dias=30)
+        hace_60_dias = self.AHORA - timedelta(days=60)
+        self.log(hace_60_dias, otra)
+        conservado = self.log(hace_60_dias)
+
+        _, borrados = log_partitions.aplicar_retencion(ahora=self.AHORA, dry_run=True)
+        self.assertEqual(borrados, {log_partitions.DEFAULT_PARTITION: 0, str(otra.pk): 1})
+        self.assertEqual(Log.objects.count(), 2)
+
+        log_partitions.aplicar_retencion(ahora=self.AHORA)
+        self.assertEqual(set(Log.objects.values_list('id', flat=True)), {conservado})
+
+    def test_comando_dry_run(self):
+        fila = self.log(datetime(2000, 1, 1, tzinfo=dt_timezone.utc))
+        salida = StringIO()
+        call_command('manage_log_partitions', '--dry-run', stdout=salida)
+        self.assertIn('[dry-run] api_log_default: 1 logs vencidos borrados', salida.getvalue())
+        self.assertTrue(Log.objects.filter(pk=fila).exists())
+
+
+@skipUnless(connections['logs'].vendor == 'postgresql', 'Las particiones de api_log sólo existen en PostgreSQL')
+class MigracionParticionesTests(TransactionTestCase):
+    """ 0006_log_partitioning convierte api_log con filas existentes, y vuelve. """
+    databases = {'default', 'logs'}
+    PREVIA = [('api', '0005_log_timestamp_default')]
+
+    def migrar(self, destino):
+        executor = MigrationExecutor(connections['logs'])
+        executor.migrate(destino)
+
+    def tipo_y_filas(self):
+        with connections['logs'].cursor() as cursor:
+            cursor.execute("SELECT relkind FROM pg_class WHERE relname = 'api_log'")
+            tipo = cursor.fetchone()[0]
+            cursor.execute('SELECT id FROM api_log')
+            return tipo, {fila[0] for fila in cursor.fetchall()}
+
+    def test_ida_y_vuelta(self):
+        ultima = MigrationExecutor(connections['logs']).loader.graph.leaf_nodes('api')
+        antigua, actual = uuid.uuid4(), uuid.uuid4()
+        try:
+            self.migrar(self.PREVIA)
+            with connections['logs'].cursor() as cursor:
+                for pk, momento in ((antigua, datetime(2020, 5, 3, tzinfo=dt_timezone.utc)), (actual, timezone.now())):
+                    cursor.execute(
+                        'INSERT INTO api_log (id, "timestamp", ip_address, accion) VALUES (%s, %s, %s, %s)',
+                        [pk, momento, '10.0.0.1', 'CREATE: ActivoFijo'],
+                    )
+
+            self.migrar(ultima)
+            self.assertEqual(self.tipo_y_filas(), ('p', {antigua, actual}))
+            self.assertEqual(Log.objects.get(pk=antigua).accion, 'CREATE: ActivoFijo')
+            # Una partición por mes desde la fila más antigua
+            with connections['logs'].cursor() as cursor:
+                cursor.execute('SELECT id FROM api_log_p202005')
+                self.assertEqual(cursor.fetchall(), [(antigua,)])
+            self.assertIn('api_log_p202012', log_partitions.particiones())
+
+            self.migrar(self.PREVIA)
+            self.assertEqual(self.tipo_y_filas(), ('r', {antigua, actual}))
+        finally:
+            self.migrar(ultima)
+
+
+class BitacoraAPITests(TenantTestCase):
+    """ GET /api/logs/: bitácora de la propia empresa, con 'view_log' y filtros validados. """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.otro = crear_empleado(cls.empresa, 'cajero').usuario
+        inicio = datetime(2024, 5, 10, 12, 0, tzinfo=dt_timezone.utc)
+        filas = [
+            ('CREATE: Cargo', cls.user, '10.0.0.1', 0),
+            ('UPDATE: Cargo', cls.user, '10.0.0.2', 1),
+            ('CREATE: ActivoFijo', cls.otro, '2001:db8::1', 2),
+        ]
+        for accion, usuario, ip, dias in filas:
+            Log.objects.create(accion=accion, usuario=usuario, ip_address=ip, tenant_id=cls.empresa.pk,
+                               timestamp=inicio + timedelta(days=dias))
+        Log.objects.create(accion='CREATE: Cargo', ip_address='10.0.0.1', tenant_id=uuid.uuid4(), timestamp=inicio)
+
+    def acciones(self, **params):
+        response = self.client.get('/api/logs/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [fila['accion'] for fila in response.data['results']]
+
+    def test_solo_la_propia_empresa(self):
+        # Del más reciente al más antiguo, sin el de la otra empresa
+        self.assertEqual(self.acciones(), ['CREATE: ActivoFijo', 'UPDATE: Cargo', 'CREATE: Cargo'])
+
+    def test_leer_requiere_view_log(self):
+        client = self.cliente(self.otro)
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(client.get('/api/logs/').status_code, 403)
+        # Registrar sí puede cualquier usuario autenticado
+        response = client.post('/api/logs/', {'accion': 'LOGIN', 'payload': {'pantalla': 'inicio'}}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Log.objects.filter(accion='LOGIN', usuario=self.otro, tenant_id=self.empresa.pk).exists())
+
+    def test_filtros(self):
+        casos = [
+            ({'desde': '2024-05-11'}, ['CREATE: ActivoFijo', 'UPDATE: Cargo']),
+            ({'hasta': '2024-05-11'}, ['UPDATE: Cargo', 'CREATE: Cargo']), # Día completo
+            ({'desde': '2024-05-11T13:00:00Z'}, ['CREATE: ActivoFijo']),
+            ({'usuario': self.otro.pk}, ['CREATE: ActivoFijo']),
+            ({'accion': 'CREATE'}, ['CREATE: ActivoFijo', 'CREATE: Cargo']),
+            ({'ip': '10.0.0.2'}, ['UPDATE: Cargo']),
+            ({'ip': '2001:0db8:0:0::1'}, ['CREATE: ActivoFijo']), # Forma no canónica
+        ]
+        for params, esperadas in casos:
+            with self.subTest(params=params):
+                self.assertEqual(self.acciones(**params), esperadas)
+
+    def test_filtros_no_validos(self):
+        demasiados = {f'payload__k{n}': '1' for n in range(6)}
+        casos = [
+            ({'desde': 'ayer'}, 'desde'),
+            ({'usuario': 'admin'}, 'usuario'),
+            ({'ip': 'foo'}, 'ip'),
+            ({'ip': '1:x'}, 'ip'),
+            ({'payload__a-b': '1'}, 'payload__a-b'),
+            ({'payload__a__b__c__d': '1'}, 'payload__a__b__c__d'),
+            (demasiados, 'payload'),
+        ]
+        for params, campo in casos:
+            with self.subTest(params=params):
+                response = self.client.get('/api/logs/', params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(campo, response.data)
+
+
+@override_settings(LOG_PAYLOAD_MAX_STRING=5, LOG_PAYLOAD_MAX_ITEMS=3, LOG_PAYLOAD_MAX_DEPTH=2, LOG_PAYLOAD_MAX_BYTES=30)
+class PayloadLogTests(SimpleTestCase):
+    """ Compactación y tope de tamaño del payload al encolar (api/log_buffer.py). """
+
+    def test_textos_y_listas(self):
+        self.assertEqual(compactar_payload('12345'), '12345') # Justo en el límite
+        self.assertEqual(compactar_payload('123456'), '12345…')
+        self.assertEqual(compactar_payload([1, 2, 3, 4, 5]), [1, 2, 3])
+        self.assertEqual(compactar_payload({'a': 1, 'b': 2, 'c': 3, 'd': 4}), {'a': 1, 'b': 2, 'c': 3})
+        self.assertEqual(compactar_payload((True, None, 1.5)), [True, None, 1.5])
+        self.assertEqual(compactar_payload(Decimal('12.50')), '12.50')
+
+    def test_anidados_y_claves_sensibles(self):
+        payload = {'usuario': {'password': 'x', 'perfil': {'nombre': 'Ana'}}, 'lista': [[1]], 'Token_API': 'abc'}
+        self.assertEqual(compactar_payload(payload), {
+            'usuario': {'password': '[oculto]', 'perfil': '{…}'},
+            'lista': ['[…]'],
+            'Token_API': '[oculto]',
+        })
+
+    def test_tope_de_bytes(self):
+        pequeno = {'id': 7, 'nombre': 'Silla'}
+        self.assertEqual(limitar_payload(pequeno), pequeno)
+        grande = {'id': 7, 'id_creado': 8, 'a': 'xxxxxxxx', 'b': 'yyyyyyyy'}
+        compacto = compactar_payload(grande)
+        tamano = len(json.dumps(compacto, ensure_ascii=False))
+        self.assertGreater(tamano, 30)
+        self.assertEqual(limitar_payload(grande), {'id': 7, 'id_creado': 8, '_truncado': True, '_bytes': tamano})
+        self.assertIsNone(limitar_payload(None))
+        with override_settings(LOG_PAYLOAD_MAX_BYTES=20): # Sin ids que conservar
+            self.assertEqual(limitar_payload(['x' * 20] * 3), {'_truncado': True, '_bytes': 30})
+
+
+class PayloadFiltroTests(TenantTestCase):
+    """ ?payload__<ruta>= y ?entidad= de /api/logs/: el texto también se compara como número o booleano. """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for accion, payload in [
+            ('numero', {'id': 5, 'cambios': {'activo': True}}),
+            ('texto', {'id': '5', 'cambios': {'activo': 'si'}}),
+            ('otro', {'id': 6, 'id_creado': 5}),
+        ]:
+            Log.objects.create(accion=accion, ip_address='10.0.0.1', tenant_id=cls.empresa.pk, payload=payload)
+
+    def acciones(self, **params):
+        response = self.client.get('/api/logs/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return sorted(fila['accion'] for fila in response.data['results'])
+
+    def test_numero_booleano_y_texto(self):
+        self.assertEqual(self.acciones(payload__id='5'), ['numero', 'texto'])
+        self.assertEqual(self.acciones(payload__id='6'), ['otro'])
+        self.assertEqual(self.acciones(payload__cambios__activo='true'), ['numero'])
+        self.assertEqual(self.acciones(payload__cambios__activo='si'), ['texto'])
+        self.assertEqual(self.acciones(payload__id='5', payload__cambios__activo='true'), ['numero'])
+
+    def test_entidad(self):
+        self.assertEqual(self.acciones(entidad='5'), ['numero', 'otro', 'texto'])
+
+
+class ArchivoLogsTests(TestCase):
+    """ archivar / leer_archivo (api/log_archive.py) en NDJSON: ida y vuelta por empresa y mes. """
+    databases = {'default', 'logs'}
+    ANTES = datetime(2024, 3, 1, tzinfo=dt_timezone.utc)
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.directorio = Path(directorio.name)
+        self.enterContext(override_settings(LOG_ARCHIVE_DIR=self.directorio))
+        self.a, self.b = uuid.uuid4(), uuid.uuid4()
+        self.log(self.a, 'CREATE: Cargo', 1, 10)
+        self.log(self.a, 'UPDATE: Cargo', 2, 5)
+        self.log(self.a, 'DELETE: Cargo', 2, 20)
+        self.log(self.b, 'CREATE: Estado', 1, 15)
+        self.marzo = self.log(self.a, 'CREATE: Rol', 3, 2) # Posterior al corte: se queda
+
+    def log(self, tenant_id, accion, mes, dia):
+        return Log.objects.create(tenant_id=tenant_id, accion=accion, ip_address='10.0.0.1',
+                                  timestamp=datetime(2024, mes, dia, 12, tzinfo=dt_timezone.utc), payload={'mes': mes})
+
+    def nombres(self, tenant_id, **rango):
+        return [ruta.name for ruta in log_archive.ficheros(tenant_id, **rango)]
+
+    def test_ida_y_vuelta(self):
+        resultado = log_archive.archivar(self.ANTES, formato=log_archive.NDJSON)
+        self.assertEqual(resultado, [
+            ('2024-01', {str(self.a): 1, str(self.b): 1}, None),
+            ('2024-02', {str(self.a): 2}, None),
+        ])
+        self.assertEqual(list(Log.objects.values_list('pk', flat=True)), [self.marzo.pk])
+        self.assertEqual(self.nombres(self.a), ['2024-01.1.ndjson.gz', '2024-02.1.ndjson.gz'])
+        self.assertEqual(self.nombres(self.b), ['2024-01.1.ndjson.gz'])
+
+        # Otra ejecución no pisa lo archivado: parte .2 del mes
+        self.log(self.a, 'UPDATE: Rol', 2, 25)
+        self.assertEqual(log_archive.archivar(self.ANTES, formato=log_archive.NDJSON), [('2024-02', {str(self.a): 1}, None)])
+        self.assertEqual(self.nombres(self.a), ['2024-01.1.ndjson.gz', '2024-02.1.ndjson.gz', '2024-02.2.ndjson.gz'])
+
+        # Poda por mes: sólo se abren los ficheros del rango
+        desde = datetime(2024, 2, 10, tzinfo=dt_timezone.utc)
+        self.assertEqual(self.nombres(self.a, desde=desde), ['2024-02.1.ndjson.gz', '2024-02.2.ndjson.gz'])
+        self.assertEqual(self.nombres(self.a, hasta=datetime(2024, 2, 1, tzinfo=dt_timezone.utc)), ['2024-01.1.ndjson.gz'])
+        with mock.patch.object(log_archive, '_leer', wraps=log_archive._leer) as leer:
+            filas = list(log_archive.leer_archivo(self.a, desde=desde, hasta=self.ANTES))
+        self.assertEqual([llamada.args[0].name for llamada in leer.call_args_list], ['2024-02.1.ndjson.gz', '2024-02.2.ndjson.gz'])
+        self.assertEqual([fila['accion'] for fila in filas], ['DELETE: Cargo', 'UPDATE: Rol'])
+        self.assertEqual(filas[0]['payload'], {'mes': 2})
+        self.assertEqual(filas[0]['tenant_id'], str(self.a))
+
+        self.assertEqual([fila['accion'] for fila in log_archive.leer_archivo(self.b)], ['CREATE: Estado'])
+        self.assertEqual([fila['accion'] for fila in log_archive.leer_archivo(self.a, accion='CREATE')], ['CREATE: Cargo'])
+
+
+class AuditoriaTests(TenantTestCase):
+    """ Log con el diff de cada escritura de la API, al confirmarse (api/audit.py). """
+
+    def ultimo_log(self):
+        return Log.objects.order_by('-timestamp').first()
+
+    def test_alta_edicion_y_baja(self):
+        with self.confirmar():
+            pk = self.client.post('/api/cargos/', {'nombre': 'Gerente'}, format='json').data['id']
+        log = self.ultimo_log()
+        self.assertEqual((log.accion, log.tenant_id, log.usuario_id), ('CREATE: Cargo', self.empresa.pk, self.user.pk))
+        self.assertEqual(log.payload, {'id': pk, 'cambios': {'nombre': [None, 'Gerente']}})
+
+        with self.confirmar():
+            self.client.patch(f'/api/cargos/{pk}/', {'nombre': 'Jefe', 'descripcion': None}, format='json')
+        # Sólo lo que cambió: descripcion ya era None
+        self.assertEqual(self.ultimo_log().payload, {'id': pk, 'cambios': {'nombre': ['Gerente', 'Jefe']}})
+
+        with self.confirmar():
+            self.client.delete(f'/api/cargos/{pk}/')
+        log = self.ultimo_log()
+        self.assertEqual(log.accion, 'DELETE: Cargo')
+        self.assertEqual(log.payload, {'id': pk, 'cambios': {'nombre': ['Jefe', None]}})
+
+    def test_cambios_de_un_many_to_many(self):
+        rol = Roles.objects.create(empresa=self.empresa, nombre='Auditor')
+        rol.permisos.set([self.permisos['view_log']])
+        nuevos = sorted([str(self.permisos['view_log'].pk), str(self.permisos['manage_cargo'].pk)])
+        with self.confirmar():
+            self.client.patch(f'/api/roles/{rol.pk}/', {'permisos': nuevos}, format='json')
+        log = self.ultimo_log()
+        self.assertEqual(log.accion, 'UPDATE: Rol')
+        self.assertEqual(log.payload['cambios'], {'permisos': [[str(self.permisos['view_log'].pk)], nuevos]})
+
+    def test_escritura_revertida_no_deja_log(self):
+        with self.confirmar(), self.assertRaises(RuntimeError), transaction.atomic():
+            self.assertEqual(self.client.post('/api/cargos/', {'nombre': 'Gerente'}, format='json').status_code, 201)
+            raise RuntimeError
+        self.assertFalse(Cargo.objects.exists())
+        self.assertFalse(Log.objects.exists())
+
+    def test_lote_con_una_fila_invalida(self):
+        lote = [Log(ip_address='10.0.0.1', accion=f'CREATE: Cargo {n}') for n in range(2)]
+        lote.insert(1, Log(ip_address='10.0.0.1', accion=None)) # NOT NULL
+        # En el hilo de fondo no hay transacción; aquí la de la prueba haría cerrar la conexión
+        with self.assertLogs('api', 'ERROR'), mock.patch.object(connections['logs'], 'close_if_unusable_or_obsolete'):
+            LogBuffer()._write(lote)
+        self.assertEqual(sorted(Log.objects.values_list('accion', flat=True)), ['CREATE: Cargo 0', 'CREATE: Cargo 1'])
+
+
+class ClientIPTests(SimpleTestCase):
+    """ get_client_ip (api/audit.py): X-Forwarded-For sólo desde un proxy confiable. """
+
+    def ip(self, remote_addr, forwarded=None):
+        meta = {'REMOTE_ADDR': remote_addr}
+        if forwarded is not None:
+            meta['HTTP_X_FORWARDED_FOR'] = forwarded
+        return get_client_ip(RequestFactory().get('/', **meta))
+
+    def test_sin_proxies_confiables(self):
+        with self.settings(AUDIT_TRUSTED_PROXIES=[]):
+            self.assertEqual(self.ip('198.51.100.7', '203.0.113.9'), '198.51.100.7')
+
+    @override_settings(AUDIT_TRUSTED_PROXIES=['10.0.0.0/8'])
+    def test_detras_de_un_proxy_confiable(self):
+        self.assertEqual(self.ip('10.0.0.1', '203.0.113.9'), '203.0.113.9')
+        self.assertEqual(self.ip('10.0.0.1', '203.0.113.9, 10.0.0.2'), '203.0.113.9')
+        # El cliente puede inventar lo que va a la izquierda; cuenta el último que no es proxy
+        self.assertEqual(self.ip('10.0.0.1', '1.2.3.4, 203.0.113.9'), '203.0.113.9')
+        # Una conexión directa no puede hacerse pasar por otra IP
+        self.assertEqual(self.ip('198.51.100.7', '203.0.113.9'), '198.51.100.7')
+
+    @override_settings(AUDIT_TRUSTED_PROXIES=['10.0.0.0/8'])
+    def test_valores_invalidos(self):
+        self.assertEqual(self.ip('10.0.0.1', 'no-es-una-ip'), '10.0.0.1')
+        self.assertEqual(self.ip('10.0.0.1', '2001:db8::1 '), '2001:db8::1')
+        self.assertEqual(self.ip('basura'), audit.IP_DESCONOCIDA)
+
+
+class ImportacionTests(TenantTestCase):
+    """ Importación de activos desde CSV o XLSX (api/imports.py). """
+    ENCABEZADO = ['Nombre', 'Código', 'Fecha', 'Valor', 'Vida Útil', 'Categoría', 'Estado', 'Ubicación', 'Proveedor']
+
+    def setUp(self):
+        super().setUp()
+        self.catalogos = crear_catalogos(self.empresa)
+        crear_activo(self.empresa, self.catalogos, 'EXIST-1')
+
+    def csv(self, *filas):
+        return BytesIO('\n'.join(';'.join(fila) for fila in [self.ENCABEZADO, *filas]).encode())
+
+    def fichero_con_errores(self):
+        return self.csv(
+            ['Laptop', 'L-1', '15/01/2024', '1200.50', '5', ' equipos ', 'Nuevo', 'Oficina', ''],
+            ['Silla', 'L-2', '2024-13-01', 'abc', '0', 'Muebles', 'Nuevo', 'Oficina', ''],
+            ['Mesa', 'L-1', '2024-02-01', '100', '3', 'Equipos', 'Nuevo', 'Oficina', 'Proveedor'],
+            [''] * 9,
+            ['Monitor', 'EXIST-1', '2024-02-01', '100', '3', 'Equipos', 'Nuevo', 'Oficina', ''],
+        )
+
+    def test_csv_con_errores_por_fila(self):
+        resultado = imports.importar_activos(self.fichero_con_errores(), imports.CSV, self.empresa.pk)
+        repetido = {'codigo_interno': "Ya existe en la empresa o se repite en el fichero."}
+        self.assertEqual(resultado['errores'], [
+            {'fila': 3, 'errores': {
+                'fecha_adquisicion': "Fecha no válida (AAAA-MM-DD o DD/MM/AAAA).", 'valor_actual': "Número no válido.",
+                'vida_util': "Debe ser un entero mayor que 0.", 'categoria': "No existe 'Muebles'.",
+            }},
+            {'fila': 4, 'errores': repetido},
+            {'fila': 6, 'errores': repetido}, # La línea 5 está en blanco
+        ])
+        self.assertEqual((resultado['filas'], resultado['creados'], resultado['total_errores']), (4, 1, 3))
+        activo = ActivoFijo.objects.get(codigo_interno='L-1')
+        self.assertEqual(
+            (activo.nombre, activo.fecha_adquisicion, activo.valor_actual, activo.categoria_id, activo.proveedor_id),
+            ('Laptop', date(2024, 1, 15), Decimal('1200.50'), self.catalogos['categoria'].pk, None),
+        )
+        self.assertTrue(ActivoPendienteDepreciacion.objects.filter(activo=activo).exists())
+
+    def test_dry_run_no_guarda_nada(self):
+        resultado = imports.importar_activos(
+            self.fichero_con_errores(), imports.CSV, self.empresa.pk, dry_run=True, crear_catalogos=True,
+        )
+        self.assertEqual((resultado['creados'], resultado['total_errores']), (1, 3))
+        self.assertEqual(resultado['catalogos_creados']['categoria'], 1) # 'Muebles', sólo contado
+        self.assertFalse(CategoriaActivo.objects.filter(nombre='Muebles').exists())
+        self.assertEqual(ActivoFijo.objects.count(), 1)
+
+    def test_xlsx_por_la_api(self):
+        libro = Workbook()
+        libro.active.append(self.ENCABEZADO)
+        libro.active.append(['Servidor', 'S-1', datetime(2023, 5, 2), 8500, 10, 'Equipos', 'Nuevo', 'Oficina', 'Proveedor'])
+        contenido = BytesIO()
+        libro.save(contenido)
+        archivo = SimpleUploadedFile('activos.xlsx', contenido.getvalue())
+        with self.confirmar():
+            response = self.client.post('/api/activos-fijos/importar/', {'archivo': archivo}, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['creados'], 1)
+        activo = ActivoFijo.objects.get(codigo_interno='S-1')
+        self.assertEqual((activo.fecha_adquisicion, activo.valor_actual, activo.proveedor_id),
+                         (date(2023, 5, 2), Decimal('8500.00'), self.catalogos['proveedor'].pk))
+        self.assertEqual(Log.objects.get().accion, 'IMPORT: ActivoFijo')
+
+    def test_encabezado_incompleto(self):
+        archivo = SimpleUploadedFile('activos.csv', b'nombre,codigo\nLaptop,L-1\n')
+        response = self.client.post('/api/activos-fijos/importar/', {'archivo': archivo}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Faltan columnas', response.data['archivo'])
+
+    def test_fallo_a_medias_conserva_versiones_y_marcas(self):
+        leer_filas = imports.leer_filas
+
+        def fichero_cortado(fichero, formato):
+            yield from leer_filas(fichero, formato)
+            raise ValueError("Fichero dañado.")
+
+        fichero = self.csv(*[[f'Laptop {n}', f'L-{n}', '2024-01-15', '100', '3', 'Equipos', 'Nuevo', 'Oficina', ''] for n in range(3)])
+        antes = get_data_versions(self.empresa.pk, ActivoFijo)
+        with self.confirmar(), mock.patch.object(imports, 'leer_filas', fichero_cortado), self.assertRaises(ValueError):
+            imports.importar_activos(fichero, imports.CSV, self.empresa.pk, chunk_size=2)
+        # El primer bloque (2 filas) ya estaba guardado; el tercero no llegó a guardarse
+        guardados = set(ActivoFijo.objects.filter(codigo_interno__startswith='L-').values_list('pk', flat=True))
+        self.assertEqual(len(guardados), 2)
+        self.assertEqual(set(ActivoPendienteDepreciacion.objects.values_list('activo_id', flat=True)), guardados)
+        self.assertNotEqual(get_data_versions(self.empresa.pk, ActivoFijo), antes)
+
+
+class BulkTests(TenantTestCase):
+    """ /<recurso>/bulk/ (BulkMixin en api/views.py): todo o nada, en una transacción. """
+
+    def setUp(self):
+        super().setUp()
+        self.catalogos = crear_catalogos(self.empresa)
+        self.activo = crear_activo(self.empresa, self.catalogos, 'A-1')
+
+    def fila(self, codigo, **campos):
+        return {
+            'nombre': f'Activo {codigo}', 'codigo_interno': codigo, 'fecha_adquisicion': '2024-03-01',
+            'valor_actual': '500.00', 'vida_util': 3,
+            **{campo: str(obj.pk) for campo, obj in self.catalogos.items()}, **campos,
+        }
+
+    def test_fk_de_otra_empresa(self):
+        ajena = crear_catalogos(crear_empresa('Globex'), ' Globex')['categoria']
+        response = self.client.post('/api/activos-fijos/bulk/', [
+            self.fila('B-1'), self.fila('B-2', categoria=str(ajena.pk)),
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.data[1]), ['categoria'])
+        self.assertFalse(ActivoFijo.objects.filter(codigo_interno__startswith='B-').exists())
+
+    def test_codigo_repetido(self):
+        with self.confirmar():
+            response = self.client.post('/api/activos-fijos/bulk/', [self.fila('B-1'), self.fila('A-1')], format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(ActivoFijo.objects.filter(codigo_interno='B-1').exists())
+        self.assertFalse(Log.objects.exists())
+
+    def test_borrado_protegido(self):
+        libre = CategoriaActivo.objects.create(empresa=self.empresa, nombre='Sin uso')
+        ids = [str(libre.pk), str(self.catalogos['categoria'].pk)] # La segunda la usa self.activo
+        with self.confirmar():
+            response = self.client.delete('/api/categorias-activos/bulk/', {'ids': ids}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(CategoriaActivo.objects.filter(pk__in=ids).count(), 2)
+
+    def test_version_y_marcas_al_confirmar(self):
+        antes = get_data_versions(self.empresa.pk, ActivoFijo)
+        ActivoPendienteDepreciacion.objects.all().delete()
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.patch('/api/activos-fijos/bulk/', {
+                'ids': [str(self.activo.pk)], 'cambios': {'valor_actual': '900.00'},
+            }, format='json')
+            self.assertEqual(response.data, {'actualizados': 1})
+            # Sin confirmar: ni versión nueva ni marca para el histórico
+            self.assertEqual(get_data_versions(self.empresa.pk, ActivoFijo), antes)
+            self.assertFalse(ActivoPendienteDepreciacion.objects.exists())
+        with self.confirmar():
+            for callback in callbacks:
+                callback()
+        self.assertNotEqual(get_data_versions(self.empresa.pk, ActivoFijo), antes)
+        self.assertEqual(list(ActivoPendienteDepreciacion.objects.values_list('activo_id', flat=True)), [self.activo.pk])
+
+
+class ListasPobladasMixin:
+    """ Registros de todos los recursos con list para las pruebas de los list. """
+
+    def poblar(self, desde, hasta):
+        for n in range(desde, hasta):
+            catalogos = crear_catalogos(self.empresa, f' {n}')
+            # Los impares sin proveedor: FK a NULL en ?expand=
+            crear_activo(self.empresa, catalogos, f'A-{n}', proveedor=None if n % 2 else catalogos['proveedor'])
+            departamento = Departamento.objects.create(empresa=self.empresa, nombre=f'Depto {n}')
+            cargo = Cargo.objects.create(empresa=self.empresa, nombre=f'Cargo {n}')
+            Presupuesto.objects.create(empresa=self.empresa, departamento=departamento, monto=100, fecha=date(2024, 1, n + 1))
+            rol = Roles.objects.create(empresa=self.empresa, nombre=f'Rol {n}')
+            rol.permisos.set(list(self.permisos.values())[:n + 1])
+            empleado = crear_empleado(self.empresa, f'empleado{n}', [rol, self.rol_admin])
+            Empleado.objects.filter(pk=empleado.pk).update(cargo=None if n % 2 else cargo, departamento=departamento)
+            Log.objects.create(ip_address='10.0.0.1', accion=f'UPDATE: Cargo {n}', tenant_id=self.empresa.pk, usuario=self.user)
+
+
+class ConsultasListTests(ListasPobladasMixin, TenantTestCase):
+    """
+    Consultas SQL de los list: no dependen del número de filas (sin N+1), por
+    el camino rápido (api/fastpath.py) y por el de los serializers.
+    """
+    RUTAS = (
+        '/api/activos-fijos/', '/api/activos-fijos/?expand=categoria,estado,ubicacion,proveedor',
+        '/api/empleados/', '/api/empleados/?fields=id,roles_asignados.nombre', '/api/roles/',
+        '/api/presupuestos/', '/api/cargos/', '/api/departamentos/', '/api/categorias-activos/',
+        '/api/estados/', '/api/ubicaciones/', '/api/proveedores/', '/api/permisos/', '/api/logs/',
+        '/api/activos-fijos/?page_size=50', '/api/empleados/?page_size=50',
+    )
+
+    def consultas(self):
+        """ {ruta: consultas en 'default' + 'logs'} en frío, sin nada en caché. """
+        resultado = {}
+        for ruta in self.RUTAS:
+            shared_cache().clear()
+            with CaptureQueriesContext(connections['default']) as default, CaptureQueriesContext(connections['logs']) as logs:
+                response = self.client.get(ruta)
+            self.assertEqual(response.status_code, 200, ruta)
+            resultado[ruta] = len(default) + len(logs)
+        return resultado
+
+    def comprobar_sin_consultas_por_fila(self):
+        self.poblar(0, 2)
+        pocas = self.consultas()
+        self.poblar(2, 8)
+        self.assertEqual(self.consultas(), pocas)
+
+    @override_settings(API_FAST_LIST=True)
+    def test_camino_rapido(self):
+        self.comprobar_sin_consultas_por_fila()
+
+    @override_settings(API_FAST_LIST=False)
+    def test_serializers(self):
+        self.comprobar_sin_consultas_por_fila()
+
+    def test_empleados_con_roles_y_permisos(self):
+        self.poblar(0, 5)
+        shared_cache().clear()
+        # El usuario del token, los empleados con usuario, cargo y departamento en un
+        # JOIN, los roles de esos empleados y los permisos de esos roles
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/empleados/', {'page_size': 50})
+        self.assertEqual(len(response.data['results']), 6)
+        # Revalidación con el ETag: ni el usuario (en caché) ni el list
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/empleados/', {'page_size': 50}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+
+@skipUnless(connections['default'].vendor == 'postgresql', 'Lectura concurrente durante una transacción abierta')
+@override_settings(CACHES=TEST_CACHES, LOG_BUFFER_ENABLED=False)
+class VersionAlConfirmarTests(TransactionTestCase):
+    """
+    Las versiones de datos suben al confirmarse la escritura (api/cache.py): una
+    petición concurrente que lee antes de la confirmación no deja en caché, bajo
+    la versión nueva, el catálogo que todavía incluye lo borrado.
+    """
+    databases = {'default', 'logs'}
+
+    def setUp(self):
+        shared_cache().clear()
+        self.empresa = crear_empresa('Concurrente')
+        rol = Roles.objects.create(empresa=self.empresa, nombre='Admin')
+        self.client = TenantTestCase.cliente(crear_empleado(self.empresa, 'admin', [rol]).usuario)
+        self.estado = Estado.objects.create(empresa=self.empresa, nombre='De Baja')
+
+    def listar_en_otro_hilo(self):
+        """ Lista el catálogo con la conexión de otro hilo (no ve lo que no se confirmó). """
+        nombres = []
+
+        def listar():
+            try:
+                nombres.extend(fila['nombre'] for fila in self.client.get('/api/estados/').data)
+            finally:
+                connections.close_all()
+
+        hilo = threading.Thread(target=listar)
+        hilo.start()
+        hilo.join()
+        return nombres
+
+    def test_borrado_dentro_de_un_atomic(self):
+        with transaction.atomic():
+            self.estado.delete()
+            # Otra petición, a mitad de la transacción, aún ve el registro y lo cachea
+            self.assertEqual(self.listar_en_otro_hilo(), ['De Baja'])
+        self.assertEqual(self.client.get('/api/estados/').data, [])
+        self.assertEqual(self.listar_en_otro_hilo(), [])
+
+    def test_transaccion_revertida_no_invalida(self):
+        version = get_data_versions(self.empresa.pk, Estado)
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.estado.delete()
+            raise RuntimeError
+        self.assertEqual(get_data_versions(self.empresa.pk, Estado), version)
+
+
+class EscrituraCondicionalTests(TenantTestCase):
+    """ If-Match en PUT/PATCH/DELETE: con un ETag viejo, 412 y nada cambia. """
+
+    def setUp(self):
+        super().setUp()
+        self.cargo = Cargo.objects.create(empresa=self.empresa, nombre='Gerente')
+        self.url = f'/api/cargos/{self.cargo.pk}/'
+
+    def etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def test_etag_vigente(self):
+        with self.confirmar():
+            response = self.client.patch(self.url, {'nombre': 'Jefe'}, format='json', HTTP_IF_MATCH=self.etag())
+        self.assertEqual(response.status_code, 200)
+        self.cargo.refresh_from_db()
+        self.assertEqual(self.cargo.nombre, 'Jefe')
+        with self.confirmar():
+            self.assertEqual(self.client.delete(self.url, HTTP_IF_MATCH=self.etag()).status_code, 204)
+        self.assertFalse(Cargo.objects.filter(pk=self.cargo.pk).exists())
+
+    def test_etag_viejo(self):
+        viejo = self.etag()
+        with self.confirmar():
+            Cargo.objects.create(empresa=self.empresa, nombre='Contador') # Otro cambio en la tabla
+        for metodo, datos in (('patch', {'nombre': 'Jefe'}), ('put', {'nombre': 'Jefe'}), ('delete', None)):
+            with self.subTest(metodo=metodo), self.assertLogs('django.request', 'WARNING'):
+                response = getattr(self.client, metodo)(self.url, datos, format='json', HTTP_IF_MATCH=viejo)
+                self.assertEqual(response.status_code, 412)
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.client.patch(self.url, {'nombre': 'Jefe'}, format='json', HTTP_IF_MATCH='"otro"').status_code, 412)
+        self.cargo.refresh_from_db()
+        self.assertEqual(self.cargo.nombre, 'Gerente')
+        self.assertFalse(Log.objects.exists()) # Ni siquiera se auditó
+
+
+class UsuarioCacheTests(TenantTestCase):
+    """ TenantJWTAuthentication guarda en caché sólo USER_FIELDS del User, nunca la contraseña. """
+
+    def setUp(self):
+        super().setUp()
+        self.token = AccessToken(str(MyTokenObtainPairSerializer.get_token(self.user).access_token))
+        self.auth = TenantJWTAuthentication()
+
+    def en_cache(self):
+        return shared_cache().get(f'user-campos:{self.user.pk}:{get_version(USER_SCOPE, self.user.pk)}')
+
+    def test_sin_hash_de_la_contrasena(self):
+        self.assertEqual(self.auth.get_user(self.token).pk, self.user.pk)
+        datos = self.en_cache()
+        self.assertEqual(set(datos) - {'revocacion'}, set(USER_FIELDS))
+        self.assertNotIn(self.user.password.encode(), pickle.dumps(datos))
+
+        with self.assertNumQueries(0):
+            user = self.auth.get_user(self.token)
+        self.assertEqual((user.pk, user.username, user.is_active, user.is_staff), (self.user.pk, 'admin', True, False))
+        self.assertEqual(user.password, '')
+        self.assertEqual(self.client.get('/api/cargos/').status_code, 200)
+
+    def test_marca_de_revocacion(self):
+        # simplejwt recarga api_settings como un objeto nuevo: override_settings no llega a los importados
+        with mock.patch.object(api_settings, 'CHECK_REVOKE_TOKEN', True):
+            token = AccessToken(str(MyTokenObtainPairSerializer.get_token(self.user).access_token))
+            self.auth.get_user(token)
+            datos = self.en_cache()
+            self.assertIn('revocacion', datos)
+            self.assertNotIn(self.user.password.encode(), pickle.dumps(datos))
+            with self.assertNumQueries(0):
+                self.assertEqual(self.auth.get_user(token).pk, self.user.pk)
+            # Un token con otra marca (contraseña cambiada) no se acepta desde la caché
+            token[api_settings.REVOKE_TOKEN_CLAIM] = 'otra'
+            with self.assertRaises(AuthenticationFailed):
+                self.auth.get_user(token)
+
+    def test_usuario_desactivado(self):
+        self.auth.get_user(self.token)
+        with self.confirmar():
+            self.user.is_active = False
+            self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.get_user(self.token)
+
+
+class BootstrapTests(TenantTestCase):
+    """ GET /api/bootstrap/: ETag por sección y de la respuesta entera. """
+
+    def test_respuesta_completa_parcial_y_304(self):
+        completa = self.client.get('/api/bootstrap/')
+        self.assertEqual(completa.status_code, 200)
+        self.assertTrue(all('data' in seccion for seccion in completa.data.values()))
+        self.assertIn('no-cache', completa['Cache-Control'])
+
+        estados = completa.data['estados']['etag']
+        parcial = self.client.get('/api/bootstrap/', HTTP_IF_NONE_MATCH=estados)
+        self.assertEqual(parcial.status_code, 200)
+        self.assertNotIn('data', parcial.data['estados'])
+        self.assertIn('data', parcial.data['cargos'])
+        # Sin el ETag completo: revalidar con él no puede devolver esta respuesta a medias
+        self.assertFalse(parcial.has_header('ETag'))
+        self.assertIn('no-store', parcial['Cache-Control'])
+
+        self.assertEqual(self.client.get('/api/bootstrap/', HTTP_IF_NONE_MATCH=completa['ETag']).status_code, 304)
+        todas = ', '.join(seccion['etag'] for seccion in completa.data.values())
+        self.assertEqual(self.client.get('/api/bootstrap/', HTTP_IF_NONE_MATCH=todas).status_code, 304)
+
+    def test_seccion_cambiada(self):
+        completa = self.client.get('/api/bootstrap/', {'sections': 'estados,cargos'})
+        with self.confirmar():
+            Estado.objects.create(empresa=self.empresa, nombre='Nuevo')
+        response = self.client.get('/api/bootstrap/', {'sections': 'estados,cargos'}, HTTP_IF_NONE_MATCH=completa['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([fila['nombre'] for fila in response.data['estados']['data']], ['Nuevo'])
+        self.assertNotEqual(response['ETag'], completa['ETag'])
+
+
+class CaminoRapidoTests(ListasPobladasMixin, TenantTestCase):
+    """
+    El list de cada ViewSet con fast_list responde byte a byte lo mismo por el
+    camino rápido (api/fastpath.py) que por el serializer, también con ?fields=
+    y ?expand= (api/sparse.py).
+    """
+
+    def variantes(self, viewset):
+        """ Parámetros a comparar, sacados de los campos del serializer del ViewSet. """
+        campos = {nombre: field for nombre, field in viewset.serializer_class().fields.items() if not field.write_only}
+        fks = [
+            nombre for nombre, field in campos.items()
+            if isinstance(field, PrimaryKeyRelatedField) and len(field.source_attrs) == 1
+        ]
+        anidados = [nombre for nombre, field in campos.items() if isinstance(field, BaseSerializer)]
+        # Dos campos simples más el último de cada anidado ('roles_asignados.nombre')
+        seleccion = [nombre for nombre in campos if nombre not in anidados][:2] + [
+            f'{nombre}.{list(getattr(campos[nombre], "child", campos[nombre]).fields)[-1]}' for nombre in anidados
+        ]
+        variantes = [{}, {'page_size': 50}, {'fields': ','.join(seleccion)}]
+        if fks:
+            # La última FK: en activos-fijos, proveedor (a NULL en la mitad de las filas)
+            variantes += [{'expand': ','.join(fks)}, {'expand': fks[-1], 'fields': ','.join(seleccion + [fks[-1]])}]
+        return variantes
+
+    def get(self, ruta, params, fast_list):
+        shared_cache().clear()
+        with self.settings(API_FAST_LIST=fast_list):
+            response = self.client.get(ruta, params)
+        self.assertEqual(response.status_code, 200, (ruta, params))
+        return response.content
+
+    def test_mismas_respuestas(self):
+        self.poblar(0, 4)
+        viewsets = [(prefix, viewset) for prefix, viewset, _ in router.registry if getattr(viewset, 'fast_list', False)]
+        self.assertGreaterEqual(len(viewsets), 10)
+        for prefix, viewset in viewsets:
+            for params in self.variantes(viewset):
+                with self.subTest(prefix, **params):
+                    ruta = f'/api/{prefix}/'
+                    self.assertEqual(self.get(ruta, params, True), self.get(ruta, params, False))
+
+    def test_el_plan_cubre_los_viewsets(self):
+        # Si un serializer deja de ser compilable, el test anterior pasaría sin probar nada
+        for _, viewset, _ in router.registry:
+            if getattr(viewset, 'fast_list', False):
+                self.assertIsNotNone(fastpath.compilar(viewset.serializer_class), viewset.__name__)
+
+
+class ExpandETagTests(TenantTestCase):
+    """ Con ?expand= el ETag del list también depende de la versión del modelo expandido. """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.catalogos = crear_catalogos(cls.empresa)
+        crear_activo(cls.empresa, cls.catalogos, 'A-1')
+
+    def test_renombrar_expandido_cambia_el_etag(self):
+        antes = self.client.get('/api/activos-fijos/', {'expand': 'categoria'})
+        self.assertEqual(antes.status_code, 200)
+        with self.confirmar():
+            categoria = self.catalogos['categoria']
+            categoria.nombre = 'Renombrada'
+            categoria.save()
+        response = self.client.get('/api/activos-fijos/', {'expand': 'categoria'}, HTTP_IF_NONE_MATCH=antes['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['categoria']['nombre'], 'Renombrada')
+        self.assertNotEqual(response['ETag'], antes['ETag'])
+
+    def test_sin_expand_no_depende_del_relacionado(self):
+        antes = self.client.get('/api/activos-fijos/')
+        with self.confirmar():
+            Ubicacion.objects.filter(pk=self.catalogos['ubicacion'].pk).update(nombre='Otra')
+            self.catalogos['categoria'].save()
+        response = self.client.get('/api/activos-fijos/', HTTP_IF_NONE_MATCH=antes['ETag'])
+        self.assertEqual(response.status_code, 304)
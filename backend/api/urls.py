@@ -3,10 +3,11 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
 from .views import (
-    ReporteActivosPreview, ReporteActivosExport, CargoViewSet, DepartamentoViewSet,
+    ReporteActivosPreview, ReporteActivosExport, ReporteActivosResumen, DepreciacionView, DepreciacionHistoricoView, CargoViewSet, DepartamentoViewSet,
     EmpleadoViewSet, ActivoFijoViewSet, CategoriaActivoViewSet, PresupuestoViewSet, 
     RolesViewSet, LogViewSet, EstadoViewSet, UbicacionViewSet, ProveedorViewSet, PermisosViewSet,
-    RegisterEmpresaView, MyTokenObtainPairView, UserPermissionsView
+    RegisterEmpresaView, MyTokenObtainPairView, UserPermissionsView, BootstrapView, MetricsView,
+    TrabajoExportacionViewSet
 )
 from rest_framework_simplejwt.views import TokenRefreshView
 
@@ -23,13 +24,19 @@ router.register(r'estados', EstadoViewSet)
 router.register(r'ubicaciones', UbicacionViewSet)
 router.register(r'proveedores', ProveedorViewSet)
 router.register(r'permisos', PermisosViewSet)
+router.register(r'reportes/exportaciones', TrabajoExportacionViewSet) # Exportaciones en segundo plano
 
 urlpatterns = [
     path('reportes/activos-preview/', ReporteActivosPreview.as_view(), name='reporte_activos_preview'),
     path('reportes/activos-export/', ReporteActivosExport.as_view(), name='reporte_activos_export'),       
+    path('reportes/activos-resumen/', ReporteActivosResumen.as_view(), name='reporte_activos_resumen'),
+    path('depreciacion/', DepreciacionView.as_view(), name='depreciacion'),
+    path('depreciacion/historico/', DepreciacionHistoricoView.as_view(), name='depreciacion_historico'),
     path('register/', RegisterEmpresaView.as_view(), name='register_empresa'),
     path('', include(router.urls)),
     path('token/', MyTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('my-permissions/', UserPermissionsView.as_view(), name='my_permissions'),
+    path('bootstrap/', BootstrapView.as_view(), name='bootstrap'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
 ]
\ No newline at end of file
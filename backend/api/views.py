@@ -1,22 +1,50 @@
 # api/views.py
 from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
 from rest_framework import permissions
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
-from .permissions import HasPermission, check_permission
+from rest_framework.exceptions import APIException, PermissionDenied, ValidationError
+from .permissions import PERMISSIONS_SCOPE, HasPermission, HasMetricsToken, check_permission, get_user_permissions
+from . import audit, bootstrap, fastpath, metrics, sparse
+from .instrumentation import log_event, logger, timed
+from .log_archive import leer_archivo
+from .bulk import preload_related, seleccion
+from .catalogs import catalogo
+from .cache import GLOBAL, bump_data_version, data_scope, get_versions
+from .log_buffer import log_buffer
+from .pagination import RequiredKeysetPagination
+import hashlib
 import io
-from django.http import HttpResponse
+import ipaddress
+import json
+import os
+import re
+import uuid
+from datetime import date, datetime, timedelta
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import parse_etags, quote_etag
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Count, ProtectedError, Q, Sum
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.units import inch
 
-# Importaciones de OpenPyXL (Excel)
-from openpyxl import Workbook
-from openpyxl.styles import Font
+# Exportaciones (PDF con ReportLab, Excel con OpenPyXL write-only, CSV)
+from .exports import EXPORT_FORMATS, export_key
+from .imports import formato_de, importar_activos
+from .depreciation import LINEAL, METODOS, Cartera
+from .snapshots import marcar_pendientes
+from .filtros import filtrar_activos
+from .reports import (
+    DEPRECIACION_COLUMNS, EXPORT_COLUMNS, RESUMEN_DIMENSIONES, XLSX_CONTENT_TYPE, iter_rows,
+    resumir_activos, stream_csv, totales_activos, write_pdf, xlsx_tempfile,
+)
 from .models import *
 from .serializers import *
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView
 
 # --- VISTA DE LOGIN PERSONALIZADA ---
@@ -38,43 +66,175 @@ class MyTokenObtainPairView(TokenObtainPairView):
 #        empleado = self.request.user.empleado
 #        serializer.save(empresa=empleado.empresa)
 
-class BaseTenantViewSet(viewsets.ModelViewSet):
+class AuditMixin:
+    """
+    Registra en la bitácora cada creación, edición y borrado con el diff de
+    campos (api/audit.py); el Log se encola en memoria, sin esperar a la BD.
+    """
+    audit_name = None # Nombre en 'accion' (p. ej. 'UPDATE: Rol'); por defecto el del modelo
+
+    def audit_create(self, serializer):
+        instance = serializer.instance
+        despues = audit.snapshot(instance, audit.m2m_fields(instance, serializer.validated_data))
+        audit.auditar(self.request, audit.CREATE, instance, despues=despues, nombre=self.audit_name)
+
+    def perform_create(self, serializer):
+        serializer.save()
+        self.audit_create(serializer)
+
+    def perform_update(self, serializer):
+        m2m = audit.m2m_fields(serializer.instance, serializer.validated_data)
+        antes = audit.snapshot(serializer.instance, m2m)
+        serializer.save()
+        despues = audit.snapshot(serializer.instance, m2m)
+        audit.auditar(self.request, audit.UPDATE, serializer.instance, antes, despues, nombre=self.audit_name)
+
+    def perform_destroy(self, instance):
+        pk, antes = instance.pk, audit.snapshot(instance)
+        instance.delete()
+        audit.auditar(self.request, audit.DELETE, instance, antes=antes, nombre=self.audit_name, pk=pk)
+
+
+class NotModified(APIException):
+    status_code = status.HTTP_304_NOT_MODIFIED
+    default_detail = 'Not modified.'
+    default_code = 'not_modified'
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'El recurso cambió desde que se leyó (If-Match no coincide).'
+    default_code = 'precondition_failed'
+
+
+def etag_matches(header, etag, weak=False):
+    """ Si 'etag' está en la cabecera If-Match / If-None-Match (weak: ignora 'W/'). """
+    etags = parse_etags(header or '')
+    if '*' in etags:
+        return True
+    if weak:
+        etags = [tag.removeprefix('W/') for tag in etags]
+    return etag in etags
+
+
+class BaseTenantViewSet(AuditMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
+    # Stable ordering for opt-in keyset pagination (?page_size= / ?cursor=).
+    # Must end in a unique field and match an (empresa, ...) index.
+    keyset_ordering = ('nombre', 'id')
+    # Serve list from .values() through a compiled plan of the serializer
+    # (api/fastpath.py); falls back to the serializer when it can't be compiled
+    fast_list = False
+    # Models whose per-tenant data version (api/cache.py) goes into the ETag of
+    # list/retrieve: None = the queryset's model, () = no ETag (unversioned data)
+    etag_models = None
+
+    def etag_scopes(self, empresa_id):
+        models = (self.queryset.model,) if self.etag_models is None else tuple(self.etag_models)
+        if models and getattr(self, 'sparse', None) and self.sparse[1]:
+            # ?expand= puts the related rows' nombre in the body: their versions count too
+            expanded = sparse.modelos_expandidos(super().get_serializer(), self.sparse[1])
+            models += tuple(model for model in expanded if model not in models)
+        return [(data_scope(model), empresa_id) for model in models]
+
+    def get_etag(self, request):
+        """
+        Strong ETag from the data versions (one shared-cache read), the path,
+        the query string and the media type. Never hashes the rendered body.
+        """
+        empresa_id = request.tenant.empresa_id
+        scopes = self.etag_scopes(empresa_id) if empresa_id is not None else []
+        if not scopes:
+            return None
+        parts = [*get_versions(*scopes), request.path, request.META.get('QUERY_STRING', ''), request.accepted_media_type]
+        return quote_etag(hashlib.sha1('|'.join(parts).encode()).hexdigest())
+
+    def initial(self, request, *args, **kwargs):
+        # Runs after authentication and permissions, before any queryset work
+        super().initial(request, *args, **kwargs)
+        # (fields, expand) from ?fields= / ?expand= on reads (api/sparse.py)
+        self.sparse = sparse.parse(request.query_params) if self.action in ('list', 'retrieve') else None
+        self.etag = None
+        if self.action in ('list', 'retrieve'):
+            self.etag = self.get_etag(request)
+            if self.etag and etag_matches(request.META.get('HTTP_IF_NONE_MATCH'), self.etag, weak=True):
+                raise NotModified()
+        elif self.action in ('update', 'partial_update', 'destroy') and 'HTTP_IF_MATCH' in request.META:
+            # Versions are per model: any change in the tenant's table fails the precondition
+            etag = self.get_etag(request)
+            if etag and not etag_matches(request.META['HTTP_IF_MATCH'], etag):
+                raise PreconditionFailed()
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return Response(status=exc.status_code)
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        etag = getattr(self, 'etag', None)
+        if self.action in ('update', 'partial_update') and response.status_code == status.HTTP_200_OK:
+            # The write already bumped the version: hand out the new ETag
+            etag = self.get_etag(request)
+        if etag and response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+            # Browsers keep the body and revalidate with If-None-Match on every use
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
 
     def get_queryset(self):
-        try:
-            # Add print statements to debug
-            print(f"DEBUG: get_queryset called by user: {self.request.user}")
-            empleado = self.request.user.empleado
-            print(f"DEBUG: Found empleado: {empleado}, for empresa: {empleado.empresa}")
-            # Ensure 'self.queryset' is correctly defined in the inheriting ViewSet
-            # For EmpleadoViewSet, self.queryset is Empleado.objects.all()
-            queryset = self.queryset.filter(empresa=empleado.empresa)
-            print(f"DEBUG: Filtered queryset count: {queryset.count()}")
-            return queryset
-        except Empleado.DoesNotExist:
-            print(f"DEBUG: Empleado.DoesNotExist for user: {self.request.user}")
-            # This should only happen if the logged-in user isn't linked to an Empleado
-            # (like the SuperAdmin, maybe?)
-            # Or if the OneToOneField link is broken.
+        # request.tenant is resolved once per request from the JWT (no DB hit)
+        empresa_id = self.request.tenant.empresa_id
+        if empresa_id is None:
+            # Users not linked to an Empleado (like the SuperAdmin) see nothing
+            log_event('tenant.sin_empresa', user=self.request.user.pk, view=type(self).__name__)
             return self.queryset.none()
-        except Exception as e: # Catch any other unexpected error
-             print(f"ERROR in get_queryset: {e}")
-             return self.queryset.none()        
+        # Ensure 'self.queryset' is correctly defined in the inheriting ViewSet
+        # For EmpleadoViewSet, self.queryset is Empleado.objects.all()
+        queryset = self.queryset.filter(empresa_id=empresa_id)
+        if getattr(self, 'sparse', None):
+            # ?fields= / ?expand=: load only what the trimmed serializer reads
+            queryset = sparse.ajustar_queryset(queryset, self.get_serializer(), self.ordering_columns())
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        if getattr(self, 'sparse', None):
+            sparse.aplicar(serializer, self.sparse)
+        return serializer
 
     def perform_create(self, serializer):
-        try:
-            empleado = self.request.user.empleado
-            print(f"DEBUG: perform_create assigning empresa: {empleado.empresa}")
-            # This should automatically save the correct empresa
-            serializer.save(empresa=empleado.empresa) 
-            print(f"DEBUG: perform_create successful for user: {serializer.instance.usuario.username}")
-        except Empleado.DoesNotExist:
-             print(f"ERROR in perform_create: Empleado.DoesNotExist for user: {self.request.user}")
-             # Handle error - maybe raise validation error?
-        except Exception as e:
-             print(f"ERROR in perform_create: {e}")
-             # Handle error
+        empresa_id = self.request.tenant.empresa_id
+        if empresa_id is None:
+            raise PermissionDenied("El usuario no pertenece a ninguna empresa.")
+        serializer.save(empresa_id=empresa_id)
+        log_event('tenant.create', model=type(serializer.instance).__name__, id=serializer.instance.pk, empresa=empresa_id)
+        self.audit_create(serializer)
+
+    def list(self, request, *args, **kwargs):
+        with timed('serializer'):
+            plan = self.get_fast_plan()
+            if plan is None:
+                return super().list(request, *args, **kwargs)
+            # Fast path (api/fastpath.py): .values() rows turned into the serializer's output
+            queryset = plan.valores(self.filter_queryset(self.get_queryset()), *self.ordering_columns())
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                return self.get_paginated_response(plan.convertir(page))
+            return Response(plan.convertir(list(queryset)))
+
+    def retrieve(self, request, *args, **kwargs):
+        with timed('serializer'):
+            return super().retrieve(request, *args, **kwargs)
+
+    def get_fast_plan(self):
+        if not self.fast_list or not getattr(settings, 'API_FAST_LIST', True):
+            return None
+        return fastpath.compilar(self.get_serializer_class(), self.sparse, self.get_serializer)
+
+    def ordering_columns(self):
+        # The keyset cursor is read from the row dicts
+        return [field.lstrip('-') for field in self.keyset_ordering]
 
     def check_permissions(self, request):
         """
@@ -94,15 +254,178 @@ class BaseTenantViewSet(viewsets.ModelViewSet):
                      request, message=f'Permission "{required_permission}" required for this action.'
                  )
 
+class CatalogCacheMixin:
+    """
+    Catálogos de la empresa (api/catalogs.py): el list y el retrieve sin
+    parámetros se sirven de la caché, sin consultas en caliente. Con ?page_size=,
+    ?cursor= o cualquier otro parámetro se resuelven contra la BD como siempre.
+    """
+
+    def list(self, request, *args, **kwargs):
+        empresa_id = request.tenant.empresa_id
+        if request.query_params or empresa_id is None:
+            return super().list(request, *args, **kwargs)
+        return Response(catalogo(self.queryset.model, empresa_id))
+
+    def retrieve(self, request, *args, **kwargs):
+        empresa_id = request.tenant.empresa_id
+        if request.query_params:
+            return super().retrieve(request, *args, **kwargs)
+        try:
+            pk = str(uuid.UUID(str(kwargs[self.lookup_url_kwarg or self.lookup_field])))
+        except ValueError:
+            pk = None
+        if empresa_id is not None and pk is not None:
+            for fila in catalogo(self.queryset.model, empresa_id):
+                if fila['id'] == pk:
+                    return Response(fila)
+        # No está (o no es un UUID): la BD da el 404 de siempre
+        return super().retrieve(request, *args, **kwargs)
+
+
+class BulkMixin:
+    """
+    Operaciones en bloque en /<recurso>/bulk/, en una sola transacción y con un
+    solo chequeo de permisos (el del ViewSet):
+    - POST   [{...}, ...]                          -> bulk_create
+    - PATCH  [{id, campo...}, ...]                 -> bulk_update, valores por fila
+    - PATCH  {ids|filtro, cambios: {campo: valor}} -> QuerySet.update, mismo valor
+    - DELETE {ids|filtro}
+    Las FKs se validan contra la empresa con una consulta por modelo (api/bulk.py).
+    Cada fila afectada deja su entrada en la bitácora, como las rutas de uno en uno.
+    """
+
+    @property
+    def bulk_max_items(self):
+        return getattr(settings, 'BULK_MAX_ITEMS', 1000)
+
+    @action(detail=False, methods=['post', 'patch', 'delete'])
+    def bulk(self, request):
+        empresa_id = request.tenant.empresa_id
+        if empresa_id is None:
+            raise PermissionDenied("El usuario no pertenece a ninguna empresa.")
+        handler = {'POST': self._bulk_create, 'PATCH': self._bulk_update, 'DELETE': self._bulk_destroy}[request.method]
+        try:
+            with transaction.atomic():
+                return handler(request.data, empresa_id)
+        except ProtectedError: # Subclase de IntegrityError: va primero
+            return Response({'detail': "Algunos registros están en uso por otros y no se pueden eliminar."},
+                            status=status.HTTP_409_CONFLICT)
+        except IntegrityError:
+            return Response({'detail': "Conflicto con registros existentes (p. ej. un código repetido)."},
+                            status=status.HTTP_409_CONFLICT)
+
+    def after_bulk_write(self, ids):
+        """
+        bulk_create/update no disparan señales: lo que harían post_save va aquí.
+        Corre al confirmarse la transacción del bloque (ver _escrito).
+        """
+        bump_data_version(self.queryset.model, self.request.tenant.empresa_id)
+
+    def _escrito(self, ids):
+        # Como las señales: dentro del atomic, un refresco del histórico podría
+        # consumir la marca antes de ver los datos nuevos
+        transaction.on_commit(lambda: self.after_bulk_write(ids))
+
+    def _lista(self, data):
+        if not isinstance(data, list) or not data:
+            raise ValidationError({'detail': "Se espera una lista de registros."})
+        if len(data) > self.bulk_max_items:
+            raise ValidationError({'detail': f"Máximo {self.bulk_max_items} registros por petición."})
+        return data
+
+    def _auditar(self, operacion, pk, antes=None, despues=None):
+        model = self.queryset.model
+        audit.auditar(self.request, operacion, model(pk=pk), antes, despues, nombre=self.audit_name)
+
+    def _bulk_create(self, data, empresa_id):
+        filas = self._lista(data)
+        serializer = self.get_serializer(data=filas, many=True)
+        preload_related(serializer.child, filas, empresa_id)
+        serializer.is_valid(raise_exception=True)
+        model = self.queryset.model
+        objs = model.objects.bulk_create([model(empresa_id=empresa_id, **datos) for datos in serializer.validated_data])
+        self._escrito([obj.pk for obj in objs])
+        for obj in objs:
+            self._auditar(audit.CREATE, obj.pk, despues=audit.snapshot(obj))
+        return Response(self.get_serializer(objs, many=True).data, status=status.HTTP_201_CREATED)
+
+    def _bulk_update(self, data, empresa_id):
+        if isinstance(data, dict):
+            return self._bulk_update_seleccion(data, empresa_id)
+        filas = self._lista(data)
+        ids = [fila.get('id') if isinstance(fila, dict) else None for fila in filas]
+        if not all(ids) or len(set(map(str, ids))) != len(ids):
+            raise ValidationError({'id': "Cada registro necesita un 'id' distinto."})
+        instancias = {str(obj.pk): obj for obj in seleccion(self.get_queryset(), {'ids': ids}, self.bulk_max_items).select_for_update()}
+        faltan = [pk for pk in ids if str(pk) not in instancias]
+        if faltan:
+            raise ValidationError({'id': f"No existen en la empresa: {', '.join(map(str, faltan[:20]))}."})
+
+        serializer = self.get_serializer(data=filas, many=True, partial=True)
+        preload_related(serializer.child, filas, empresa_id)
+        serializer.is_valid(raise_exception=True)
+        campos, objs, cambios = set(), [], []
+        for pk, datos in zip(ids, serializer.validated_data):
+            obj = instancias[str(pk)]
+            antes = audit.snapshot(obj)
+            for campo, valor in datos.items():
+                setattr(obj, campo, valor)
+            campos.update(datos)
+            objs.append(obj)
+            cambios.append((obj.pk, antes, audit.snapshot(obj)))
+        if campos:
+            self.queryset.model.objects.bulk_update(objs, list(campos), batch_size=500)
+        self._escrito([obj.pk for obj in objs])
+        for pk, antes, despues in cambios:
+            self._auditar(audit.UPDATE, pk, antes, despues)
+        return Response({'actualizados': len(objs)})
+
+    def _bulk_update_seleccion(self, data, empresa_id):
+        cambios = data.get('cambios')
+        if not isinstance(cambios, dict) or not cambios:
+            raise ValidationError({'cambios': "Debe ser un objeto {campo: valor} no vacío."})
+        serializer = self.get_serializer(data=cambios, partial=True)
+        preload_related(serializer, [cambios], empresa_id)
+        serializer.is_valid(raise_exception=True)
+        model = self.queryset.model
+        nuevos = {model._meta.get_field(campo).attname: getattr(valor, 'pk', valor)
+                  for campo, valor in serializer.validated_data.items()}
+        filas = list(seleccion(self.get_queryset(), data, self.bulk_max_items)
+                     .select_for_update().values('pk', *nuevos)[:self.bulk_max_items + 1])
+        if len(filas) > self.bulk_max_items:
+            raise ValidationError({'filtro': f"Afecta a más de {self.bulk_max_items} registros."})
+        ids = [fila.pop('pk') for fila in filas]
+        model.objects.filter(pk__in=ids).update(**serializer.validated_data)
+        self._escrito(ids)
+        for pk, antes in zip(ids, filas):
+            self._auditar(audit.UPDATE, pk, antes, {**antes, **nuevos})
+        return Response({'actualizados': len(ids)})
+
+    def _bulk_destroy(self, data, empresa_id):
+        if not isinstance(data, dict):
+            raise ValidationError({'detail': "Se espera {ids: [...]} o {filtro: {...}}."})
+        objs = list(seleccion(self.get_queryset(), data, self.bulk_max_items)[:self.bulk_max_items + 1])
+        if len(objs) > self.bulk_max_items:
+            raise ValidationError({'filtro': f"Afecta a más de {self.bulk_max_items} registros."})
+        # delete() del QuerySet sí dispara post_delete por fila (versiones de datos)
+        self.queryset.model.objects.filter(pk__in=[obj.pk for obj in objs]).delete()
+        for obj in objs:
+            self._auditar(audit.DELETE, obj.pk, antes=audit.snapshot(obj))
+        return Response({'eliminados': len(objs)})
+
+
 # --- VIEWSETS DE LA APLICACIÓN ---
-class CargoViewSet(BaseTenantViewSet):
+class CargoViewSet(CatalogCacheMixin, BaseTenantViewSet):
     queryset = Cargo.objects.all()
     serializer_class = CargoSerializer
+    fast_list = True
     required_manage_permission = 'manage_cargo'
 
-class DepartamentoViewSet(BaseTenantViewSet):
+class DepartamentoViewSet(CatalogCacheMixin, BaseTenantViewSet):
     queryset = Departamento.objects.all()
     serializer_class = DepartamentoSerializer
+    fast_list = True
     required_manage_permission = 'manage_departamento'
 
 #class EmpleadoViewSet(BaseTenantViewSet):
@@ -129,9 +452,16 @@ class DepartamentoViewSet(BaseTenantViewSet):
 #        )
 
 class EmpleadoViewSet(BaseTenantViewSet):
-    queryset = Empleado.objects.all().select_related('usuario', 'cargo', 'departamento').prefetch_related('roles') # Optimization
+    queryset = Empleado.objects.all().select_related('usuario', 'cargo', 'departamento').prefetch_related('roles__permisos') # roles_asignados serializa los permisos de cada rol
     serializer_class = EmpleadoSerializer
+    fast_list = True
     required_manage_permission = 'manage_empleado'
+    keyset_ordering = ('apellido_p', 'id')
+    etag_models = (Empleado, Cargo, Departamento, Roles)
+
+    def etag_scopes(self, empresa_id):
+        # roles_asignados: roles and permisos (M2M) are versioned by the permission cache
+        return super().etag_scopes(empresa_id) + [(PERMISSIONS_SCOPE, empresa_id), (PERMISSIONS_SCOPE, GLOBAL)]
 
     def create(self, request, *args, **kwargs):
         # ... (Your existing create method returning simple response)
@@ -148,52 +478,106 @@ class EmpleadoViewSet(BaseTenantViewSet):
                  headers=headers
             )
         else: # Should not happen if perform_create works
-             print("ERROR: serializer.instance not found after perform_create")
+             logger.error("serializer.instance not found after perform_create")
              return Response({"detail":"Error creating employee instance."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-class ActivoFijoViewSet(BaseTenantViewSet):
+class ActivoFijoViewSet(BulkMixin, BaseTenantViewSet):
     queryset = ActivoFijo.objects.all()
     serializer_class = ActivoFijoSerializer
+    fast_list = True
     required_manage_permission = 'manage_activofijo'
+    keyset_ordering = ('fecha_adquisicion', 'id')
+
+    def after_bulk_write(self, ids):
+        super().after_bulk_write(ids)
+        marcar_pendientes((pk, self.request.tenant.empresa_id) for pk in ids)
+
+    @action(detail=False, methods=['post'], parser_classes=[MultiPartParser])
+    def importar(self, request):
+        """
+        POST /api/activos-fijos/importar/ (multipart): 'archivo' CSV o XLSX con
+        nombre, codigo_interno, fecha_adquisicion, valor_actual, vida_util,
+        categoria, estado, ubicacion y proveedor (opcional); los catálogos por
+        nombre. Opcionales: dry_run=1 (sólo valida), crear_catalogos=1.
+        Las filas válidas se guardan aunque otras tengan errores.
+        """
+        empresa_id = request.tenant.empresa_id
+        if empresa_id is None:
+            raise PermissionDenied("El usuario no pertenece a ninguna empresa.")
+        archivo = request.FILES.get('archivo')
+        if archivo is None:
+            return Response({'archivo': "Adjunte un fichero CSV o XLSX."}, status=status.HTTP_400_BAD_REQUEST)
+        formato = request.data.get('formato') or formato_de(archivo.name)
+        dry_run = request.data.get('dry_run') in ('1', 'true')
+        try:
+            with timed('importacion'):
+                resultado = importar_activos(
+                    archivo, formato, empresa_id,
+                    dry_run=dry_run,
+                    crear_catalogos=request.data.get('crear_catalogos') in ('1', 'true'),
+                    max_filas=getattr(settings, 'IMPORT_MAX_ROWS', 100000),
+                )
+        except ValueError as exc:
+            return Response({'archivo': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        if not dry_run:
+            audit.registrar(request, f'{audit.IMPORT}: ActivoFijo', {
+                'archivo': archivo.name, 'filas': resultado['filas'],
+                'creados': resultado['creados'], 'errores': resultado['total_errores'],
+            })
+        return Response(resultado, status=status.HTTP_201_CREATED if resultado['creados'] and not dry_run else status.HTTP_200_OK)
 
 class PresupuestoViewSet(BaseTenantViewSet):
-    queryset = Presupuesto.objects.all()
+    queryset = Presupuesto.objects.all().select_related('departamento')
     serializer_class = PresupuestoSerializer
+    fast_list = True
     # Apply the custom permission check for non-GET requests
     #permission_classes = [IsAuthenticated, HasPermission('manage_presupuesto')]
     required_manage_permission = 'manage_presupuesto'
+    keyset_ordering = ('fecha', 'id')
+    etag_models = (Presupuesto, Departamento)
 
 class RolesViewSet(BaseTenantViewSet):
-    queryset = Roles.objects.all()
+    queryset = Roles.objects.all().prefetch_related('permisos')
     serializer_class = RolesSerializer
+    fast_list = True
     required_manage_permission = 'manage_rol'
+    audit_name = 'Rol'
+
+    def etag_scopes(self, empresa_id):
+        return super().etag_scopes(empresa_id) + [(PERMISSIONS_SCOPE, empresa_id), (PERMISSIONS_SCOPE, GLOBAL)]
 
-class CategoriaActivoViewSet(BaseTenantViewSet):
+class CategoriaActivoViewSet(CatalogCacheMixin, BulkMixin, BaseTenantViewSet):
     queryset = CategoriaActivo.objects.all()
     serializer_class = CategoriaActivoSerializer
+    fast_list = True
     required_manage_permission = 'manage_categoriaactivo'
 
-class EstadoViewSet(BaseTenantViewSet):
+class EstadoViewSet(CatalogCacheMixin, BulkMixin, BaseTenantViewSet):
     queryset = Estado.objects.all()
     serializer_class = EstadoSerializer
+    fast_list = True
     required_manage_permission = 'manage_estadoactivo'
 
-class UbicacionViewSet(BaseTenantViewSet):
+class UbicacionViewSet(CatalogCacheMixin, BulkMixin, BaseTenantViewSet):
     queryset = Ubicacion.objects.all()
     serializer_class = UbicacionSerializer
+    fast_list = True
     required_manage_permission = 'manage_ubicacion'
 
-class ProveedorViewSet(BaseTenantViewSet):
+class ProveedorViewSet(CatalogCacheMixin, BulkMixin, BaseTenantViewSet):
     queryset = Proveedor.objects.all()
     serializer_class = ProveedorSerializer
+    fast_list = True
     required_manage_permission = 'manage_proveedor'
 
-class PermisosViewSet(viewsets.ModelViewSet): 
+class PermisosViewSet(AuditMixin, viewsets.ModelViewSet): 
     """
     ViewSet para gestionar los Permisos Globales...
     """
     queryset = Permisos.objects.all().order_by('nombre')
     serializer_class = PermisosSerializer
+    keyset_ordering = ('nombre', 'id')
+    audit_name = 'Permiso'
     
     def get_permissions(self):
         # ... (permission logic) ...
@@ -205,58 +589,348 @@ class PermisosViewSet(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
 
 # --- NUEVO VIEWSET PARA LA BITÁCORA/LOG ---
+# Claves admitidas en ?payload__<clave>=: evita rutas arbitrarias en la consulta
+_PAYLOAD_KEY_RE = re.compile(r'^\w+$')
+
+
 class LogViewSet(viewsets.ModelViewSet):
     """
-    ViewSet para recibir y guardar registros de log desde el frontend.
-    No usa el filtro de tenant porque es una función a nivel de sistema.
+    ViewSet para recibir registros de log desde el frontend (POST) y consultar
+    la bitácora de la propia empresa (GET, requiere 'view_log').
+
+    Filtros: ?desde=&hasta= (fecha o fecha-hora), ?usuario=<id>, ?accion=<prefijo>,
+    ?ip=. La lista se pagina siempre por cursor sobre (timestamp, id), del más
+    reciente al más antiguo; cada filtro tiene su índice (tenant_id, ...).
+
+    Filtros sobre el payload: ?payload__<clave>[__<subclave>]=<valor> y
+    ?entidad=<id> (payload.id o payload.id_creado). En PostgreSQL son
+    consultas de contención (payload @> '{...}') servidas por el índice GIN.
+    Lo ya archivado fuera de la BD se consulta en /api/logs/archivo/.
     """
     queryset = Log.objects.all()
     serializer_class = LogSerializer
     permission_classes = [IsAuthenticated] # Solo usuarios autenticados pueden registrar logs
+    http_method_names = ['get', 'post', 'head', 'options'] # La bitácora no se edita ni se borra
+    pagination_class = RequiredKeysetPagination
+    keyset_ordering = ('-timestamp', '-id')
+    read_permission = 'view_log'
+    payload_prefix = 'payload__'
+    max_payload_filters = 5
+    max_payload_depth = 3
+
+    def check_permissions(self, request):
+        super().check_permissions(request)
+        # HasPermission deja pasar los GET: aquí leer la bitácora sí requiere permiso
+        if request.method in permissions.SAFE_METHODS:
+            if self.read_permission not in get_user_permissions(request.user, request.tenant.empresa_id):
+                self.permission_denied(request, message=f'Permission "{self.read_permission}" required for this action.')
+
+    def get_queryset(self):
+        empresa_id = self.request.tenant.empresa_id
+        if empresa_id is None:
+            return self.queryset.none()
+        queryset = self.queryset.filter(tenant_id=empresa_id)
+        params = self.request.query_params
+
+        desde = self._parse_momento(params, 'desde')
+        if desde is not None:
+            queryset = queryset.filter(timestamp__gte=desde)
+        hasta = self._parse_momento(params, 'hasta', fin_del_dia=True)
+        if hasta is not None:
+            queryset = queryset.filter(timestamp__lt=hasta)
+        if params.get('usuario'):
+            try:
+                queryset = queryset.filter(usuario_id=int(params['usuario']))
+            except ValueError:
+                raise ValidationError({'usuario': "Debe ser el ID numérico del usuario."})
+        if params.get('accion'):
+            queryset = queryset.filter(accion__startswith=params['accion'])
+        if params.get('ip'):
+            try:
+                # Forma canónica, la que guarda GenericIPAddressField (p. ej. IPv6 comprimida)
+                queryset = queryset.filter(ip_address=str(ipaddress.ip_address(params['ip'])))
+            except ValueError:
+                raise ValidationError({'ip': "Dirección IP no válida."})
+
+        filtros = [(name, value) for name, value in params.items() if name.startswith(self.payload_prefix)]
+        if len(filtros) > self.max_payload_filters:
+            raise ValidationError({'payload': f"Máximo {self.max_payload_filters} filtros sobre el payload."})
+        for name, value in filtros:
+            path = name[len(self.payload_prefix):].split('__')
+            if len(path) > self.max_payload_depth or not all(_PAYLOAD_KEY_RE.match(key) for key in path):
+                raise ValidationError({name: f"Ruta no válida (claves alfanuméricas, máximo {self.max_payload_depth} niveles)."})
+            queryset = queryset.filter(self._payload_q(path, value))
+        if params.get('entidad'):
+            queryset = queryset.filter(
+                self._payload_q(['id'], params['entidad']) | self._payload_q(['id_creado'], params['entidad'])
+            )
+        return queryset
+
+    def _payload_q(self, path, value):
+        """
+        Igualdad de payload[path] con 'value'. El valor llega como texto pero en
+        el payload puede ser número o booleano: se prueba también su lectura JSON.
+        """
+        candidatos = [value]
+        try:
+            parsed = json.loads(value)
+        except ValueError:
+            parsed = None
+        if isinstance(parsed, (int, float, bool)):
+            candidatos.append(parsed)
+
+        condicion = Q()
+        for candidato in candidatos:
+            if connections[self.queryset.db].vendor == 'postgresql':
+                # payload @> '{"a": {"b": valor}}': lo resuelve log_payload_gin_idx
+                for key in reversed(path):
+                    candidato = {key: candidato}
+                condicion |= Q(payload__contains=candidato)
+            else:
+                # Otros motores no tienen @> para JSON: búsqueda por ruta, sin índice
+                condicion |= Q(**{'payload__' + '__'.join(path): candidato})
+        return condicion
+
+    @staticmethod
+    def _parse_momento(params, name, fin_del_dia=False):
+        """ Fecha-hora ISO, o fecha sola (inicio del día; con fin_del_dia, inicio del siguiente). """
+        value = params.get(name)
+        if not value:
+            return None
+        try:
+            # La fecha sola primero: parse_datetime también la acepta (como medianoche)
+            fecha = parse_date(value)
+            if fecha is not None:
+                if fin_del_dia:
+                    fecha += timedelta(days=1)
+                momento = datetime.combine(fecha, datetime.min.time())
+            else:
+                momento = parse_datetime(value)
+                if momento is None:
+                    raise ValueError
+        except ValueError:
+            raise ValidationError({name: "Formato no válido (AAAA-MM-DD o fecha-hora ISO 8601)."})
+        if timezone.is_naive(momento):
+            momento = timezone.make_aware(momento)
+        return momento
+
+    def _build_logs(self, entries):
+        # Asignamos los datos automáticos; la hora es la de llegada, no la de escritura
+        ip = audit.get_client_ip(self.request)
+        now = timezone.now()
+        return [
+            Log(
+                timestamp=now,
+                usuario_id=self.request.user.pk,
+                ip_address=ip,
+                tenant_id=self.request.tenant.empresa_id,
+                **entry
+            )
+            for entry in entries
+        ]
 
     def perform_create(self, serializer):
-        # Obtenemos la IP del cliente de forma segura
-        x_forwarded_for = self.request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = self.request.META.get('REMOTE_ADDR')
-
-        # Asignamos los datos automáticos antes de guardar
-        empleado = self.request.user.empleado
-        serializer.save(
-            usuario=self.request.user,
-            ip_address=ip,
-            tenant_id=empleado.empresa.id if empleado else None
+        # Se encola: el hilo de api/log_buffer.py lo inserta junto con otros
+        log_buffer.enqueue_many(self._build_logs([serializer.validated_data]))
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """ POST /api/logs/bulk/ con una lista de {accion, payload}: una sola llamada por lote. """
+        max_entries = getattr(settings, 'LOG_BULK_MAX_ENTRIES', 500)
+        if not isinstance(request.data, list):
+            return Response({'detail': "Se espera una lista de registros."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(request.data) > max_entries:
+            return Response(
+                {'detail': f"Máximo {max_entries} registros por lote."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        aceptados = log_buffer.enqueue_many(self._build_logs(serializer.validated_data))
+        return Response(
+            {'aceptados': aceptados, 'descartados': len(serializer.validated_data) - aceptados},
+            status=status.HTTP_202_ACCEPTED
+        )
+
+    @action(detail=False, methods=['get'])
+    def archivo(self, request):
+        """
+        GET /api/logs/archivo/?desde=&hasta=&accion=<prefijo>: logs ya archivados
+        (manage.py archive_logs) de la empresa, del más antiguo al más reciente.
+        Sólo se abren los ficheros de los meses del rango.
+        """
+        empresa_id = request.tenant.empresa_id
+        if empresa_id is None:
+            return Response({'results': [], 'truncado': False})
+        params = request.query_params
+        limite = getattr(settings, 'LOG_ARCHIVE_MAX_RESULTS', 1000)
+        filas = leer_archivo(
+            empresa_id,
+            desde=self._parse_momento(params, 'desde'),
+            hasta=self._parse_momento(params, 'hasta', fin_del_dia=True),
+            accion=params.get('accion') or None,
         )
+        results = []
+        for fila in filas:
+            if len(results) == limite:
+                return Response({'results': results, 'truncado': True})
+            results.append({
+                'id': fila['id'],
+                'timestamp': fila['timestamp'],
+                'usuario': fila['usuario_id'],
+                'ip_address': fila['ip_address'],
+                'accion': fila['accion'],
+                'payload': fila['payload'],
+            })
+        return Response({'results': results, 'truncado': False})
+
+def parametro_fecha(params, name, default):
+    if not params.get(name):
+        return default
+    try:
+        fecha = parse_date(params[name])
+    except ValueError:
+        fecha = None
+    if fecha is None:
+        raise ValidationError({name: "Formato de fecha no válido (AAAA-MM-DD)."})
+    return fecha
+
+
+def parametros_depreciacion(params, fecha_param, metodo_param):
+    """ (método, fecha) pedidos en el query string; fecha por defecto: hoy. """
+    metodo = params.get(metodo_param) or LINEAL
+    if metodo not in METODOS:
+        raise ValidationError({metodo_param: f"Opciones: {', '.join(METODOS)}."})
+    return metodo, parametro_fecha(params, fecha_param, timezone.localdate())
+
 
 class ReporteActivosPreview(APIView):
+    """ ?depreciacion=lineal|saldo_decreciente&fecha_corte= añade la depreciación a cada fila. """
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self, request):
-        empleado = request.user.empleado
-        queryset = ActivoFijo.objects.filter(empresa=empleado.empresa).select_related(
+        # Mismos filtros que la exportación y los trabajos en segundo plano
+        return filtrar_activos(request.tenant.empresa_id, request.query_params).select_related(
             'categoria', 'estado', 'ubicacion' # Include related models needed
         )
-        ubicacion_id = request.query_params.get('ubicacion_id') 
-        fecha_min = request.query_params.get('fecha_min')
-        fecha_max = request.query_params.get('fecha_max')
-        if ubicacion_id:
-            queryset = queryset.filter(ubicacion_id=ubicacion_id)
-        if fecha_min:
-            queryset = queryset.filter(fecha_adquisicion__gte=fecha_min)
-        if fecha_max:
-            queryset = queryset.filter(fecha_adquisicion__lte=fecha_max)
-        return queryset.order_by('fecha_adquisicion')
 
     def get(self, request, *args, **kwargs):
         queryset = self.get_queryset(request)
         # Use .values() for the specific fields needed in the preview table
-        data = queryset.values(
+        fields = [
             'id', 'nombre', 'codigo_interno', 'fecha_adquisicion', 'valor_actual',
             'ubicacion__nombre', 'categoria__nombre' # Use double underscore for related fields
+        ]
+        if not request.query_params.get('depreciacion'):
+            return Response(list(queryset.values(*fields))) # Convert queryset values to list
+
+        metodo, fecha = parametros_depreciacion(request.query_params, 'fecha_corte', 'depreciacion')
+        data = list(queryset.values(*fields, 'vida_util'))
+        cartera = Cartera.desde_filas((row['valor_actual'], row['vida_util'], row['fecha_adquisicion']) for row in data)
+        acumulada, libros = cartera.calcular(fecha, metodo)
+        for row, a, l in zip(data, acumulada.round(2).tolist(), libros.round(2).tolist()):
+            row['depreciacion_acumulada'] = a
+            row['valor_libros'] = l
+        return Response(data)
+
+
+class ReporteActivosResumen(APIView):
+    """
+    Totales para el dashboard y la vista previa sin descargar los activos:
+    ?por=categoria,estado,ubicacion,proveedor,anio,mes (por defecto, todas).
+    Una consulta GROUP BY por dimensión, con los mismos filtros que la vista previa.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        por = request.query_params.get('por')
+        dimensiones = [d.strip() for d in por.split(',') if d.strip()] if por else list(RESUMEN_DIMENSIONES)
+        invalidas = [d for d in dimensiones if d not in RESUMEN_DIMENSIONES]
+        if invalidas:
+            return Response(
+                {'por': f"Dimensiones no válidas: {', '.join(invalidas)}. Opciones: {', '.join(RESUMEN_DIMENSIONES)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        queryset = filtrar_activos(request.tenant.empresa_id, request.query_params)
+        data = {'total': totales_activos(queryset)}
+        for dimension in dimensiones:
+            data[dimension] = resumir_activos(queryset, dimension)
+        return Response(data)
+
+
+class DepreciacionView(APIView):
+    """
+    Depreciación de la cartera a una fecha: ?fecha= (por defecto hoy) y
+    ?metodo=lineal|saldo_decreciente. ?anios=N añade la proyección al cierre de
+    los N años siguientes. Admite los filtros de los reportes.
+    """
+    permission_classes = [IsAuthenticated]
+    MAX_ANIOS = 50
+
+    def get(self, request, *args, **kwargs):
+        metodo, fecha = parametros_depreciacion(request.query_params, 'fecha', 'metodo')
+        try:
+            anios = int(request.query_params.get('anios', 0))
+        except ValueError:
+            anios = -1
+        if not 0 <= anios <= self.MAX_ANIOS:
+            raise ValidationError({'anios': f"Debe ser un entero entre 0 y {self.MAX_ANIOS}."})
+
+        queryset = filtrar_activos(request.tenant.empresa_id, request.query_params)
+        cartera = Cartera.desde_queryset(queryset, agrupar_por=('categoria_id', 'categoria__nombre'))
+        with timed('depreciacion'):
+            data = {
+                'fecha': fecha,
+                'metodo': metodo,
+                'total': cartera.totales(fecha, metodo),
+                'categorias': cartera.totales_por_grupo(fecha, metodo),
+            }
+            if anios:
+                data['calendario'] = cartera.calendario(fecha.year, anios, metodo)
+        return Response(data)
+
+
+class DepreciacionHistoricoView(APIView):
+    """
+    Cierres mensuales materializados por 'manage.py refresh_depreciacion'
+    (?desde=&hasta=&metodo=): totales de la empresa por mes, o la serie de un
+    activo con ?activo=<id>. 'pendientes' indica activos aún sin recalcular.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        metodo, hasta = parametros_depreciacion(request.query_params, 'hasta', 'metodo')
+        desde = parametro_fecha(request.query_params, 'desde', date(hasta.year, 1, 1))
+        empresa_id = request.tenant.empresa_id
+
+        # Recorrido por rango del índice (empresa, metodo, periodo)
+        queryset = DepreciacionMensual.objects.filter(
+            empresa_id=empresa_id, metodo=metodo, periodo__range=(desde, hasta)
         )
-        return Response(list(data)) # Convert queryset values to list
+        activo = request.query_params.get('activo')
+        if activo:
+            try:
+                activo = uuid.UUID(activo)
+            except ValueError:
+                raise ValidationError({'activo': "ID de activo no válido."})
+            periodos = queryset.filter(activo_id=activo).order_by('periodo').values(
+                'periodo', 'depreciacion_acumulada', 'valor_libros'
+            )
+        else:
+            periodos = queryset.values('periodo').annotate(
+                cantidad=Count('id'),
+                depreciacion_acumulada=Sum('depreciacion_acumulada'),
+                valor_libros=Sum('valor_libros'),
+            ).order_by('periodo')
+
+        return Response({
+            'metodo': metodo,
+            'desde': desde,
+            'hasta': hasta,
+            'pendientes': ActivoPendienteDepreciacion.objects.filter(empresa_id=empresa_id).count(),
+            'periodos': list(periodos),
+        })
 
 
 # --- RESTORE THIS VIEW COMPLETELY ---
@@ -264,106 +938,119 @@ class ReporteActivosExport(APIView):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self, request):
-        # Reutiliza la lógica de filtrado de la vista previa
-        # IMPORTANT: Ensure ReporteActivosPreview().get_queryset(request) 
-        # includes all necessary related models (select_related)
-        # for the PDF/Excel generation below.
-        return ReporteActivosPreview().get_queryset(request).select_related(
-            'ubicacion', 'estado' # Add any other related models needed below
-        ) 
+        # Reutiliza la lógica de filtrado de la vista previa.
+        # Las columnas (con sus joins) las define EXPORT_COLUMNS en api/reports.py
+        return ReporteActivosPreview().get_queryset(request)
+
+    def perform_content_negotiation(self, request, force=False):
+        # '?format=pdf|excel' is ours, not DRF's renderer override: without force
+        # DRF finds no 'excel'/'pdf' renderer and answers 404
+        return super().perform_content_negotiation(request, force=True)
 
     def get(self, request, *args, **kwargs):
-        print(f"\n---> ReporteActivosExport GET method reached! Format requested: {request.query_params.get('format')}\n")
         export_format = request.query_params.get('format', 'pdf')
         queryset = self.get_queryset(request)
-        
+        log_event('reporte.export', format=export_format, empresa=request.tenant.empresa_id)
+
+        # Columnas de depreciación opcionales (sólo CSV/Excel; el PDF tiene un diseño fijo)
+        depreciacion = None
+        if request.query_params.get('depreciacion') and export_format in ('csv', 'excel'):
+            depreciacion = parametros_depreciacion(request.query_params, 'fecha_corte', 'depreciacion')
+
+        if export_format == 'csv':
+            return self.create_csv(queryset, depreciacion)
         if export_format == 'excel':
-            return self.create_excel(queryset)
+            with metrics.observe_duration('api_export_duration_seconds', format='excel'):
+                return self.create_excel(queryset, depreciacion)
         else: # Default a PDF
-            return self.create_pdf(queryset)
+            with metrics.observe_duration('api_export_duration_seconds', format='pdf'):
+                return self.create_pdf(queryset)
 
-    def create_excel(self, queryset):
-        buffer = io.BytesIO()
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Reporte de Activos"
-
-        # Encabezados (Adjust based on your model - using Ubicacion now)
-        headers = ["Nombre", "Código Interno", "Ubicación", "Fecha Adquisición", "Valor Actual (Bs.)", "Estado"] 
-        ws.append(headers)
-        for cell in ws[1]:
-            cell.font = Font(bold=True)
-        
-        # Datos
-        for activo in queryset:
-            ws.append([
-                activo.nombre,
-                activo.codigo_interno,
-                activo.ubicacion.nombre if activo.ubicacion else 'N/A', # Use ubicacion
-                activo.fecha_adquisicion,
-                activo.valor_actual,
-                activo.estado.nombre if activo.estado else 'N/A'
-            ])
-        
-        wb.save(buffer)
-        buffer.seek(0)
-        
-        response = HttpResponse(
-            buffer,
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        response['Content-Disposition'] = 'attachment; filename="reporte_activos.xlsx"'
+    def _columns(self, depreciacion):
+        return EXPORT_COLUMNS + DEPRECIACION_COLUMNS if depreciacion else EXPORT_COLUMNS
+
+    def create_csv(self, queryset, depreciacion=None):
+        # Cada fila sale al cliente según se lee del cursor: el primer byte es inmediato
+        columns = self._columns(depreciacion)
+        rows = stream_csv(iter_rows(queryset, columns, depreciacion), columns)
+        rows = metrics.observe_iterator('api_export_duration_seconds', rows, format='csv')
+        response = StreamingHttpResponse(rows, content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; filename="reporte_activos.csv"'
         return response
 
+    def create_excel(self, queryset, depreciacion=None):
+        # Workbook write-only en un fichero temporal: memoria constante sin importar
+        # el tamaño del reporte; FileResponse lo envía por bloques
+        columns = self._columns(depreciacion)
+        fileobj = xlsx_tempfile(iter_rows(queryset, columns, depreciacion), columns)
+        return FileResponse(
+            fileobj,
+            as_attachment=True,
+            filename='reporte_activos.xlsx',
+            content_type=XLSX_CONTENT_TYPE,
+        )
+
     def create_pdf(self, queryset):
         buffer = io.BytesIO()
-        p = canvas.Canvas(buffer, pagesize=letter)
-        width, height = letter
-
-        p.setFont('Helvetica-Bold', 16)
-        p.drawString(inch, height - inch, "Reporte de Activos Fijos")
-
-        p.setFont('Helvetica-Bold', 10)
-        y = height - 1.5 * inch
-        # Adjust headers for Ubicacion
-        headers = ["Nombre", "Código", "Ubicación", "Fecha Adq.", "Valor (Bs.)"] 
-        col_widths = [2.5 * inch, 1 * inch, 1.5 * inch, 1 * inch, 1 * inch]
-        x = inch
-        for i, header in enumerate(headers):
-            p.drawString(x, y, header)
-            x += col_widths[i]
-
-        p.line(inch, y - 0.1 * inch, width - inch, y - 0.1 * inch)
-        y -= 0.25 * inch
-
-        p.setFont('Helvetica', 9)
-        for activo in queryset:
-            if y < inch: 
-                p.showPage()
-                p.setFont('Helvetica', 9)
-                y = height - inch
-                
-            data = [
-                activo.nombre[:30], # Limit length if needed
-                activo.codigo_interno,
-                activo.ubicacion.nombre[:20] if activo.ubicacion else 'N/A', # Use ubicacion
-                str(activo.fecha_adquisicion),
-                str(activo.valor_actual)
-            ]
-            x = inch
-            for i, item in enumerate(data):
-                p.drawString(x, y, item)
-                x += col_widths[i]
-            y -= 0.25 * inch
-            
-        p.showPage()
-        p.save()
+        write_pdf(iter_rows(queryset), buffer)
         buffer.seek(0)
         
         response = HttpResponse(buffer, content_type='application/pdf')
         response['Content-Disposition'] = 'attachment; filename="reporte_activos.pdf"'
         return response
     
+class TrabajoExportacionViewSet(BaseTenantViewSet):
+    """
+    Reportes grandes en segundo plano: POST encola, GET consulta el estado y
+    GET .../descargar/ entrega el fichero generado por run_export_worker.
+    """
+    queryset = TrabajoExportacion.objects.all()
+    serializer_class = TrabajoExportacionSerializer
+    http_method_names = ['get', 'post', 'head', 'options']
+    keyset_ordering = ('-fecha_creacion', '-id')
+    etag_models = () # run_export_worker cambia el estado sin versionar los datos
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        empresa_id = request.tenant.empresa_id
+        if empresa_id is None:
+            raise PermissionDenied("El usuario no pertenece a ninguna empresa.")
+
+        formato = serializer.validated_data['formato']
+        filtros = serializer.validated_data.get('filtros', {})
+        clave = export_key(empresa_id, formato, filtros)
+
+        # Mismo reporte sobre los mismos datos: se reutiliza el trabajo (y su fichero)
+        existente = self.get_queryset().filter(clave=clave).exclude(
+            estado=TrabajoExportacion.ERROR
+        ).order_by('-fecha_creacion').first()
+        if existente is not None:
+            if existente.estado != TrabajoExportacion.COMPLETADO or os.path.exists(existente.archivo):
+                return Response(self.get_serializer(existente).data, status=status.HTTP_200_OK)
+            existente.delete() # El fichero ya no existe (purgado): se regenera
+
+        serializer.save(empresa_id=empresa_id, usuario=request.user, clave=clave, filtros=filtros)
+        log_event('exportacion.encolada', id=serializer.instance.pk, formato=formato, empresa=empresa_id)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['get'])
+    def descargar(self, request, pk=None):
+        trabajo = self.get_object()
+        if trabajo.estado != TrabajoExportacion.COMPLETADO:
+            return Response(
+                {"detail": f"El reporte aún no está listo (estado: {trabajo.estado})."},
+                status=status.HTTP_409_CONFLICT,
+            )
+        try:
+            fileobj = open(trabajo.archivo, 'rb')
+        except FileNotFoundError:
+            return Response({"detail": "El archivo ya no está disponible."}, status=status.HTTP_410_GONE)
+        extension, content_type = EXPORT_FORMATS[trabajo.formato]
+        return FileResponse(
+            fileobj, as_attachment=True, filename=f'reporte_activos.{extension}', content_type=content_type
+        )
+
 class RegisterEmpresaView(APIView):
     """
     Endpoint público para registrar una nueva empresa (Suscripción).
@@ -375,23 +1062,10 @@ class RegisterEmpresaView(APIView):
         if serializer.is_valid():
             # El .save() llama al método .create() del serializer
             user = serializer.save()                         
-            refresh = RefreshToken.for_user(user)
+            # Mismos claims que el login (incluido 'empresa_id', que usa request.tenant).
+            # Se añaden al refresh token para que los access renovados también los tengan.
+            refresh = MyTokenObtainPairSerializer.get_token(user)
             token = refresh.access_token
-            empleado = user.empleado
-
-            try:
-                empleado = user.empleado
-                token['username'] = user.username
-                token['email'] = user.email
-                token['nombre_completo'] = f"{user.first_name} {empleado.apellido_p}"
-                token['empresa_id'] = str(empleado.empresa.id)
-                token['empresa_nombre'] = empleado.empresa.nombre
-                # Asumimos que al registrarse no tiene roles asignados aún
-                token['roles'] = [] 
-                token['is_admin'] = user.is_staff
-            except Empleado.DoesNotExist: # Seguridad por si algo falla
-                token['roles'] = []
-                token['is_admin'] = user.is_staff
             return Response({
                 'refresh': str(refresh),
                 'access': str(token), # Enviamos el access token modificado
@@ -410,22 +1084,69 @@ class UserPermissionsView(APIView):
     def get(self, request, *args, **kwargs):
         permissions_set = set()
         try:
-            empleado = request.user.empleado
-            # Efficiently get all permission names linked to the user's roles
-            permissions_set = set(
-                empleado.roles.values_list('permisos__nombre', flat=True).distinct()
-            )
+            # Cached per user (see get_user_permissions); empty for non-employees
+            permissions_set = set(get_user_permissions(request.user, request.tenant.empresa_id))
             # Add check for superuser
             if request.user.is_staff:
                  permissions_set.add('is_superuser') # Add a special permission flag
-
-        except Empleado.DoesNotExist:
-            # Handle case where user isn't an employee (maybe just superuser)
-            if request.user.is_staff:
-                 permissions_set.add('is_superuser')
-            pass # Regular users without employee link have no permissions
-        except Exception as e:
-            print(f"Error fetching user permissions: {e}")
+        except Exception:
+            logger.exception("Error fetching user permissions")
             # Return empty list on error
 
         return Response(list(permissions_set)) # Return as a simple list of strings
+
+
+class BootstrapView(APIView):
+    """
+    Permisos, roles y catálogos de la empresa en una sola respuesta, para el
+    arranque del SPA y de la app (api/bootstrap.py). ?sections=permisos,roles,...
+    limita las secciones (por defecto, todas). Cada sección trae su 'etag'; las
+    que el cliente ya tiene (If-None-Match) vuelven sin 'data', y si son todas
+    la respuesta es 304. El ETag de la respuesta entera sólo acompaña a una
+    respuesta completa; una parcial va con no-store.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        sections = request.query_params.get('sections')
+        secciones = [s.strip() for s in sections.split(',') if s.strip()] if sections else list(bootstrap.SECCIONES)
+        invalidas = [s for s in secciones if s not in bootstrap.SECCIONES]
+        if invalidas:
+            return Response(
+                {'sections': f"Secciones no válidas: {', '.join(invalidas)}. Opciones: {', '.join(bootstrap.SECCIONES)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        secciones = list(dict.fromkeys(secciones))
+
+        etags = bootstrap.etags(secciones, request.user.pk, request.tenant.empresa_id)
+        etag = quote_etag(hashlib.sha1('|'.join(etags.values()).encode()).hexdigest())
+        conocidos = {tag.removeprefix('W/') for tag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))}
+        if etag in conocidos or all(etags[seccion] in conocidos for seccion in secciones):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            data = {}
+            for seccion in secciones:
+                data[seccion] = {'etag': etags[seccion]}
+                if etags[seccion] not in conocidos:
+                    data[seccion]['data'] = bootstrap.datos(seccion, request)
+            response = Response(data)
+            if any('data' not in data[seccion] for seccion in secciones):
+                # Respuesta parcial: con el ETag completo el navegador la guardaría y,
+                # al revalidar con él, recibiría un 304 y usaría secciones sin 'data'
+                patch_cache_control(response, no_store=True)
+                return response
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class MetricsView(APIView):
+    """
+    Métricas en formato de texto de Prometheus (ver api/metrics.py).
+    Sin JWT: el scraper se autentica con settings.METRICS_AUTH_TOKEN.
+    """
+    authentication_classes = []
+    permission_classes = [HasMetricsToken]
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(metrics.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,6 +1,5 @@
 // src/api/dataService.js
 import apiClient from './axiosConfig';
-import { logAction } from './logService';
 
 // --- Funciones para Departamentos ---
 export const getDepartamentos = async () => {
@@ -10,22 +9,16 @@ export const getDepartamentos = async () => {
 
 export const createDepartamento = async (data) => {
     const response = await apiClient.post('/departamentos/', data);
-    await logAction('CREATE: Departamento', { 
-        id_creado: response.data.id,
-        nombre: data.nombre 
-    });
     return response.data;
 };
 
 export const updateDepartamento = async (id, data) => {
     const response = await apiClient.put(`/departamentos/${id}/`, data);
-    await logAction('UPDATE: Departamento', { id: id, ...data });
     return response.data;
 };
 
 export const deleteDepartamento = async (id) => {
     await apiClient.delete(`/departamentos/${id}/`);
-    await logAction('DELETE: Departamento', { id: id });
     // No hay return
 };
 
@@ -37,22 +30,36 @@ export const getActivosFijos = async () => {
 
 export const createActivoFijo = async (data) => {
     const response = await apiClient.post('/activos-fijos/', data);
-    await logAction('CREATE: ActivoFijo', { id_creado: response.data.id, nombre: data.nombre, codigo: data.codigo_interno });
     return response.data;
 };
 
 export const updateActivoFijo = async (id, data) => {
     const response = await apiClient.put(`/activos-fijos/${id}/`, data);
-    await logAction('UPDATE: ActivoFijo', { id: id, ...data });
     return response.data;
 };
 
 export const deleteActivoFijo = async (id) => {
     await apiClient.delete(`/activos-fijos/${id}/`);
-    await logAction('DELETE: ActivoFijo', { id: id });
     // No hay return
 };
 
+// Operaciones en bloque (una sola petición y transacción):
+// cambios = { ids: [...] } o { filtro: {...} }, más { cambios: { ubicacion: id } } al editar
+export const bulkCreateActivosFijos = async (rows) => {
+    const response = await apiClient.post('/activos-fijos/bulk/', rows);
+    return response.data;
+};
+
+export const bulkUpdateActivosFijos = async (data) => {
+    const response = await apiClient.patch('/activos-fijos/bulk/', data);
+    return response.data;
+};
+
+export const bulkDeleteActivosFijos = async (seleccion) => {
+    const response = await apiClient.delete('/activos-fijos/bulk/', { data: seleccion });
+    return response.data;
+};
+
 // --- Funciones para Cargos ---
 export const getCargos = async () => {
     const response = await apiClient.get('/cargos/');
@@ -61,19 +68,16 @@ export const getCargos = async () => {
 
 export const createCargo = async (data) => {
     const response = await apiClient.post('/cargos/', data);
-    await logAction('CREATE: Cargo', { id_creado: response.data.id, nombre: data.nombre });
     return response.data;
 };
 
 export const updateCargo = async (id, data) => {
     const response = await apiClient.put(`/cargos/${id}/`, data);
-    await logAction('UPDATE: Cargo', { id: id, ...data });
     return response.data;
 };
 
 export const deleteCargo = async (id) => {
     await apiClient.delete(`/cargos/${id}/`);
-    await logAction('DELETE: Cargo', { id: id });
     // No hay return
 };
 
@@ -85,23 +89,16 @@ export const getEmpleados = async () => {
 
 export const createEmpleado = async (data) => {
     const response = await apiClient.post('/empleados/', data);
-    await logAction('CREATE: Empleado', { 
-        id_creado: response.data.id, 
-        username: data.username,
-        email: data.email
-    });
     return response.data;
 };
 
 export const updateEmpleado = async (id, data) => {
     const response = await apiClient.patch(`/empleados/${id}/`, data); // Usamos PATCH
-    await logAction('UPDATE: Empleado', { id: id, ...data });
     return response.data;
 };
 
 export const deleteEmpleado = async (id) => {
     await apiClient.delete(`/empleados/${id}/`);
-    await logAction('DELETE: Empleado', { id: id });
     // No hay return
 };
 
@@ -113,19 +110,16 @@ export const getRoles = async () => {
 
 export const createRol = async (data) => {
     const response = await apiClient.post('/roles/', data);
-    await logAction('CREATE: Rol', { id_creado: response.data.id, nombre: data.nombre, permisos: data.permisos });
     return response.data;
 };
 
 export const updateRol = async (id, data) => {
     const response = await apiClient.put(`/roles/${id}/`, data);
-    await logAction('UPDATE: Rol', { id: id, ...data });
     return response.data;
 };
 
 export const deleteRol = async (id) => {
     await apiClient.delete(`/roles/${id}/`);
-    await logAction('DELETE: Rol', { id: id });
     // No hay return
 };
 
@@ -138,19 +132,16 @@ export const getPresupuestos = async () => {
 
 export const createPresupuesto = async (data) => {
     const response = await apiClient.post('/presupuestos/', data);
-    await logAction('CREATE: Presupuesto', { id_creado: response.data.id, monto: data.monto, departamento_id: data.departamento_id });
     return response.data;
 };
 
 export const updatePresupuesto = async (id, data) => {
     const response = await apiClient.put(`/presupuestos/${id}/`, data);
-    await logAction('UPDATE: Presupuesto', { id: id, ...data });
     return response.data;
 };
 
 export const deletePresupuesto = async (id) => {
     await apiClient.delete(`/presupuestos/${id}/`);
-    await logAction('DELETE: Presupuesto', { id: id });
     // No hay return
 };
 
@@ -162,19 +153,16 @@ export const getUbicaciones = async () => {
 
 export const createUbicacion = async (data) => {
     const response = await apiClient.post('/ubicaciones/', data);
-    await logAction('CREATE: Ubicacion', { id_creado: response.data.id, nombre: data.nombre });
     return response.data;
 };
 
 export const updateUbicacion = async (id, data) => {
     const response = await apiClient.put(`/ubicaciones/${id}/`, data);
-    await logAction('UPDATE: Ubicacion', { id: id, ...data });
     return response.data;
 };
 
 export const deleteUbicacion = async (id) => {
     await apiClient.delete(`/ubicaciones/${id}/`);
-    await logAction('DELETE: Ubicacion', { id: id });
     // No hay return
 };
 
@@ -186,19 +174,16 @@ export const getProveedores = async () => {
 
 export const createProveedor = async (data) => {
     const response = await apiClient.post('/proveedores/', data);
-    await logAction('CREATE: Proveedor', { id_creado: response.data.id, nombre: data.nombre, nit: data.nit });
     return response.data;
 };
 
 export const updateProveedor = async (id, data) => {
     const response = await apiClient.put(`/proveedores/${id}/`, data);
-    await logAction('UPDATE: Proveedor', { id: id, ...data });
     return response.data;
 };
 
 export const deleteProveedor = async (id) => {
     await apiClient.delete(`/proveedores/${id}/`);
-    await logAction('DELETE: Proveedor', { id: id });
     // No hay return
 };
 
@@ -210,19 +195,16 @@ export const getCategoriasActivos = async () => {
 
 export const createCategoriaActivo = async (data) => {
     const response = await apiClient.post('/categorias-activos/', data);
-    await logAction('CREATE: CategoriaActivo', { id_creado: response.data.id, nombre: data.nombre });
     return response.data;
 };
 
 export const updateCategoriaActivo = async (id, data) => {
     const response = await apiClient.put(`/categorias-activos/${id}/`, data);
-    await logAction('UPDATE: CategoriaActivo', { id: id, ...data });
     return response.data;
 };
 
 export const deleteCategoriaActivo = async (id) => {
     await apiClient.delete(`/categorias-activos/${id}/`);
-    await logAction('DELETE: CategoriaActivo', { id: id });
     // No hay return
 };
 
@@ -234,19 +216,16 @@ export const getEstados = async () => {
 
 export const createEstado = async (data) => {
     const response = await apiClient.post('/estados/', data);
-    await logAction('CREATE: Estado', { id_creado: response.data.id, nombre: data.nombre });
     return response.data;
 };
 
 export const updateEstado = async (id, data) => {
     const response = await apiClient.put(`/estados/${id}/`, data);
-    await logAction('UPDATE: Estado', { id: id, ...data });
     return response.data;
 };
 
 export const deleteEstado = async (id) => {
     await apiClient.delete(`/estados/${id}/`);
-    await logAction('DELETE: Estado', { id: id });
     // No hay return
 };
 
@@ -275,6 +254,8 @@ export const downloadReporteActivos = async (params) => {
         let filename = "reporte.dat";
         if (params.format === 'excel') {
             filename = "reporte_activos.xlsx";
+        } else if (params.format === 'csv') {
+            filename = "reporte_activos.csv";
         } else { // Default to PDF
             filename = "reporte_activos.pdf";
         }       
@@ -310,6 +291,18 @@ export const getReporteActivosPreview = async (params) => {
         throw error; // Re-throw so the component knows about the error
     }
 };
+
+// Totales agrupados en el servidor (cantidad y valor por categoría, estado, ubicación, proveedor, año o mes)
+// params: los mismos filtros de la vista previa + por: 'categoria,estado,...'
+export const getReporteActivosResumen = async (params) => {
+    const response = await apiClient.get('reportes/activos-resumen/', { params });
+    return response.data;
+};
+// Depreciación de la cartera a una fecha. params: { fecha, metodo: 'lineal' | 'saldo_decreciente', anios }
+export const getDepreciacion = async (params) => {
+    const response = await apiClient.get('depreciacion/', { params });
+    return response.data;
+};
 // --- Funciones para Permisos (CRUD Completo) ---
 export const getPermisos = async () => {
     const response = await apiClient.get('/permisos/');
@@ -318,18 +311,27 @@ export const getPermisos = async () => {
 
 export const createPermiso = async (data) => {
     const response = await apiClient.post('/permisos/', data);
-    await logAction('CREATE: Permiso', { id_creado: response.data.id, nombre: data.nombre });
     return response.data;
 };
 
 export const updatePermiso = async (id, data) => {
     const response = await apiClient.put(`/permisos/${id}/`, data);
-    await logAction('UPDATE: Permiso', { id: id, ...data });
     return response.data;
 };
 
 export const deletePermiso = async (id) => {
     await apiClient.delete(`/permisos/${id}/`);
-    await logAction('DELETE: Permiso', { id: id });
     // No hay return
 };
+
+// --- Funciones para el arranque de sesión ---
+/**
+ * Permisos, roles y catálogos en una sola petición (/bootstrap/).
+ * @param {string[]} [sections] - Secciones a pedir (por defecto, todas)
+ * @returns {object} { seccion: { etag, data } }
+ */
+export const getBootstrap = async (sections) => {
+    const params = sections ? { sections: sections.join(',') } : undefined;
+    const response = await apiClient.get('/bootstrap/', { params });
+    return response.data;
+};
@@ -1,22 +1,78 @@
 // src/api/logService.js
 import apiClient from './axiosConfig';
 
+// Los registros se agrupan y se envían juntos a 'logs/bulk/':
+// una petición cada FLUSH_DELAY_MS (o al juntar MAX_BATCH) en vez de una por acción.
+const FLUSH_DELAY_MS = 2000;
+const MAX_BATCH = 50;
+const MAX_PENDING = 500; // Si el backend no responde, no crecer sin límite
+
+let pending = [];
+let flushTimer = null;
+
+const flush = async () => {
+    clearTimeout(flushTimer);
+    flushTimer = null;
+    if (pending.length === 0) return;
+
+    const batch = pending.splice(0, MAX_BATCH);
+    try {
+        await apiClient.post('logs/bulk/', batch);
+    } catch (error) {
+        // Fallamos silenciosamente.
+        // El log no es tan crítico como para detener la acción principal del usuario.
+        console.warn('Fallo al registrar acciones en la bitácora:', error);
+    }
+    if (pending.length > 0) scheduleFlush();
+};
+
+const scheduleFlush = () => {
+    if (pending.length >= MAX_BATCH) {
+        flush();
+    } else if (!flushTimer) {
+        flushTimer = setTimeout(flush, FLUSH_DELAY_MS);
+    }
+};
+
 /**
- * Envía un registro de auditoría al backend.
+ * Encola un registro de auditoría para el backend.
  * Falla silenciosamente para no interrumpir al usuario.
  * @param {string} accion - Descripción de la acción. Ej: "CREATE: Departamento"
  * @param {object} payload - Datos relevantes de la acción (opcional).
  */
-export const logAction = async (accion, payload = {}) => {
-    try {
-        // Tu backend espera 'accion' y 'payload' según LogSerializer
-        await apiClient.post('logs/', {
-            accion: accion,
-            payload: payload
-        });
-    } catch (error) {
-        // Fallamos silenciosamente.
-        // El log no es tan crítico como para detener la acción principal del usuario.
-        console.warn('Fallo al registrar la acción en la bitácora:', error);
+export const logAction = (accion, payload = {}) => {
+    // Tu backend espera 'accion' y 'payload' según LogSerializer
+    if (pending.length >= MAX_PENDING) pending.shift(); // Se descarta el más antiguo
+    pending.push({ accion, payload });
+    scheduleFlush();
+};
+
+// Al ocultar o cerrar la pestaña el navegador puede cancelar una petición de axios
+// a medio enviar: fetch con keepalive sobrevive a la descarga de la página.
+// (sendBeacon no admite la cabecera Authorization que exige el backend.)
+const flushOnExit = () => {
+    clearTimeout(flushTimer);
+    flushTimer = null;
+    const authorization = apiClient.defaults.headers.common['Authorization'];
+    // keepalive limita el cuerpo (64 KB en total): lotes de MAX_BATCH
+    while (pending.length > 0) {
+        const batch = pending.splice(0, MAX_BATCH);
+        fetch(`${apiClient.defaults.baseURL}/logs/bulk/`, {
+            method: 'POST',
+            keepalive: true,
+            headers: {
+                'Content-Type': 'application/json',
+                ...(authorization ? { Authorization: authorization } : {}),
+            },
+            body: JSON.stringify(batch),
+        }).catch((error) => console.warn('Fallo al registrar acciones en la bitácora:', error));
     }
-};
\ No newline at end of file
+};
+
+// Envía lo pendiente al ocultar o cerrar la pestaña
+if (typeof window !== 'undefined') {
+    window.addEventListener('pagehide', flushOnExit);
+    document.addEventListener('visibilitychange', () => {
+        if (document.visibilityState === 'hidden') flushOnExit();
+    });
+}
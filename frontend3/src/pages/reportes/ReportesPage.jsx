@@ -2,7 +2,7 @@
 import React, { useState, useEffect } from 'react';
 import { motion } from 'framer-motion';
 import { FileText, FileDown, Loader, Filter } from 'lucide-react';
-import { getUbicaciones, getReporteActivosPreview, downloadReporteActivos } from '../../api/dataService';
+import { getUbicaciones, getReporteActivosPreview, getReporteActivosResumen, downloadReporteActivos } from '../../api/dataService';
 import { useNotification } from '../../context/NotificacionContext';
 
 // --- Componentes de ayuda del Formulario ---
@@ -36,6 +36,7 @@ export default function ReportesPage() {
     
     // Estado para los resultados de la vista previa
     const [resultados, setResultados] = useState(null); // Inicia como null
+    const [resumen, setResumen] = useState(null); // Totales calculados en el servidor
     
     const { showNotification } = useNotification();
 
@@ -85,9 +86,14 @@ export default function ReportesPage() {
     const handleGenerarReporte = async () => {
         setLoadingPreview(true); // Activa el loader del botón
         setResultados(null); // Limpia resultados previos
+        setResumen(null);
         try {
             const params = buildParams();
-            const data = await getReporteActivosPreview(params);
+            const [data, totales] = await Promise.all([
+                getReporteActivosPreview(params),
+                getReporteActivosResumen({ ...params, por: 'categoria' }),
+            ]);
+            setResumen(totales);
             setResultados(data || []); // Asegura que sea un array
             if (!data || data.length === 0) {
                 showNotification('No se encontraron resultados con esos filtros');
@@ -101,7 +107,7 @@ export default function ReportesPage() {
         }
     };
 
-    // Handler para exportar (PDF o Excel)
+    // Handler para exportar (PDF, Excel o CSV)
     const handleExportar = async (format) => {
         // Solo exportar si hay resultados
         if (!resultados || resultados.length === 0) {
@@ -170,7 +176,15 @@ export default function ReportesPage() {
             {resultados !== null && (
                 <div className="bg-secondary border border-theme rounded-xl p-6 animate-in fade-in">
                     <div className="flex flex-col sm:flex-row justify-between items-start sm:items-center mb-4 gap-4">
-                        <h2 className="text-xl font-semibold text-primary">Resultados ({resultados.length})</h2>
+                        <div>
+                            <h2 className="text-xl font-semibold text-primary">Resultados ({resultados.length})</h2>
+                            {resumen && (
+                                <p className="text-sm text-secondary">
+                                    Valor total: Bs. {parseFloat(resumen.total.valor_total).toFixed(2)}
+                                    {resumen.categoria.map(c => ` · ${c.nombre}: ${c.cantidad}`).join('')}
+                                </p>
+                            )}
+                        </div>
                         {/* Muestra botones solo si hay resultados */}
                         {resultados.length > 0 && (
                             <div className="flex gap-3">
@@ -180,6 +194,9 @@ export default function ReportesPage() {
                                 <button onClick={() => handleExportar('excel')} disabled={loadingExport} className="flex items-center gap-2 text-sm bg-tertiary text-primary px-4 py-2 rounded-lg hover:bg-opacity-80 disabled:opacity-50">
                                     {loadingExport ? <Loader className="animate-spin w-4 h-4" /> : <FileDown size={16} />} Excel
                                 </button>
+                                <button onClick={() => handleExportar('csv')} disabled={loadingExport} className="flex items-center gap-2 text-sm bg-tertiary text-primary px-4 py-2 rounded-lg hover:bg-opacity-80 disabled:opacity-50">
+                                    {loadingExport ? <Loader className="animate-spin w-4 h-4" /> : <FileDown size={16} />} CSV
+                                </button>
                             </div>
                         )}
                     </div>